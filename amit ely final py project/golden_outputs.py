@@ -0,0 +1,290 @@
+# /golden_outputs.py
+"""
+Checks that the statistics of both front ends still match their recorded golden outputs.
+
+Every statistic of the matplotlib menu and of the Streamlit dashboard is calculated on every sample workbook and
+compared with golden_outputs.json, which was recorded with the original implementations of the statistics.
+Numbers are compared exactly (floats up to FLOAT_TOLERANCE). In the top lists, entries that tie on their count
+may come in any order, and the entries that tie on the last count may be any of the tied ones.
+
+The statistics are also calculated out of core, in small chunks in a pool of worker processes, and compared with
+the same statistics calculated in memory: they must be exactly the same.
+
+Usage: python golden_outputs.py [--update]
+"""
+import argparse
+import importlib.util
+import json
+import math
+import os
+import sys
+from typing import Any, Dict, List
+
+import pandas as pd
+
+import trempboss_analytics as analytics
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_FILE = os.path.join(PROJECT_DIR, 'golden_outputs.json')
+MATPLOTLIB_DIR = os.path.join(PROJECT_DIR, 'pandas && matplotlib')
+STREAMLIT_DIR = os.path.join(PROJECT_DIR, 'pandas && streamlit')
+
+SAMPLE_WORKBOOKS = [
+    os.path.join(MATPLOTLIB_DIR, 'exel file', 'Python TrempBoss file.xlsx'),
+    os.path.join(MATPLOTLIB_DIR, 'exel file', 'second TrempBoss file.xlsx'),
+    os.path.join(STREAMLIT_DIR, 'Excel reports', 'small TrempBoss data report.xlsx'),
+    os.path.join(STREAMLIT_DIR, 'Excel reports', 'big TrempBoss data report.xlsx'),
+]
+
+# Statistics whose entries are ranked by a count, ties may be in any order
+RANKED_STATISTICS = {'top_drivers', 'top_routes', 'top_hours', 'top_5_drivers', 'top_5_routes'}
+
+FLOAT_TOLERANCE = 1e-9
+
+# Small chunks so every sample workbook is split into many of them, and more than one worker process
+OUT_OF_CORE_CHUNK_ROWS = 7
+OUT_OF_CORE_WORKERS = 2
+OUT_OF_CORE_RANGE_TREMP_IDS = 7
+
+
+def import_front_end_module(directory: str, module_name: str, alias: str):
+    """
+    The function imports a module of a front end under an alias, both front ends have a data_processing module.
+    The front end directory is put first on the path while its module is imported, for its own imports.
+    """
+    sys.path.insert(0, directory)
+    try:
+        spec = importlib.util.spec_from_file_location(alias, os.path.join(directory, f'{module_name}.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    finally:
+        sys.path.remove(directory)
+
+
+def to_json_value(value: Any) -> Any:
+    """
+    The function converts a statistic to plain JSON values: a Series to its [label, value] pairs, a DataFrame
+    to its rows, numpy numbers to Python numbers.
+    """
+    if isinstance(value, pd.DataFrame):
+        return [[to_json_value(item) for item in row] for row in value.itertuples(index=False)]
+    if isinstance(value, pd.Series):
+        return [[to_json_value(label), to_json_value(item)] for label, item in value.items()]
+    if isinstance(value, (pd.Index, list, tuple)):
+        return [to_json_value(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): to_json_value(item) for key, item in value.items()}
+    if hasattr(value, 'tolist'):
+        return to_json_value(value.tolist())
+    if isinstance(value, (bool, int, float, str)) or value is None:
+        return value
+    return str(value)
+
+
+def route_cells(origins, destinations, route_counts) -> pd.DataFrame:
+    """
+    The function returns the non-empty cells of an origin-destination count matrix as from, to and count rows,
+    sorted by place names so the order of the matrix rows and columns doesn't matter.
+    """
+    cells = pd.DataFrame(route_counts, index=pd.Index(origins, name='from'),
+                         columns=pd.Index(destinations, name='to')).stack().rename('count').reset_index()
+    return cells[cells['count'] > 0].sort_values(['from', 'to'], ignore_index=True)
+
+
+def matplotlib_outputs(workbook_path: str) -> Dict[str, Any]:
+    """
+    The function calculates every statistic of the matplotlib menu on a workbook.
+    """
+    data_processing = import_front_end_module(MATPLOTLIB_DIR, 'data_processing', 'matplotlib_data_processing')
+    tremps_df, users_df, users_in_tremp_df, _ = data_processing.change_file(workbook_path)
+    route_matrix = data_processing.calc_route_matrix(tremps_df)
+    return {
+        'total_tremps': data_processing.calc_total_tremps(tremps_df, users_in_tremp_df),
+        'total_hitchhikers': data_processing.calc_total_hitchhikers(tremps_df, users_in_tremp_df),
+        'avg_people_per_tremp': data_processing.calc_avg_people_per_tremp(tremps_df, users_in_tremp_df),
+        'percentages': data_processing.calculate_percentages(tremps_df, users_in_tremp_df),
+        'top_hours': data_processing.calculate_top_hours(tremps_df),
+        'top_5_drivers': data_processing.calc_top_5_drivers(tremps_df, users_in_tremp_df, users_df)[
+            ['Driver', 'Number of Rides']],
+        'top_5_routes': data_processing.calc_top_5_routes(route_matrix)[['from_route', 'to_route', 'Count']],
+        'route_matrix': route_cells(route_matrix.origins, route_matrix.destinations, route_matrix.counts),
+    }
+
+
+def streamlit_outputs(workbook_path: str) -> Dict[str, Any]:
+    """
+    The function calculates every statistic of the Streamlit dashboard on a workbook, for the full dataset
+    and for every tremp type on its own.
+    """
+    data_processing = import_front_end_module(STREAMLIT_DIR, 'data_processing', 'streamlit_data_processing')
+    sidebar = import_front_end_module(STREAMLIT_DIR, 'sidebar', 'streamlit_sidebar')
+    background_statistics = import_front_end_module(STREAMLIT_DIR, 'background_statistics',
+                                                    'streamlit_background_statistics')
+    df_tremps, df_users, df_users_in_tremp = data_processing.load_data(workbook_path)
+    df = data_processing.transform_data(df_tremps, df_users, df_users_in_tremp)
+    min_date, max_date = df['date'].min().date(), df['date'].max().date()
+
+    outputs = {}
+    for tremp_type in ['All', *data_processing.TREMP_TYPES]:
+        df_view = sidebar.filter_data(df, tremp_type, '', '', '', '', min_date, max_date)
+        # The statistics the dashboard shows, calculated by its own tasks
+        statistics, _ = background_statistics.calculate_statistics(df_view, df_users, df_users_in_tremp)
+        od_counts = statistics['route_heatmap']
+        outputs[tremp_type] = {
+            'total_statistics': statistics['total_statistics'],
+            'top_drivers': statistics['top_drivers'],
+            'top_routes': statistics['top_routes'],
+            'top_hours': statistics['top_hours'],
+            'origin_totals': statistics['origin_totals'].sort_index(),
+            'od_counts': route_cells(od_counts.index, od_counts.columns, od_counts.to_numpy()),
+            'tremp_type_counts': statistics['tremp_type_counts'],
+            'gender_grouped': statistics['gender_grouped'],
+        }
+    return outputs
+
+
+def out_of_core_differences(workbook_path: str) -> List[str]:
+    """
+    The function calculates the statistics of the shared package on a workbook out of core and in memory, and
+    returns the statistics that aren't exactly the same.
+    """
+    data_processing = import_front_end_module(STREAMLIT_DIR, 'data_processing', 'streamlit_data_processing')
+    df_tremps, df_users, df_users_in_tremp = data_processing.load_data(workbook_path)
+
+    statistics = []
+    for rides_given_only in (False, True):
+        aggregates = analytics.map_reduce_aggregates(df_tremps, df_users, df_users_in_tremp, rides_given_only=
+                                                     rides_given_only, chunk_rows=OUT_OF_CORE_CHUNK_ROWS,
+                                                     max_workers=OUT_OF_CORE_WORKERS)
+        statistics.append((f'driver_rides/{rides_given_only}', aggregates.driver_rides.sort_index(),
+                           analytics.calculate_driver_ride_counts(df_tremps, df_users_in_tremp,
+                                                                  rides_given_only).sort_index()))
+        statistics.append((f'top_drivers/{rides_given_only}', aggregates.top_drivers(),
+                           analytics.calculate_top_drivers(df_tremps, df_users_in_tremp, rides_given_only)))
+    for round_up_from_minute in (analytics.HALF_HOUR_MINUTE, analytics.HALF_HOUR_MINUTE + 1):
+        aggregates = analytics.map_reduce_aggregates(df_tremps, df_users, df_users_in_tremp, round_up_from_minute,
+                                                     chunk_rows=OUT_OF_CORE_CHUNK_ROWS, max_workers=1)
+        statistics.append((f'top_hours/{round_up_from_minute}', aggregates.top_hours(),
+                           analytics.calculate_top_hours(df_tremps['tremp_time'], round_up_from_minute)))
+    statistics += [
+        ('totals', (aggregates.total_hitchhikers, aggregates.joined_tremps),
+         analytics.calculate_participation_totals(df_tremps, df_users_in_tremp)),
+        ('participation_by_tremp_type', aggregates.participation_by_tremp_type(),
+         analytics.calculate_participation_by_tremp_type(df_tremps, df_users_in_tremp)),
+        ('participations_by_month_and_gender', aggregates.participations_by_month_and_gender(),
+         analytics.count_participations_by_month_and_gender(df_tremps, df_users, df_users_in_tremp)),
+    ]
+
+    # The same statistics with the chunks streamed from the workbook instead of sliced from the loaded tables
+    aggregates, _ = analytics.out_of_core_aggregates(workbook_path, rides_given_only=True,
+                                                     range_tremp_ids=OUT_OF_CORE_RANGE_TREMP_IDS,
+                                                     max_workers=OUT_OF_CORE_WORKERS)
+    statistics += [
+        ('workbook_chunks/totals', (aggregates.total_hitchhikers, aggregates.joined_tremps),
+         analytics.calculate_participation_totals(df_tremps, df_users_in_tremp)),
+        ('workbook_chunks/top_drivers', aggregates.top_drivers(),
+         analytics.calculate_top_drivers(df_tremps, df_users_in_tremp, rides_given_only=True)),
+        ('workbook_chunks/top_hours', aggregates.top_hours(),
+         analytics.calculate_top_hours(df_tremps['tremp_time'], analytics.HALF_HOUR_MINUTE)),
+        ('workbook_chunks/participations_by_month_and_gender', aggregates.participations_by_month_and_gender(),
+         analytics.count_participations_by_month_and_gender(df_tremps, df_users, df_users_in_tremp)),
+    ]
+
+    workbook_name = os.path.basename(workbook_path)
+    return [f"{workbook_name}/out_of_core/{name}: in memory {to_json_value(expected)}, out of core "
+            f"{to_json_value(actual)}"
+            for name, actual, expected in statistics if to_json_value(actual) != to_json_value(expected)]
+
+
+def calculate_outputs() -> Dict[str, Any]:
+    """
+    The function calculates the statistics of both front ends on every sample workbook, as JSON values.
+    """
+    return to_json_value({
+        os.path.basename(workbook_path): {
+            'matplotlib': matplotlib_outputs(workbook_path),
+            'streamlit': streamlit_outputs(workbook_path),
+        }
+        for workbook_path in SAMPLE_WORKBOOKS
+    })
+
+
+def same_values(expected: Any, actual: Any) -> bool:
+    """
+    The function compares two JSON values, floats up to FLOAT_TOLERANCE.
+    """
+    if isinstance(expected, float) or isinstance(actual, float):
+        return (isinstance(expected, (int, float)) and isinstance(actual, (int, float))
+                and math.isclose(expected, actual, rel_tol=FLOAT_TOLERANCE, abs_tol=FLOAT_TOLERANCE))
+    if isinstance(expected, list) and isinstance(actual, list):
+        return len(expected) == len(actual) and all(map(same_values, expected, actual))
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        return expected.keys() == actual.keys() and all(same_values(expected[key], actual[key]) for key in expected)
+    return expected == actual
+
+
+def same_ranking(expected: List[list], actual: List[list]) -> bool:
+    """
+    The function compares two top lists whose entries end with their count. The counts must be the same in the
+    same order, and every entry must be the same except the entries tied on the last count, which can be any
+    of the tied ones.
+    """
+    if [entry[-1] for entry in expected] != [entry[-1] for entry in actual]:
+        return False
+    if not expected:
+        return True
+    # Ascending and descending top lists both have the cut-off count at one of their ends
+    cutoff_count = min(entry[-1] for entry in expected)
+    return ({tuple(entry) for entry in expected if entry[-1] != cutoff_count} ==
+            {tuple(entry) for entry in actual if entry[-1] != cutoff_count})
+
+
+def compare_outputs(expected: Any, actual: Any, path: str = '') -> List[str]:
+    """
+    The function compares the calculated statistics with the golden ones.
+
+    :return: a list of the statistics that differ, empty when all of them match.
+    """
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        differences = [f"{path}/{key}: missing" for key in expected.keys() - actual.keys()]
+        for key in expected.keys() & actual.keys():
+            differences += compare_outputs(expected[key], actual[key], f"{path}/{key}")
+        return sorted(differences)
+
+    statistic = path.rsplit('/', 1)[-1]
+    if statistic in RANKED_STATISTICS and isinstance(expected, list) and isinstance(actual, list):
+        matches = same_ranking(expected, actual)
+    else:
+        matches = same_values(expected, actual)
+    return [] if matches else [f"{path}: expected {expected}, got {actual}"]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare the statistics of both front ends with their golden "
+                                                 "outputs.")
+    parser.add_argument('--update', action='store_true',
+                        help="record the current outputs as the golden ones, only when a change is intended")
+    args = parser.parse_args()
+
+    outputs = calculate_outputs()
+    if args.update:
+        with open(GOLDEN_FILE, 'w') as golden_file:
+            json.dump(outputs, golden_file, indent=1, ensure_ascii=False)
+        print(f"Recorded the golden outputs of {len(outputs)} workbooks")
+        return 0
+
+    with open(GOLDEN_FILE) as golden_file:
+        golden = json.load(golden_file)
+
+    differences = compare_outputs(golden, outputs)
+    for workbook_path in SAMPLE_WORKBOOKS:
+        differences += out_of_core_differences(workbook_path)
+    for difference in differences:
+        print(f"DIFFERENT - {difference}")
+    print(f"{len(differences)} differences in the statistics of {len(golden)} workbooks")
+    return 1 if differences else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
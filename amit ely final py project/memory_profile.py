@@ -0,0 +1,152 @@
+# /memory_profile.py
+"""
+Opt-in memory profiling of the pipeline stages of both front ends (load, transform, statistics).
+
+Set TREMPBOSS_MEMORY_PROFILE=1 (or to a folder for the reports) before starting a front end. Every stage is
+traced with tracemalloc and gets its peak memory (the most memory allocated at once during the stage, above what
+was allocated before it), its retained memory (what is still allocated when it ends) and the code lines that
+retained the most. Each run writes a JSON report, with the same keys in the same order in every run, so the
+reports of two releases can be diffed. tracemalloc only sees the memory allocated through Python, the buffers
+of native readers and the memory of worker processes are not part of the numbers.
+
+Only the standard library is imported here, the front ends can check for profiling before loading pandas.
+"""
+import importlib.metadata
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import List, Optional
+
+MEMORY_PROFILE_ENV = 'TREMPBOSS_MEMORY_PROFILE'
+# Folder of the reports when the environment variable is just turned on (1, true, yes)
+DEFAULT_REPORT_DIR = 'memory_reports'
+
+# Number of allocation sites reported per stage
+TOP_ALLOCATION_SITES = 10
+
+# Frames kept per allocation, one frame (the allocating line) is enough for the top sites and the cheapest
+TRACED_FRAMES = 1
+
+# Libraries whose versions are written in the report, when they are loaded
+REPORTED_LIBRARIES = ['numpy', 'pandas', 'pyarrow', 'python_calamine', 'openpyxl', 'matplotlib', 'streamlit']
+
+
+def to_mib(size_bytes: int) -> float:
+    return round(size_bytes / 2 ** 20, 3)
+
+
+def short_path(filename: str) -> str:
+    """
+    The function returns the path of a source file relative to the entry of sys.path it was imported from, so
+    the allocation sites read the same on every machine.
+    """
+    for path_entry in sorted(filter(None, sys.path), key=len, reverse=True):
+        if filename.startswith(os.path.join(path_entry, '')):
+            return os.path.relpath(filename, path_entry)
+    return os.path.basename(filename)
+
+
+class MemoryProfiler:
+    """
+    Traces the memory of the stages of a run and writes their report. tracemalloc is process wide, so
+    allocations of other threads (like the statistics of the dashboard) are counted in the running stage.
+    """
+
+    def __init__(self, front_end: str, workbook: str, report_dir: str = DEFAULT_REPORT_DIR,
+                 top_sites: int = TOP_ALLOCATION_SITES):
+        self.front_end = front_end
+        self.workbook = os.path.basename(workbook)
+        self.report_dir = report_dir
+        self.top_sites = top_sites
+        self.stages: List[dict] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Traces the memory allocated while the block runs and records it as a stage of the run.
+        """
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(TRACED_FRAMES)
+        before = tracemalloc.take_snapshot()
+        current_before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            current_after, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            if started_tracing:
+                tracemalloc.stop()
+
+            # The snapshots themselves are allocated by tracemalloc, its own lines are left out
+            site_filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+            site_differences = after.filter_traces(site_filters).compare_to(before.filter_traces(site_filters),
+                                                                            'lineno')
+            self.stages.append({
+                'stage': name,
+                'seconds': round(seconds, 3),
+                'peak_mib': to_mib(peak - current_before),
+                'retained_mib': to_mib(current_after - current_before),
+                'top_sites': [{'site': f"{short_path(difference.traceback[0].filename)}:"
+                                       f"{difference.traceback[0].lineno}",
+                               'retained_mib': to_mib(difference.size_diff),
+                               'allocations': difference.count_diff}
+                              for difference in site_differences[:self.top_sites] if difference.size_diff > 0],
+            })
+
+    def report(self) -> dict:
+        """
+        Returns the report of the run: the front end, the workbook, the versions and the traced stages.
+        """
+        return {
+            'front_end': self.front_end,
+            'workbook': self.workbook,
+            'python': platform.python_version(),
+            'libraries': {library: importlib.metadata.version(library)
+                          for library in REPORTED_LIBRARIES if library in sys.modules},
+            'stages': self.stages,
+        }
+
+    def write_report(self) -> str:
+        """
+        Writes the report of the run to a new JSON file in the report folder.
+
+        :return: the path of the report file.
+        """
+        os.makedirs(self.report_dir, exist_ok=True)
+        timestamp = time.strftime('%Y-%m-%d_%H-%M-%S')
+        report_path = os.path.join(self.report_dir, f'{self.front_end}_{timestamp}.json')
+        with open(report_path, 'w') as report_file:
+            json.dump(self.report(), report_file, indent=2)
+        return report_path
+
+
+def memory_profiler_from_environment(front_end: str, workbook: str) -> Optional[MemoryProfiler]:
+    """
+    The function returns a profiler for a run when TREMPBOSS_MEMORY_PROFILE is set, otherwise None. The variable
+    is either 1 (reports go to ./memory_reports) or the folder of the reports.
+    """
+    setting = os.environ.get(MEMORY_PROFILE_ENV, '')
+    if setting.lower() in ('', '0', 'false', 'no'):
+        return None
+    report_dir = DEFAULT_REPORT_DIR if setting.lower() in ('1', 'true', 'yes') else setting
+    return MemoryProfiler(front_end, workbook, report_dir)
+
+
+@contextmanager
+def profile_stage(profiler: Optional[MemoryProfiler], name: str):
+    """
+    Traces the block as a stage of the profiler, or just runs it when profiling is off.
+    """
+    if profiler is None:
+        yield
+    else:
+        with profiler.stage(name):
+            yield
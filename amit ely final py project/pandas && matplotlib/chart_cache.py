@@ -0,0 +1,112 @@
+# Keeps rendered chart images on disk, so a chart of a workbook that didn't change is never drawn twice.
+import hashlib
+import json
+import os
+import tempfile
+
+# Folder of the cached images and the most space they take, the least recently used images are removed first
+CHART_CACHE_DIR_ENV = 'TREMPBOSS_CHART_CACHE_DIR'
+DEFAULT_CHART_CACHE_DIR = './chart_cache'
+CHART_CACHE_SIZE_ENV = 'TREMPBOSS_CHART_CACHE_MB'
+DEFAULT_CHART_CACHE_MB = 50
+
+# The code that calculates and draws the charts, a change in any of them makes new images
+RENDERER_FILES = ['data_processing.py', 'data_visualization.py', 'chart_export.py']
+# The package of the statistics shared by both front ends, next to this folder, all its modules count too
+ANALYTICS_PACKAGE = 'trempboss_analytics'
+
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+# Returns the sha256 of the contents of a file
+def file_fingerprint(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(READ_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Returns a fingerprint of the chart code and the matplotlib version, images drawn by other code aren't reused
+def renderer_fingerprint():
+    import matplotlib
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    renderer_paths = [os.path.join(module_dir, file_name) for file_name in RENDERER_FILES]
+    analytics_dir = os.path.join(os.path.dirname(module_dir), ANALYTICS_PACKAGE)
+    renderer_paths += [os.path.join(analytics_dir, file_name) for file_name in sorted(os.listdir(analytics_dir))
+                       if file_name.endswith('.py')]
+    renderer_files = [file_fingerprint(file_path) for file_path in renderer_paths]
+    return hashlib.sha256(json.dumps([matplotlib.__version__, renderer_files]).encode()).hexdigest()
+
+
+# Returns the cache key of a chart: the fingerprint of its dataset, its name and its options (like the image dpi)
+def chart_key(dataset_fingerprint, chart_name, options):
+    key_parts = [dataset_fingerprint, chart_name, options]
+    return hashlib.sha256(json.dumps(key_parts, sort_keys=True).encode()).hexdigest()
+
+
+class ChartCache:
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_environment(cls):
+        cache_dir = os.environ.get(CHART_CACHE_DIR_ENV, DEFAULT_CHART_CACHE_DIR)
+        max_mb = float(os.environ.get(CHART_CACHE_SIZE_ENV, DEFAULT_CHART_CACHE_MB))
+        return cls(cache_dir, int(max_mb * 1024 * 1024))
+
+    def image_path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.png')
+
+    # Returns the path of the cached image of a key, or None when it isn't cached
+    def get(self, key):
+        image_path = self.image_path(key)
+        try:
+            # The modification time is the last use of the image, for the eviction
+            os.utime(image_path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return image_path
+
+    # Saves the image of a figure under a key and returns its path. The image is written to a temporary file that
+    # replaces the cached one at once, so a stopped run never leaves a broken image in the cache.
+    def put(self, key, figure, dpi):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        file_descriptor, temporary_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+        try:
+            with os.fdopen(file_descriptor, 'wb') as image_file:
+                figure.savefig(image_file, format='png', dpi=dpi)
+            os.replace(temporary_path, self.image_path(key))
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+        self.evict(keep=self.image_path(key))
+        return self.image_path(key)
+
+    # Removes the least recently used images until the cache fits in max_bytes, the image just saved is kept
+    def evict(self, keep=None):
+        images = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.png') and entry.is_file():
+                stat = entry.stat()
+                images.append((stat.st_mtime, stat.st_size, entry.path))
+        total_bytes = sum(size for _, size, _ in images)
+        for _, size, image_path in sorted(images):
+            if total_bytes <= self.max_bytes:
+                break
+            if image_path != keep:
+                os.remove(image_path)
+                total_bytes -= size
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def report(self):
+        return (f"Chart cache: {self.hits} hits, {self.misses} misses "
+                f"({self.hit_rate():.0%} hit rate) in {self.cache_dir}")
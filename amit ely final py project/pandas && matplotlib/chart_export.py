@@ -0,0 +1,88 @@
+# Saves every chart of a workbook as a PNG image. Charts that were already drawn for the same workbook are copied
+# from the chart cache, without calculating their statistics or drawing them again.
+import os
+import shutil
+
+import matplotlib.pyplot as plt
+
+import data_processing
+import data_visualization
+from chart_cache import ChartCache, chart_key, file_fingerprint, renderer_fingerprint
+
+# Resolution of the exported images
+CHART_DPI = 100
+
+
+# Draws the heatmap of the busiest places of a route matrix
+def draw_route_matrix_heatmap(route_matrix, max_places):
+    data_visualization.draw_route_heatmap(route_matrix.origins, route_matrix.destinations, route_matrix.counts,
+                                          max_places=max_places)
+
+
+# The exported charts: file name, options that change the image, and a function that draws it from the LazyTables
+# of the file. tables.get() returns (tremps_df, users_df, users_in_tremp_df, tremps_with_year_month,
+# combined_table), the route matrix and the seat occupancy are calculated once by the LazyTables for all their
+# charts.
+CHARTS = [
+    ('tremps_by_year_month', {}, lambda tables: data_visualization.draw_tremps_by_year_month(tables.get()[3])),
+    ('tremps_by_month', {}, lambda tables: data_visualization.draw_tremps_by_month(tables.get()[3])),
+    ('top_5_drivers', {}, lambda tables: data_visualization.draw_top_5_drivers(
+        data_processing.calc_top_5_drivers(tables.get()[0], tables.get()[2], tables.get()[1]))),
+    ('top_5_routes', {}, lambda tables: data_visualization.draw_top_5_routes(
+        data_processing.calc_top_5_routes(tables.get_route_matrix()))),
+    ('routes_heatmap', {'max_places': 15}, lambda tables: draw_route_matrix_heatmap(
+        tables.get_route_matrix(), max_places=15)),
+    ('top_5_hours', {}, lambda tables: data_visualization.draw_top_hours(
+        data_processing.get_top_hour_df(data_processing.calculate_top_hours(tables.get()[0])))),
+    ('tremp_types_percentages', {}, lambda tables: data_visualization.draw_pie_chart(
+        data_processing.calculate_percentages(tables.get()[0], tables.get()[2]))),
+    ('gender_percentages', {'as_percentage': True}, lambda tables: data_visualization.draw_gender_count(
+        tables.get()[1], as_percentage=True)),
+    ('gender_count', {'as_percentage': False}, lambda tables: data_visualization.draw_gender_count(
+        tables.get()[1], as_percentage=False)),
+    ('seat_utilization_by_month', {}, lambda tables: data_visualization.draw_utilization_by_month(
+        tables.get_seat_occupancy())),
+    ('seat_utilization_by_hour', {}, lambda tables: data_visualization.draw_utilization_by_hour(
+        tables.get_seat_occupancy())),
+    ('empty_seat_hotspots', {}, lambda tables: data_visualization.draw_unfilled_hotspots(
+        tables.get_seat_occupancy())),
+]
+
+# The cache of the whole session, its hit rate covers every export since the menu started
+_chart_cache = None
+
+
+def get_chart_cache():
+    global _chart_cache
+    if _chart_cache is None:
+        _chart_cache = ChartCache.from_environment()
+    return _chart_cache
+
+
+# Draws a chart on a new figure that is never shown and saves it in the cache, returns the path of the image
+def render_chart(cache, key, draw, tables):
+    with plt.ioff():
+        figure = plt.figure()
+    try:
+        draw(tables)
+        return cache.put(key, figure, CHART_DPI)
+    finally:
+        plt.close(figure)
+
+
+# Saves the images of all the charts of the tables of a file in output_folder, returns the number of images
+# that came from the cache. The tables are only loaded when a chart isn't in the cache.
+def export_charts(tables, output_folder):
+    cache = get_chart_cache()
+    dataset_fingerprint = file_fingerprint(tables.file_path) + renderer_fingerprint()
+    os.makedirs(output_folder, exist_ok=True)
+    cached_charts = 0
+    for file_name, options, draw in CHARTS:
+        key = chart_key(dataset_fingerprint, file_name, dict(options, dpi=CHART_DPI))
+        image_path = cache.get(key)
+        if image_path is None:
+            image_path = render_chart(cache, key, draw, tables)
+        else:
+            cached_charts += 1
+        shutil.copyfile(image_path, os.path.join(output_folder, f'{file_name}.png'))
+    return cached_charts
@@ -4,12 +4,22 @@ from datetime import datetime
 import os
 # Used to read files ,deal with merges
 import pandas as pd
+# The statistics shared with the Streamlit dashboard
+import trempboss_analytics as analytics
+
+
+# The sheets of the Excel file the menu uses, the other sheets are not read
+SHEET_NAMES = ['tremps', 'users', 'users_in_tremps']
+
+# The menu rounds a tremp time up to the next hour from the half hour (hh:30 and later)
+ROUND_UP_FROM_MINUTE = analytics.HALF_HOUR_MINUTE
 
 
 # Reads an Excel file and returns three specific sheets from the file.
+# All their columns are kept, the menu can show the full tables.
 def load_data(file_path: str):
-    all_sheets = pd.read_excel(file_path, sheet_name=None)
-    return all_sheets['tremps'], all_sheets['users'], all_sheets['users_in_tremps']
+    sheets = pd.read_excel(file_path, sheet_name=SHEET_NAMES)
+    return sheets['tremps'], sheets['users'], sheets['users_in_tremps']
 
 
 # Merges three dataframes and performs various transformations and aggregations to create a combined table.
@@ -46,6 +56,12 @@ def get_combined_table(tremps_df: pd.DataFrame, users_df: pd.DataFrame, users_in
 # change file , gets the new path and return the new tables
 def change_file(file_path: str):
     tremps_df, users_df, users_in_tremp_df = load_data(file_path)
+    tremps_df, tremps_with_year_month = split_dates(tremps_df)
+    return tremps_df, users_df, users_in_tremp_df, tremps_with_year_month
+
+
+# Returns the tremps with their date as text, and a copy of them with the year and month of every tremp as well.
+def split_dates(tremps_df: pd.DataFrame):
     # Extract year and month from the 'date' column
     tremps_with_year_month = tremps_df.copy()
     tremps_with_year_month['month'] = tremps_with_year_month['date'].dt.month
@@ -55,110 +71,122 @@ def change_file(file_path: str):
     tremps_df['date'] = tremps_df['date'].dt.strftime('%Y-%m-%d')
     tremps_with_year_month['date'] = tremps_with_year_month['date'].dt.strftime('%Y-%m-%d')
 
-    # Merge users_in_tremp_df with tremps_df
-
-    return tremps_df, users_df, users_in_tremp_df, tremps_with_year_month
+    return tremps_df, tremps_with_year_month
 
 
 def calc_total_hitchhikers(tremps_df: pd.DataFrame, users_in_tremp_df: pd.DataFrame):
-    non_creator_users_in_tremp = users_in_tremp_df[~users_in_tremp_df['is_tremp_creator']]
-    total_hitchhikers = non_creator_users_in_tremp.shape[0]
-    hitchhiker_tremps_with_non_creators = tremps_df[
-        (tremps_df['tremp_id'].isin(non_creator_users_in_tremp['tremp_id'].unique())) &
-        (tremps_df['tremp_type'] == 'hitchhiker')
-        ]
-
-    # Add the seats_amount from these tremps to total_hitchhikers
-    total_hitchhikers += hitchhiker_tremps_with_non_creators['seats_amount'].sum()
+    # Users that joined a tremp, plus the seats asked for in the hitchhiker tremps they joined
+    total_hitchhikers, _ = analytics.calculate_participation_totals(tremps_df, users_in_tremp_df)
     return total_hitchhikers
 
 
-def calc_total_tremps(users_in_tremp_df: pd.DataFrame):
-    non_creator_users_in_tremp = users_in_tremp_df[~users_in_tremp_df['is_tremp_creator']]
+def calc_total_tremps(tremps_df: pd.DataFrame, users_in_tremp_df: pd.DataFrame):
     # Calculate the total number of tremps with non-creator users
-    total_tremps = non_creator_users_in_tremp['tremp_id'].nunique()
+    _, total_tremps = analytics.calculate_participation_totals(tremps_df, users_in_tremp_df)
     return total_tremps
 
 
 def calc_avg_people_per_tremp(tremps_df: pd.DataFrame, users_in_tremp_df: pd.DataFrame):
-    # Calculate the average people per tremp
-    total_hitchhikers = calc_total_hitchhikers(tremps_df, users_in_tremp_df)
-    total_tremps = calc_total_tremps(users_in_tremp_df)
-    avg_people_per_tremp = total_hitchhikers / total_tremps
-    # Format average people per tremp to two decimal places
-    avg_people_per_tremp = "{:.2f}".format(avg_people_per_tremp)
-
-    return avg_people_per_tremp
+    # Calculate the average people per tremp, formatted to two decimal places
+    total_hitchhikers, total_tremps = analytics.calculate_participation_totals(tremps_df, users_in_tremp_df)
+    return analytics.format_average_people_per_tremp(total_hitchhikers, total_tremps)
 
 
+# Returns the percentages of opened rides, joined rides, joined tremps and opened tremps out of all of them.
 def calculate_percentages(tremps_df: pd.DataFrame, users_in_tremp_df: pd.DataFrame):
-    # Count the number of opened rides and opened tremps
-    open_rides = tremps_df[tremps_df['tremp_type'] == "driver"].shape[0]
-    open_tremps = tremps_df[tremps_df['tremp_type'] == "hitchhiker"].shape[0]
-
-    # Merge the 'tremps' DataFrame with 'users_in_tremps' based on 'tremp_id' /only if is_tremp_creator is false.
-    # tremp_id  tremp_type  date year  user_id is_tremp_creator
-    merged_df = tremps_df.merge(users_in_tremp_df[~users_in_tremp_df['is_tremp_creator']], on='tremp_id')
-    # Group by 'tremp_id' and 'tremp_type' and calculate the percentage of tremps for each 'tremp_id'
-    # To see how many joined each tremps/rides
-    # tremp_id  tremp_type  Number of Tremps
-    tremps_percentage_df = (
-        merged_df.groupby(['tremp_id', 'tremp_type'])
-        .size()
-        .reset_index(name='Number of Tremps')
-    )
-    # Calc the sum of users joined tremp/ride
-    tremps_by_type = tremps_percentage_df.groupby('tremp_type')['Number of Tremps'].sum()
-    join_drive = tremps_by_type['driver']
-    join_tremp = tremps_by_type['hitchhiker']
-
-    total_tremps = open_rides + open_tremps + join_drive + join_tremp
-    # Calculate the percentages
-    open_rides_percentage = (open_rides / total_tremps) * 100
-    join_drive_percentage = (join_drive / total_tremps) * 100
-    join_tremp_percentage = (join_tremp / total_tremps) * 100
-    open_tremps_percentage = (open_tremps / total_tremps) * 100
-
-    return open_rides_percentage, join_drive_percentage, join_tremp_percentage, open_tremps_percentage
+    return analytics.calculate_tremp_type_percentages(tremps_df, users_in_tremp_df)
 
 
+# Returns the 5 rounded hours with the most tremps and their number of tremps, the busiest first.
 def calculate_top_hours(tremps_df: pd.DataFrame):
-    # Convert 'tremp_time' to datetime
-    tremp_times = tremps_df['tremp_time']
-    tremp_times = pd.to_datetime(tremp_times, format='%H:%M:%S')  # Convert 'tremp_time' to datetime format
-
-    # Round hours
-    rounded_hours = (tremp_times.dt.hour + (tremp_times.dt.minute >= 30)).mod(24)
+    return analytics.calculate_top_hours(tremps_df['tremp_time'], ROUND_UP_FROM_MINUTE)
 
-    # Count the occurrences of each rounded hour and get the top 5 hours
-    top_hours = rounded_hours.value_counts().nlargest(5).sort_values(ascending=False)
 
-    return top_hours
+# Returns the 5 drivers that opened the most rides.
+# user_id  Number of Rides  Driver
+def calc_top_5_drivers(tremps_df: pd.DataFrame, users_in_tremp_df: pd.DataFrame, users_df: pd.DataFrame):
+    top_5_drivers = analytics.calculate_top_drivers(tremps_df, users_in_tremp_df)
+    return get_top_5_drivers_df(top_5_drivers, users_df)
 
 
-def calc_top_5_drivers(tremps_df: pd.DataFrame, users_in_tremp_df: pd.DataFrame, users_df: pd.DataFrame):
-    # Filter tremps_df to keep only rows where tremp_type is "driver"
-    # tremp_id tremp_type date to_route  month  year
-    driver_tremps_df = tremps_df[tremps_df['tremp_type'] == "driver"]
-    # user_id  tremp_id  is_tremp_creator | only is_tremp_creator==true
-    users_created_tremps_df = users_in_tremp_df[users_in_tremp_df['is_tremp_creator']]
-    # tremp_id tremp_type date  month  year user_id
-    merged_df = driver_tremps_df.merge(users_created_tremps_df[['tremp_id', 'user_id']], on='tremp_id')
-    # Get the top 5 drivers with the highest number of rides using group by and nlargest.
-    # Number of Rides  |  Driver name
+# Puts the names of the drivers next to their number of rides.
+# user_id  Number of Rides  Driver
+def get_top_5_drivers_df(top_5_drivers: pd.Series, users_df: pd.DataFrame):
     top_5_drivers_df = (
-        merged_df
-        .groupby('user_id')  # Group by 'user_id' to count the number of rides for each driver
-        .size()
-        .nlargest(5)
+        top_5_drivers
+        .rename_axis('user_id')
         .reset_index(name='Number of Rides')  # give the row new index , with the name Number of rides
         .merge(users_df[['user_id', 'full_name']], on='user_id')  # Merge with users_df to get 'full_name'
         .rename(columns={'full_name': 'Driver'})  # rename the column title name to driver
-        # .drop(columns=['user_id'])  # remove the id field from the row
     )
     return top_5_drivers_df
 
 
+# Counts the tremps between every origin and destination with a single bincount over integer route codes.
+# Returns the route matrix: the origin names, the destination names and the count matrix (rows are origins,
+# columns destinations). LazyTables builds it once per file, the top routes and the heatmap are read from it.
+def calc_route_matrix(tremps_df: pd.DataFrame):
+    return analytics.build_route_matrix(tremps_df)
+
+
+# Returns the 5 routes with the most tremps, read from the route matrix. Tied routes are in alphabetical order.
+# from_route   to_route  Count
+def calc_top_5_routes(route_matrix):
+    top_5_routes = route_matrix.top_route_frame(first_seen_ties=False)
+    return top_5_routes.rename(columns={'count': 'Count'})
+
+
+# Calculates every statistic of the menu once, used to profile the memory of the statistics of a file.
+def calc_all_statistics(tremps_df: pd.DataFrame, users_df: pd.DataFrame, users_in_tremp_df: pd.DataFrame):
+    route_matrix = calc_route_matrix(tremps_df)
+    return {
+        'total_tremps': calc_total_tremps(tremps_df, users_in_tremp_df),
+        'total_hitchhikers': calc_total_hitchhikers(tremps_df, users_in_tremp_df),
+        'avg_people_per_tremp': calc_avg_people_per_tremp(tremps_df, users_in_tremp_df),
+        'percentages': calculate_percentages(tremps_df, users_in_tremp_df),
+        'top_hours': calculate_top_hours(tremps_df),
+        'top_5_drivers': calc_top_5_drivers(tremps_df, users_in_tremp_df, users_df),
+        'top_5_routes': calc_top_5_routes(route_matrix),
+        'route_matrix': route_matrix,
+        'seat_occupancy': calc_seat_occupancy(tremps_df, users_in_tremp_df),
+    }
+
+
+# Calculates the totals, the top hours and the top 5 drivers of a file chunk by chunk of tremp ids in worker
+# processes. The sheets are streamed from the file and never loaded whole, used when TREMPBOSS_OUT_OF_CORE is set.
+def calc_out_of_core_statistics(file_path: str):
+    aggregates, users_df = analytics.out_of_core_aggregates(file_path, ROUND_UP_FROM_MINUTE)
+    return {
+        'total_tremps': aggregates.joined_tremps,
+        'total_hitchhikers': aggregates.total_hitchhikers,
+        'avg_people_per_tremp': analytics.format_average_people_per_tremp(aggregates.total_hitchhikers,
+                                                                          aggregates.joined_tremps),
+        'top_hours': aggregates.top_hours(),
+        'top_5_drivers': get_top_5_drivers_df(aggregates.top_drivers(), users_df),
+    }
+
+
+# Returns the offered and filled seats of the driver tremps by route, hour and month, and the routes and hours with
+# the most empty seats. The filled seats of every tremp are counted in one pass over users_in_tremp_df.
+def calc_seat_occupancy(tremps_df: pd.DataFrame, users_in_tremp_df: pd.DataFrame):
+    filled_seats = analytics.count_filled_seats(tremps_df, users_in_tremp_df)
+    return analytics.calculate_seat_occupancy(tremps_df.assign(filled_seats=filled_seats), ROUND_UP_FROM_MINUTE)
+
+
+# Returns the activity profiles of all the users, built in one pass over users_in_tremp_df. LazyTables builds them
+# once per file, a profile is then looked up by its user id.
+def calc_user_profiles(tremps_df: pd.DataFrame, users_df: pd.DataFrame, users_in_tremp_df: pd.DataFrame):
+    return analytics.build_user_profiles(tremps_df, users_df, users_in_tremp_df, ROUND_UP_FROM_MINUTE)
+
+
+# Returns the profile of a user as text, with the name of the user first, or None when there is no such user.
+def get_user_profile(user_profiles, user_id: int):
+    profile = user_profiles.lookup(user_id)
+    if profile is None:
+        return None
+    return pd.concat([pd.Series({'Name': user_profiles.full_name(user_id)}), analytics.format_user_profile(profile)])
+
+
 def get_top_hour_df(top_hours):
     # The code is creating a new DataFrame called `top_hours_df` using the `pd.DataFrame()` function. It
     # is constructing the DataFrame with three columns: 'Index', 'Hour Value', and 'Occurrences'.
@@ -1,29 +1,33 @@
 # To display graphs
 import matplotlib.pyplot as plt
+# To pick the busiest places of the route matrix
+import numpy as np
 # To get the percentages from the data_processing
 from data_processing import calculate_percentages
+# To draw every chart in its own reused window without stopping the menu
+from figure_pool import chart_figure, show_chart
 
-# To see table in new window
-import tkinter as tk
-from tkinter import ttk
 
-
-#
-def plot_tremps_by_month(tremps_df):
+# Every chart has a draw function that draws it on the current figure, used for the windows of the menu and for
+# the exported images, and a plot function that shows it in its window.
+def draw_tremps_by_month(tremps_df):
     tremps_by_month = tremps_df.groupby('month').size()
-    plt.figure()
     tremps_by_month.plot(kind='bar')
     plt.xlabel('Month')
     plt.ylabel('Number of Tremps')
     plt.title('Number of Tremps in Each Month')
     plt.xticks(rotation=0)
-    plt.show()
 
 
-def plot_tremps_by_year_month(tremps_df):
+def plot_tremps_by_month(tremps_df):
+    figure = chart_figure('Tremps by Month')
+    draw_tremps_by_month(tremps_df)
+    show_chart(figure)
+
+
+def draw_tremps_by_year_month(tremps_df):
     # year  month  tremps_count
     tremps_by_year_month = tremps_df.groupby(['year', 'month']).size().reset_index(name='tremps_count')
-    plt.figure()
     plt.bar(range(len(tremps_by_year_month)), tremps_by_year_month['tremps_count'])
     plt.xlabel('Year - Month')
     plt.ylabel('Number of Tremps')
@@ -32,24 +36,31 @@ def plot_tremps_by_year_month(tremps_df):
     plt.xticks(range(len(tremps_by_year_month)), [f"{month}\\{year % 100}" for year, month in
                                                   zip(tremps_by_year_month['year'], tremps_by_year_month['month'])],
                rotation=90)
-    plt.show()
 
 
-def plot_top_5_drivers(top_5_drivers_df):
-    plt.figure()
+def plot_tremps_by_year_month(tremps_df):
+    figure = chart_figure('Tremps by Year and Month')
+    draw_tremps_by_year_month(tremps_df)
+    show_chart(figure)
+
+
+def draw_top_5_drivers(top_5_drivers_df):
     plt.bar(top_5_drivers_df['Driver'], top_5_drivers_df['Number of Rides'])
     plt.xlabel('Driver name')
     plt.ylabel('Number of Rides')
     plt.title('Top 5 Drivers with the Most Rides')
     plt.xticks(rotation=45, ha='right')
     plt.tight_layout()
-    plt.show()
 
 
-def plot_top_5_routes(tremps_df):
+def plot_top_5_drivers(top_5_drivers_df):
+    figure = chart_figure('Top 5 Drivers')
+    draw_top_5_drivers(top_5_drivers_df)
+    show_chart(figure)
+
+
+def draw_top_5_routes(top_5_routes):
     # from_route   to_route  Count
-    top_5_routes = tremps_df.groupby(['from_route', 'to_route']).size().nlargest(5).reset_index(name='Count')
-    plt.figure()
     plt.bar(range(len(top_5_routes)), top_5_routes['Count'])
     plt.xlabel('Route (From - To)')
     plt.ylabel('Number of Tremps')
@@ -58,17 +69,52 @@ def plot_top_5_routes(tremps_df):
                                           zip(top_5_routes['from_route'], top_5_routes['to_route'])], rotation=45,
                ha='right')
     plt.tight_layout()
-    plt.show()
 
 
-def plot_pie_chart(percentages):
+def plot_top_5_routes(top_5_routes):
+    figure = chart_figure('Top 5 Routes')
+    draw_top_5_routes(top_5_routes)
+    show_chart(figure)
+
+
+# Draws the number of tremps between the busiest origins (rows) and destinations (columns)
+def draw_route_heatmap(origins, destinations, route_counts, max_places=15):
+    origin_totals = route_counts.sum(axis=1)
+    destination_totals = route_counts.sum(axis=0)
+    top_origins = np.argsort(-origin_totals, kind='stable')[:max_places]
+    top_destinations = np.argsort(-destination_totals, kind='stable')[:max_places]
+    # Leave out places without tremps
+    top_origins = top_origins[origin_totals[top_origins] > 0]
+    top_destinations = top_destinations[destination_totals[top_destinations] > 0]
+    busiest_counts = route_counts[np.ix_(top_origins, top_destinations)]
+    plt.imshow(busiest_counts, cmap='Blues', aspect='auto')
+    plt.colorbar(label='Number of Tremps')
+    plt.xlabel('To')
+    plt.ylabel('From')
+    plt.title('Tremps Between the Busiest Places')
+    plt.xticks(range(len(top_destinations)), destinations[top_destinations], rotation=45, ha='right')
+    plt.yticks(range(len(top_origins)), origins[top_origins])
+    plt.tight_layout()
+
+
+def plot_route_heatmap(origins, destinations, route_counts, max_places=15):
+    figure = chart_figure('Routes Heatmap')
+    draw_route_heatmap(origins, destinations, route_counts, max_places)
+    show_chart(figure)
+
+
+def draw_pie_chart(percentages):
     labels = ['Open Rides', 'Join Drive', 'Join Tremp', 'Open Tremps']
     colors = ['#FFD700', '#FFA500', 'blue', '#87CEFA']
-    plt.figure()
     plt.pie(percentages, labels=labels, colors=colors, autopct='%1.1f%%', shadow=True)
     plt.axis('equal')
     plt.title('Percentage of Each Category')
-    plt.show()
+
+
+def plot_pie_chart(percentages):
+    figure = chart_figure('Tremp Types Percentages')
+    draw_pie_chart(percentages)
+    show_chart(figure)
 
 
 def plot_percentage_by_tremp_id(tremps_df, users_in_tremp_df):
@@ -76,7 +122,7 @@ def plot_percentage_by_tremp_id(tremps_df, users_in_tremp_df):
     plot_pie_chart(percentages)
 
 
-def plot_gender_count(users_df, as_percentage=False):
+def draw_gender_count(users_df, as_percentage=False):
     # male value  female value
     gender_counts = users_df['gender'].value_counts()
     total_users = len(users_df)
@@ -84,17 +130,14 @@ def plot_gender_count(users_df, as_percentage=False):
         gender_percentages = (gender_counts / total_users) * 100
         labels = ['Male', 'Female']  # Custom labels for the pie chart
         colors = ['#FFD700', '#FFA500']
-        plt.figure()
         # male  value | female  value
         plt.pie([gender_percentages['male'], gender_percentages['female']], labels=labels, colors=colors,
                 autopct='%1.1f%%', shadow=True)
         plt.axis('equal')  # Make it circle default ellipse
         plt.title('Percentage of Males and Females')
-        plt.show()
     else:
 
         # Plot a single bar with two different colors for male and female counts
-
         plt.bar(gender_counts.index, gender_counts.values, color=['#87CEFA', 'pink'])
         plt.ylabel('Count')
 
@@ -102,12 +145,14 @@ def plot_gender_count(users_df, as_percentage=False):
 
         plt.xticks(rotation=45)
 
-        plt.show()
 
+def plot_gender_count(users_df, as_percentage=False):
+    figure = chart_figure('Gender Percentages' if as_percentage else 'Gender Count')
+    draw_gender_count(users_df, as_percentage)
+    show_chart(figure)
 
-def plot_top_hours(top_hours_df):
-    # Create a new DataFrame with the desired structure
 
+def draw_top_hours(top_hours_df):
     # Create the bar plot
     plt.bar(top_hours_df['Index'], top_hours_df['Occurrences'])
 
@@ -117,10 +162,76 @@ def plot_top_hours(top_hours_df):
     plt.title('Top 5 Hours')
     plt.xticks(top_hours_df['Index'], top_hours_df['Hour Value'], rotation=45, ha='right')
     plt.tight_layout()
-    plt.show()
+
+
+def plot_top_hours(top_hours_df):
+    figure = chart_figure('Top 5 Hours')
+    draw_top_hours(top_hours_df)
+    show_chart(figure)
+
+
+def draw_utilization_by_month(seat_occupancy):
+    # month  offered  filled  utilization
+    by_month = seat_occupancy.by_month
+    plt.bar(range(len(by_month)), by_month['utilization'] * 100)
+    plt.xlabel('Month')
+    plt.ylabel('Filled Seats (%)')
+    plt.title('Seats Filled in the Driver Tremps of Each Month')
+    plt.xticks(range(len(by_month)), by_month.index, rotation=90)
+    plt.ylim(0, 100)
+    plt.tight_layout()
+
+
+def plot_utilization_by_month(seat_occupancy):
+    figure = chart_figure('Seat Utilization by Month')
+    draw_utilization_by_month(seat_occupancy)
+    show_chart(figure)
+
+
+def draw_utilization_by_hour(seat_occupancy):
+    # hour  offered  filled  utilization
+    by_hour = seat_occupancy.by_hour
+    plt.bar(by_hour.index, by_hour['utilization'] * 100)
+    plt.xlabel('Hour')
+    plt.ylabel('Filled Seats (%)')
+    plt.title('Seats Filled in the Driver Tremps of Each Hour')
+    plt.xticks(range(24), [f"{hour:02d}:00" for hour in range(24)], rotation=90)
+    plt.ylim(0, 100)
+    plt.tight_layout()
+
+
+def plot_utilization_by_hour(seat_occupancy):
+    figure = chart_figure('Seat Utilization by Hour')
+    draw_utilization_by_hour(seat_occupancy)
+    show_chart(figure)
+
+
+def draw_unfilled_hotspots(seat_occupancy):
+    # route  hour  unfilled  offered  utilization
+    hotspots = seat_occupancy.hotspots
+    plt.bar(range(len(hotspots)), hotspots['unfilled'], label='Empty Seats')
+    plt.bar(range(len(hotspots)), hotspots['offered'] - hotspots['unfilled'], bottom=hotspots['unfilled'],
+            label='Filled Seats')
+    plt.xlabel('Route and Hour')
+    plt.ylabel('Seats')
+    plt.title('Routes and Hours with the Most Empty Seats')
+    plt.xticks(range(len(hotspots)), [f"{route} {hour:02d}:00" for route, hour in
+                                      zip(hotspots['route'], hotspots['hour'])], rotation=45, ha='right')
+    plt.legend()
+    plt.tight_layout()
+
+
+def plot_unfilled_hotspots(seat_occupancy):
+    figure = chart_figure('Empty Seat Hotspots')
+    draw_unfilled_hotspots(seat_occupancy)
+    show_chart(figure)
 
 
 def display_dataframe(dataframe):
+    # To see table in new window, tkinter is only loaded when a table is shown
+    import tkinter as tk
+    from tkinter import ttk
+
     root = tk.Tk()
     root.title("TrempBoss Dataframe")
 
@@ -0,0 +1,63 @@
+# Keeps one window per chart and shows the charts without stopping the menu.
+import os
+from collections import OrderedDict
+
+import matplotlib.pyplot as plt
+
+# By default charts open in non-blocking windows and the menu keeps running next to them.
+# TREMPBOSS_BLOCKING_CHARTS=1 waits for every chart window to be closed, like before.
+BLOCKING_CHARTS_ENV = 'TREMPBOSS_BLOCKING_CHARTS'
+
+# Most chart windows kept open at once, the least recently shown chart is closed first
+MAX_OPEN_CHARTS_ENV = 'TREMPBOSS_MAX_OPEN_CHARTS'
+DEFAULT_MAX_OPEN_CHARTS = 5
+
+
+def is_blocking():
+    return os.environ.get(BLOCKING_CHARTS_ENV, '').lower() in ('1', 'true', 'yes')
+
+
+def get_max_open_charts():
+    return max(1, int(os.environ.get(MAX_OPEN_CHARTS_ENV, DEFAULT_MAX_OPEN_CHARTS)))
+
+
+# The open chart figures by chart name, the least recently shown first
+_open_charts = OrderedDict()
+
+
+# Returns the figure of a chart, cleared and made the current figure so the plt calls draw on it.
+# A chart that is already open is redrawn in its own window instead of opening a new one.
+def chart_figure(name):
+    figure = _open_charts.pop(name, None)
+    if figure is not None and plt.fignum_exists(figure.number):
+        figure.clear()
+        plt.figure(figure.number)
+    else:
+        if not is_blocking():
+            plt.ion()
+        figure = plt.figure(name)
+    _open_charts[name] = figure
+    close_oldest_charts(get_max_open_charts())
+    return figure
+
+
+# Closes the least recently shown charts until at most max_open_charts are open, the closed figures and their
+# windows are freed.
+def close_oldest_charts(max_open_charts):
+    for name, figure in list(_open_charts.items()):
+        if not plt.fignum_exists(figure.number):
+            # Closed from its window
+            del _open_charts[name]
+    while len(_open_charts) > max_open_charts:
+        _, oldest_figure = _open_charts.popitem(last=False)
+        plt.close(oldest_figure)
+
+
+# Shows a drawn chart. In the non-blocking mode the window is drawn and the menu goes on right away.
+def show_chart(figure):
+    if is_blocking():
+        plt.show()
+        return
+    plt.show(block=False)
+    figure.canvas.draw_idle()
+    figure.canvas.flush_events()
@@ -1,12 +1,81 @@
-from data_processing import change_file, get_combined_table
+import os
+
+from memory_profile import memory_profiler_from_environment, profile_stage
+
+DEFAULT_FILE_PATH = './exel file/Python TrempBoss file.xlsx'
+
+# trempboss_analytics.OUT_OF_CORE_ENV, read here without importing pandas with the package
+OUT_OF_CORE_ENV = 'TREMPBOSS_OUT_OF_CORE'
+
+
+# Holds the tables of an Excel file and loads them only the first time they are asked for.
+# pandas is imported with the first load, so the menu shows up without waiting for it.
+class LazyTables:
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._tables = None
+        self._user_profiles = None
+        self._seat_occupancy = None
+        self._route_matrix = None
+        self._out_of_core_statistics = None
+        # With TREMPBOSS_OUT_OF_CORE set, the totals, the top hours and the top drivers are calculated from the file
+        # chunk by chunk, without loading the tables
+        self.out_of_core = os.environ.get(OUT_OF_CORE_ENV, '').lower() in ('1', 'true', 'yes')
+
+    # Returns tremps_df, users_df, users_in_tremp_df, tremps_with_year_month, combined_table.
+    # Raises the loading error, the next call tries to load the file again.
+    # With TREMPBOSS_MEMORY_PROFILE set, the memory of loading, transforming and of all the statistics of the file
+    # is traced and written to a report.
+    def get(self):
+        if self._tables is None:
+            from data_processing import load_data, split_dates, get_combined_table, calc_all_statistics
+            profiler = memory_profiler_from_environment('matplotlib', self.file_path)
+            with profile_stage(profiler, 'load'):
+                tremps_df, users_df, users_in_tremp_df = load_data(self.file_path)
+            with profile_stage(profiler, 'transform'):
+                tremps_df, tremps_with_year_month = split_dates(tremps_df)
+                combined_table = get_combined_table(tremps_df, users_df, users_in_tremp_df)
+            if profiler is not None:
+                with profile_stage(profiler, 'statistics'):
+                    calc_all_statistics(tremps_df, users_df, users_in_tremp_df)
+                print("Memory report written to", profiler.write_report())
+            self._tables = tremps_df, users_df, users_in_tremp_df, tremps_with_year_month, combined_table
+        return self._tables
+
+    # Returns the activity profiles of the users of the file, built the first time they are asked for.
+    def get_user_profiles(self):
+        if self._user_profiles is None:
+            from data_processing import calc_user_profiles
+            tremps_df, users_df, users_in_tremp_df, _, _ = self.get()
+            self._user_profiles = calc_user_profiles(tremps_df, users_df, users_in_tremp_df)
+        return self._user_profiles
+
+    # Returns the seat occupancy of the driver tremps of the file, calculated the first time it is asked for.
+    def get_seat_occupancy(self):
+        if self._seat_occupancy is None:
+            from data_processing import calc_seat_occupancy
+            tremps_df, _, users_in_tremp_df, _, _ = self.get()
+            self._seat_occupancy = calc_seat_occupancy(tremps_df, users_in_tremp_df)
+        return self._seat_occupancy
+
+
+    # Returns the route matrix of the tremps of the file, built the first time it is asked for. The top routes and
+    # the heatmap are both read from it.
+    def get_route_matrix(self):
+        if self._route_matrix is None:
+            from data_processing import calc_route_matrix
+            tremps_df, _, _, _, _ = self.get()
+            self._route_matrix = calc_route_matrix(tremps_df)
+        return self._route_matrix
+
+
+    # Returns the statistics of the file calculated out of core, the first time they are asked for.
+    def get_out_of_core_statistics(self):
+        if self._out_of_core_statistics is None:
+            from data_processing import calc_out_of_core_statistics
+            self._out_of_core_statistics = calc_out_of_core_statistics(self.file_path)
+        return self._out_of_core_statistics
 
 
 def initializer():
-    file_path = './exel file/Python TrempBoss file.xlsx'
-    try:
-        tremps_df, users_df, users_in_tremp_df, tremps_with_year_month = change_file(file_path)
-    except Exception as e:
-        print(f"Error while loading tables data: {e}")
-        return
-    combined_table = get_combined_table(tremps_df, users_df, users_in_tremp_df)
-    return tremps_df, users_df, users_in_tremp_df, tremps_with_year_month, combined_table
+    return LazyTables(DEFAULT_FILE_PATH)
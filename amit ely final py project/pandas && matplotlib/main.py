@@ -1,10 +1,19 @@
+import os
+import sys
+
+# The statistics shared by both front ends are in the trempboss_analytics package, next to this folder
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.append(PROJECT_DIR)
+
 from initialize import initializer
 from menu import display_menu
 
 
 def main():
-    tremps_df, users_df, users_in_tremp_df, tremps_with_year_month, combined_table = initializer()
-    display_menu(tremps_df, users_df, users_in_tremp_df, tremps_with_year_month, combined_table)
+    # The tables are loaded when the first option that needs them is chosen
+    tables = initializer()
+    display_menu(tables)
 
 
 if __name__ == "__main__":
@@ -1,29 +1,45 @@
-from data_processing import calc_total_hitchhikers, calc_total_tremps, calc_avg_people_per_tremp, \
-    get_top_hour_df, calculate_top_hours, calc_top_5_drivers, change_file, download_Dataframe, get_combined_table
-from data_visualization import (
-    plot_tremps_by_month, plot_tremps_by_year_month, plot_top_5_drivers,
-    plot_top_5_routes, plot_percentage_by_tremp_id, plot_gender_count,
-    plot_top_hours, display_dataframe
-)
+from initialize import LazyTables
 
+# Options that work on the tables. The data processing and plotting modules (and pandas, matplotlib and tkinter
+# with them) are imported inside the options, so the menu is printed before any of them is loaded.
+TABLE_CHOICES = ['1', '2', '3', '4', '5', '6', '7', '8', '9', '10', '12', '13']
+# Options that are calculated from the file chunk by chunk without loading the tables, when tables.out_of_core is set
+OUT_OF_CORE_CHOICES = ['1', '2', '3', '5', '7']
 
-def display_menu(tremps_df, users_df, users_in_tremp_df, tremps_with_year_month, combined_table):
+
+def display_menu(tables):
     main_menu = """Choose an option:
 1. Display total tremps
 2. Display total hitchhikers
 3. Display average users per tremp
 4. Display tremps by year and month / month
 5. Display top 5 drivers
-6. Display top 5 routes
+6. Display top 5 routes / routes heatmap
 7. Display top 5 hours
 8. Tremp types percentages
 9. Display gender statistics
 10.Show table
+11.Export all charts to PNG
+12.Display user profile
+13.Display seat occupancy
 ~. To change File
 0. Exit"""
     while True:
         print(main_menu)
-        choice = input("Enter your choice (0-10): ")
+        choice = input("Enter your choice (0-13): ")
+        out_of_core_statistics = None
+        if tables.out_of_core and choice in OUT_OF_CORE_CHOICES:
+            try:
+                out_of_core_statistics = tables.get_out_of_core_statistics()
+            except Exception as e:
+                print(f"Error while calculating the statistics of the file: {e}")
+                continue
+        elif choice in TABLE_CHOICES:
+            try:
+                tremps_df, users_df, users_in_tremp_df, tremps_with_year_month, combined_table = tables.get()
+            except Exception as e:
+                print(f"Error while loading tables data: {e}")
+                continue
         if choice == '~':
             file_path_choice = input("""1.Python TrempBoss file.xlsx
 2.second TrempBoss file.xlsx
@@ -32,25 +48,40 @@ Enter your choice (1-2):""")
                 file_path = './exel file/Python TrempBoss file.xlsx'
             elif file_path_choice == '2':
                 file_path = './exel file/second TrempBoss file.xlsx'
+            new_tables = LazyTables(file_path)
             try:
-                tremps_df, users_df, users_in_tremp_df, tremps_with_year_month = change_file(file_path)
+                new_tables.get()
             except Exception as e:
                 print(f"Error while loading data: {e}")
-            combined_table = get_combined_table(tremps_df, users_df, users_in_tremp_df)
+                continue
+            tables = new_tables
 
             # tremps_df.shape[0]
             print("File path changed to ", file_path)
         elif choice == '1':
-            total_tremps = calc_total_tremps(users_in_tremp_df)
+            if out_of_core_statistics is not None:
+                total_tremps = out_of_core_statistics['total_tremps']
+            else:
+                from data_processing import calc_total_tremps
+                total_tremps = calc_total_tremps(tremps_df, users_in_tremp_df)
             # tremps_df.shape[0]
             print("Total tremps:", total_tremps)
         elif choice == '2':
-            total_hitchhikers = calc_total_hitchhikers(tremps_df, users_in_tremp_df)
+            if out_of_core_statistics is not None:
+                total_hitchhikers = out_of_core_statistics['total_hitchhikers']
+            else:
+                from data_processing import calc_total_hitchhikers
+                total_hitchhikers = calc_total_hitchhikers(tremps_df, users_in_tremp_df)
             print("Total hitchhikers:", total_hitchhikers)
         elif choice == '3':
-            average_users_per_tremp = calc_avg_people_per_tremp(tremps_df, users_in_tremp_df)
+            if out_of_core_statistics is not None:
+                average_users_per_tremp = out_of_core_statistics['avg_people_per_tremp']
+            else:
+                from data_processing import calc_avg_people_per_tremp
+                average_users_per_tremp = calc_avg_people_per_tremp(tremps_df, users_in_tremp_df)
             print("Average users per tremp:", average_users_per_tremp)
         elif choice == '4':
+            from data_visualization import plot_tremps_by_year_month, plot_tremps_by_month
             print("""1. by year and month
 2. by month""")
             statistics_choice = input("Enter your choice (1 or 2): ")
@@ -59,17 +90,39 @@ Enter your choice (1-2):""")
             elif statistics_choice == "2":
                 plot_tremps_by_month(tremps_with_year_month)
         elif choice == '5':
-            top_5_drivers_df = calc_top_5_drivers(tremps_df, users_in_tremp_df, users_df)
+            from data_visualization import plot_top_5_drivers
+            if out_of_core_statistics is not None:
+                top_5_drivers_df = out_of_core_statistics['top_5_drivers']
+            else:
+                from data_processing import calc_top_5_drivers
+                top_5_drivers_df = calc_top_5_drivers(tremps_df, users_in_tremp_df, users_df)
             plot_top_5_drivers(top_5_drivers_df)  # Display top 5 drivers on a bar plot
         elif choice == '6':
-            plot_top_5_routes(tremps_df)  # Display top 5 routes on a bar plot
+            from data_processing import calc_top_5_routes
+            from data_visualization import plot_top_5_routes, plot_route_heatmap
+            print("""1. Top 5 routes
+2. Routes heatmap""")
+            routes_choice = input("Enter your choice (1 or 2): ")
+            if routes_choice == "1":
+                top_5_routes = calc_top_5_routes(tables.get_route_matrix())
+                plot_top_5_routes(top_5_routes)  # Display top 5 routes on a bar plot
+            elif routes_choice == "2":
+                route_matrix = tables.get_route_matrix()
+                plot_route_heatmap(route_matrix.origins, route_matrix.destinations, route_matrix.counts)
         elif choice == '7':
-            top_hours = calculate_top_hours(tremps_df)
+            from data_processing import calculate_top_hours, get_top_hour_df
+            from data_visualization import plot_top_hours
+            if out_of_core_statistics is not None:
+                top_hours = out_of_core_statistics['top_hours']
+            else:
+                top_hours = calculate_top_hours(tremps_df)
             top_hour_df = get_top_hour_df(top_hours)
             plot_top_hours(top_hour_df)
         elif choice == '8':
+            from data_visualization import plot_percentage_by_tremp_id
             plot_percentage_by_tremp_id(tremps_df, users_in_tremp_df)  # Display top 5 routes on a bar plot
         elif choice == '9':
+            from data_visualization import plot_gender_count
             print("""1. Display percentages
 2. Display normal bar""")
             gender_choice = input("Enter your choice (1 or 2): ")
@@ -99,10 +152,49 @@ Enter your choice (1-2):""")
                 continue
             how_to_display = input("Enter your choice (D [To download] or W [To show in new window]): ")
             if how_to_display == "D":
+                from data_processing import download_Dataframe
                 output_folder = f'./{file_name}_files'
                 download_Dataframe(table_picked, output_folder)
             elif how_to_display == "W":
+                from data_visualization import display_dataframe
                 display_dataframe(table_picked)
+        elif choice == '11':
+            # The tables are loaded only for the charts that aren't in the chart cache yet
+            from chart_export import export_charts, get_chart_cache
+            output_folder = './chart_files'
+            try:
+                cached_charts = export_charts(tables, output_folder)
+            except Exception as e:
+                print(f"Error while exporting the charts: {e}")
+                continue
+            print(f"Charts saved to {output_folder} ({cached_charts} from the cache)")
+            print(get_chart_cache().report())
+        elif choice == '12':
+            from data_processing import get_user_profile
+            user_id = input("Enter a user id: ")
+            try:
+                user_profile = get_user_profile(tables.get_user_profiles(), int(user_id))
+            except ValueError:
+                user_profile = None
+            if user_profile is None:
+                print("No user with the id", user_id)
+            else:
+                print(user_profile.to_string())
+        elif choice == '13':
+            from data_visualization import plot_utilization_by_month, plot_utilization_by_hour, plot_unfilled_hotspots
+            seat_occupancy = tables.get_seat_occupancy()
+            print(f"Filled seats: {seat_occupancy.filled_seats} of {seat_occupancy.offered_seats} offered "
+                  f"({seat_occupancy.utilization:.1%})")
+            print("""1. by month
+2. by hour
+3. empty seat hotspots""")
+            occupancy_choice = input("Enter your choice (1 - 3): ")
+            if occupancy_choice == "1":
+                plot_utilization_by_month(seat_occupancy)
+            elif occupancy_choice == "2":
+                plot_utilization_by_hour(seat_occupancy)
+            elif occupancy_choice == "3":
+                plot_unfilled_hotspots(seat_occupancy)
         elif choice == '0':
             print("Exiting...")
             break
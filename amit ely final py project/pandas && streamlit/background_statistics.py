@@ -0,0 +1,305 @@
+# /background_statistics.py
+import datetime
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Tuple
+
+import pandas as pd
+
+import constants_joined_cols_names as const
+from data_processing import (calculate_total_statistics, calculate_top_drivers,
+                             calculate_top_hours, calculate_route_statistics,
+                             calculate_participation_counts_by_tremp_type, group_by_gender_and_month,
+                             use_approximate_top, calculate_approximate_top_drivers,
+                             calculate_approximate_top_routes, calculate_seat_occupancy,
+                             calculate_out_of_core_statistics)
+from filter_cache import LRUCache, get_filter_cache
+from sidebar import filter_data
+from task_scheduler import TIMING_COLUMNS, TaskScheduler, chain_future, gather_futures, part_future, timing_frame
+from text_match import MATCH_CONTAINS
+from trempboss_analytics import use_out_of_core
+
+DATE_COLUMN = const.DATE_COLUMN
+
+# Names of the parts of a filtered view of the dashboard
+FILTERED_DATA = 'filtered_data'
+GENERAL_STATISTICS_SECTION = 'general_statistics'
+TOP_STATISTICS_SECTION = 'top_statistics'
+ROUTES_SECTION = 'routes'
+TREMP_AND_GENDER_SECTION = 'tremp_and_gender'
+SEAT_OCCUPANCY_SECTION = 'seat_occupancy'
+# The run and wait times of every statistic of the view
+TASK_TIMINGS = 'task_timings'
+
+# The statistics of a view, they are independent of each other given the filtered dataframe, so each one is a
+# task of its own. Every statistic has its function and the names of its arguments, in order.
+STATISTIC_TASKS = {
+    'total_statistics': (calculate_total_statistics, ('df', 'df_users_in_tremp')),
+    'top_drivers': (calculate_approximate_top_drivers if use_approximate_top() else calculate_top_drivers,
+                    ('df', 'df_users_in_tremp', 'df_users')),
+    'top_hours': (calculate_top_hours, ('df',)),
+    'route_statistics': (calculate_route_statistics, ('df',)),
+    'tremp_type_counts': (calculate_participation_counts_by_tremp_type, ('df', 'df_users_in_tremp')),
+    'gender_grouped': (group_by_gender_and_month, ('df_users', 'df_users_in_tremp', 'df')),
+    'seat_occupancy': (calculate_seat_occupancy, ('df',)),
+}
+# The approximate top routes are counted with heavy hitters, the exact ones are read from the route matrix
+if use_approximate_top():
+    STATISTIC_TASKS['top_routes'] = (calculate_approximate_top_routes, ('df',))
+
+# Statistics that are a part of the tuple result of a task: the name of the task and the position of the part.
+# The route matrix of a view is built once, by the route statistics task, for all the statistics read from it.
+STATISTIC_PARTS = {
+    'origin_totals': ('route_statistics', 1),
+    'route_heatmap': ('route_statistics', 2),
+}
+if not use_approximate_top():
+    STATISTIC_PARTS['top_routes'] = ('route_statistics', 0)
+
+# With TREMPBOSS_OUT_OF_CORE set, these statistics are the parts of one map-reduce task over chunks of the view, in
+# this order. The approximate top drivers keep their own task.
+OUT_OF_CORE_STATISTICS = ['total_statistics', 'top_drivers', 'top_hours', 'gender_grouped']
+if use_out_of_core():
+    STATISTIC_TASKS['out_of_core_statistics'] = (calculate_out_of_core_statistics,
+                                                 ('df', 'df_users_in_tremp', 'df_users'))
+    for position, name in enumerate(OUT_OF_CORE_STATISTICS):
+        if name == 'top_drivers' and use_approximate_top():
+            continue
+        del STATISTIC_TASKS[name]
+        STATISTIC_PARTS[name] = ('out_of_core_statistics', position)
+
+# The statistics (tasks or parts) of every section of the dashboard. A section made of a list of statistics gets
+# the tuple of their results, a section made of one statistic gets its result as is.
+SECTION_STATISTICS = {
+    GENERAL_STATISTICS_SECTION: 'total_statistics',
+    TOP_STATISTICS_SECTION: ['top_drivers', 'top_routes', 'top_hours'],
+    ROUTES_SECTION: ['origin_totals', 'route_heatmap'],
+    TREMP_AND_GENDER_SECTION: ['tremp_type_counts', 'gender_grouped'],
+    SEAT_OCCUPANCY_SECTION: 'seat_occupancy',
+}
+
+# Date range presets (in days back from the latest tremp in the file) that are precomputed after an upload
+PRESET_DAYS_BACK = [30, 90, 365]
+
+# A single process-wide scheduler, module level objects survive the Streamlit reruns of the main script
+_scheduler = TaskScheduler.from_environment()
+
+FilterKey = Tuple[str, str, str, str, str, datetime.date, datetime.date, str]
+
+
+def default_filters(df: pd.DataFrame) -> FilterKey:
+    """
+    The function returns the filter values the sidebar starts with for the given dataframe, meaning all the
+    tremp types, empty text filters, the full date range and the default text match.
+    """
+    return 'All', '', '', '', '', df[DATE_COLUMN].min().date(), df[DATE_COLUMN].max().date(), MATCH_CONTAINS
+
+
+def get_filter_presets(df: pd.DataFrame) -> list[FilterKey]:
+    """
+    The function `get_filter_presets` builds the most common filter combinations for a dataframe: the full
+    dataset, every tremp type on its own and the last 30/90/365 days before the latest tremp in the file.
+
+    :param df: The transformed tremps dataframe.
+    :return: a list of filter tuples, ordered the same as the arguments of `filter_data`.
+    """
+    tremp_type, from_route, to_route, creator, user_in_tremp, min_date, max_date, match_mode = default_filters(df)
+
+    presets = [(tremp_type, from_route, to_route, creator, user_in_tremp, min_date, max_date, match_mode)]
+    presets += [(str(preset_type), from_route, to_route, creator, user_in_tremp, min_date, max_date, match_mode)
+                for preset_type in df[const.TREMP_TYPE_COLUMN].unique()]
+    presets += [(tremp_type, from_route, to_route, creator, user_in_tremp,
+                 max(min_date, max_date - datetime.timedelta(days=days_back)), max_date, match_mode)
+                for days_back in PRESET_DAYS_BACK]
+
+    # The same preset can show up twice, for example when the whole file spans less than 30 days
+    return list(dict.fromkeys(presets))
+
+
+def completed_future(result) -> Future:
+    """
+    The function wraps an already calculated result in a finished future.
+    """
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def filter_view(df: pd.DataFrame, filters: FilterKey) -> Tuple[pd.DataFrame]:
+    """
+    The function filters the dataframe of a view, the result is wrapped in a tuple like the section results.
+    """
+    return filter_data(df, *filters),
+
+
+def statistic_function_names() -> Dict[str, str]:
+    """
+    The function returns the name of the function of every statistic, and the task and position of every part,
+    they change with the environment (like the approximate top lists).
+    """
+    function_names = {name: function.__name__ for name, (function, _) in STATISTIC_TASKS.items()}
+    function_names.update({name: f'{task}[{position}]' for name, (task, position) in STATISTIC_PARTS.items()})
+    return function_names
+
+
+def calculate_statistics(df_filtered: pd.DataFrame, df_users: pd.DataFrame,
+                         df_users_in_tremp: pd.DataFrame) -> Tuple[Dict[str, object], pd.DataFrame]:
+    """
+    The function `calculate_statistics` calculates every statistic of a filtered view one after the other in
+    this thread, without the scheduler.
+
+    :return: tuple containing the result of every statistic by its name and the timing of the statistics, like
+    the task timings of a view.
+    """
+    arguments = {'df': df_filtered, 'df_users': df_users, 'df_users_in_tremp': df_users_in_tremp}
+    statistics, timings = {}, []
+    for name, (function, argument_names) in STATISTIC_TASKS.items():
+        start_time = time.perf_counter()
+        statistics[name] = function(*(arguments[argument] for argument in argument_names))
+        timings.append([name, round(time.perf_counter() - start_time, 4), 0.0, threading.current_thread().name])
+    for name, (task, position) in STATISTIC_PARTS.items():
+        statistics[name] = statistics[task][position]
+    return statistics, pd.DataFrame(timings, columns=TIMING_COLUMNS)
+
+
+def completed_view(df_filtered: pd.DataFrame, statistics: Dict[str, object],
+                   task_timings: pd.DataFrame) -> Dict[str, Future]:
+    """
+    The function wraps the already calculated statistics of a view in finished futures, like the ones of
+    `submit_view`.
+    """
+    view_futures = {FILTERED_DATA: completed_future((df_filtered,)), TASK_TIMINGS: completed_future(task_timings)}
+    for section, section_statistics in SECTION_STATISTICS.items():
+        if isinstance(section_statistics, str):
+            view_futures[section] = completed_future(statistics[section_statistics])
+        else:
+            view_futures[section] = completed_future(tuple(statistics[name] for name in section_statistics))
+    return view_futures
+
+
+def submit_statistics(df_filtered: pd.DataFrame, df_users: pd.DataFrame,
+                      df_users_in_tremp: pd.DataFrame) -> Dict[str, Future]:
+    """
+    The function `submit_statistics` submits every statistic of a filtered view to the scheduler as a task of
+    its own, and puts the results of each section together as soon as its statistics are done.
+
+    :param df_filtered: The filtered dataframe of the view.
+    :return: a dictionary that maps each section, and the task timings, to its future.
+    """
+    arguments = {'df': df_filtered, 'df_users': df_users, 'df_users_in_tremp': df_users_in_tremp}
+    task_futures = {name: _scheduler.submit(name, function, *(arguments[argument] for argument in argument_names))
+                    for name, (function, argument_names) in STATISTIC_TASKS.items()}
+    statistic_futures = dict(task_futures)
+    statistic_futures.update({name: part_future(task_futures[task], position)
+                              for name, (task, position) in STATISTIC_PARTS.items()})
+
+    section_futures = {}
+    for section, statistics in SECTION_STATISTICS.items():
+        if isinstance(statistics, str):
+            section_futures[section] = statistic_futures[statistics]
+        else:
+            section_futures[section] = gather_futures(statistic_futures[statistic] for statistic in statistics)
+
+    timings_future = Future()
+    gather_futures(task_futures.values()).add_done_callback(
+        lambda _: timings_future.set_result(timing_frame(task_futures.values())))
+    section_futures[TASK_TIMINGS] = timings_future
+    return section_futures
+
+
+def submit_statistics_when_filtered(filtered_future: Future, df_users: pd.DataFrame,
+                                    df_users_in_tremp: pd.DataFrame) -> Dict[str, Future]:
+    """
+    The function returns the futures of the sections of a view whose filtering is still running. The statistics
+    are submitted once the filtered dataframe is ready, so no worker is kept waiting for it.
+    """
+    view_futures = {part: Future() for part in (*SECTION_STATISTICS, TASK_TIMINGS)}
+
+    def submit_when_filtered(done_future: Future) -> None:
+        if done_future.exception() is not None:
+            for future in view_futures.values():
+                future.set_exception(done_future.exception())
+            return
+        df_filtered, = done_future.result()
+        for part, future in submit_statistics(df_filtered, df_users, df_users_in_tremp).items():
+            chain_future(future, view_futures[part])
+
+    filtered_future.add_done_callback(submit_when_filtered)
+    return view_futures
+
+
+def submit_view(df: pd.DataFrame, df_users: pd.DataFrame, df_users_in_tremp: pd.DataFrame,
+                filters: FilterKey) -> Dict[str, Future]:
+    """
+    The function submits the filtering and the statistics of every section of a view to the scheduler.
+
+    :return: a dictionary that maps each part of the view to its future.
+    """
+    filtered_future = _scheduler.submit(FILTERED_DATA, filter_view, df, filters)
+    return {FILTERED_DATA: filtered_future,
+            **submit_statistics_when_filtered(filtered_future, df_users, df_users_in_tremp)}
+
+
+def calculate_view(df: pd.DataFrame, df_users: pd.DataFrame, df_users_in_tremp: pd.DataFrame,
+                   filters: FilterKey) -> Dict[str, Future]:
+    """
+    The function filters the dataframe right away, and submits the statistics of the view to the scheduler.
+
+    :return: a dictionary that maps each part of the view to its future.
+    """
+    df_filtered = filter_data(df, *filters)
+    return {FILTERED_DATA: completed_future((df_filtered,)),
+            **submit_statistics(df_filtered, df_users, df_users_in_tremp)}
+
+
+def cache_view(filter_cache: LRUCache, cache_key: tuple, view_futures: Dict[str, Future]) -> None:
+    """
+    The function puts the futures of a view in the filter results cache. The memory of the view is measured again
+    as each of its statistics finishes, so the cache stays under its RAM ceiling as the views fill in.
+    """
+    filter_cache.put(cache_key, view_futures)
+    for future in view_futures.values():
+        future.add_done_callback(lambda _: filter_cache.update_size(cache_key))
+
+
+def start_precomputation(dataset_hash: str, df: pd.DataFrame, df_users: pd.DataFrame,
+                         df_users_in_tremp: pd.DataFrame) -> None:
+    """
+    The function `start_precomputation` starts calculating the views of all the filter presets of a dataset
+    in the background. The views are stored in the filter results cache, presets that are already cached
+    are not calculated again.
+
+    :param dataset_hash: The content hash of the uploaded file.
+    """
+    filter_cache = get_filter_cache()
+    for preset in get_filter_presets(df):
+        if (dataset_hash, *preset) not in filter_cache:
+            cache_view(filter_cache, (dataset_hash, *preset), submit_view(df, df_users, df_users_in_tremp, preset))
+
+
+def seed_view(dataset_hash: str, filters: FilterKey, view_futures: Dict[str, Future]) -> None:
+    """
+    The function puts a view that was calculated elsewhere (like in a snapshot) in the filter results cache,
+    unless the cache already has that view.
+    """
+    filter_cache = get_filter_cache()
+    if (dataset_hash, *filters) not in filter_cache:
+        cache_view(filter_cache, (dataset_hash, *filters), view_futures)
+
+
+def get_view_futures(dataset_hash: str, df: pd.DataFrame, df_users: pd.DataFrame,
+                     df_users_in_tremp: pd.DataFrame, filters: FilterKey) -> Dict[str, Future]:
+    """
+    The function returns the futures of the view of the chosen filters. Views are memoized by the dataset hash
+    and the filters, so going back to a recent view (or to a preset) doesn't calculate anything again.
+    """
+    filter_cache = get_filter_cache()
+    cache_key = (dataset_hash, *filters)
+
+    view_futures = filter_cache.get(cache_key)
+    # A view whose calculation failed is calculated again instead of failing from the cache on every rerun
+    if view_futures is None or any(future.done() and future.exception() for future in view_futures.values()):
+        view_futures = calculate_view(df, df_users, df_users_in_tremp, filters)
+        cache_view(filter_cache, cache_key, view_futures)
+    return view_futures
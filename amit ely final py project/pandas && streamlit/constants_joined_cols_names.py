@@ -13,4 +13,4 @@ TO_ROUTE_COLUMN = 'to_route'
 CREATOR_COLUMN = 'creator'
 DATE_COLUMN = 'date'
 TREMP_DATE_COLUMN = 'tremp_date'
-ROUTES_COLUMN = 'routes'
+FILLED_SEATS_COLUMN = 'filled_seats'
@@ -1,8 +1,12 @@
 # /data_processing.py
+import os
+
 import pandas as pd
 import streamlit as st
 from typing import Tuple, Optional
 import constants_joined_cols_names as const
+import trempboss_analytics as analytics
+from workbook_loader import read_workbook
 
 # col names in join-table / tremps / users_in_tremp
 TREMP_ID_COLUMN = const.TREMP_ID_COLUMN
@@ -17,7 +21,7 @@ TO_ROUTE_COLUMN = const.TO_ROUTE_COLUMN
 CREATOR_COLUMN = const.CREATOR_COLUMN
 DATE_COLUMN = const.DATE_COLUMN
 TREMP_DATE_COLUMN = const.TREMP_DATE_COLUMN
-ROUTES_COLUMN = const.ROUTES_COLUMN
+FILLED_SEATS_COLUMN = const.FILLED_SEATS_COLUMN
 # col names in users / users_in_tremp table
 USER_ID_COLUMN = 'user_id'
 
@@ -31,19 +35,32 @@ TREMP_TYPES = ['driver', 'hitchhiker']
 GENDER_COLUMN = 'gender'
 FULL_NAME_COLUMN = 'full_name'
 
+# col names in join-table that are filtered by text in the sidebar
+TEXT_FILTER_COLUMNS = [FROM_ROUTE_COLUMN, TO_ROUTE_COLUMN, CREATOR_COLUMN]
+
+# Calculates the top drivers and top routes with bounded-memory heavy hitters instead of exact counts, for
+# example TREMPBOSS_APPROXIMATE_TOP=1. The key space of drivers and routes grows with the data, the heavy hitters
+# keep a fixed number of counters and show the range of every count.
+APPROXIMATE_TOP_ENV = 'TREMPBOSS_APPROXIMATE_TOP'
+
+# The dashboard rounds a tremp time up to the next hour only after the half hour (hh:31 and later)
+ROUND_UP_FROM_MINUTE = analytics.HALF_HOUR_MINUTE + 1
+
 
-def load_data(file_to_load: str) -> Tuple[Optional[pd.DataFrame], Optional[pd.DataFrame], Optional[pd.DataFrame]]:
+def load_data(file_to_load: str, engine: Optional[str] = None) \
+        -> Tuple[Optional[pd.DataFrame], Optional[pd.DataFrame], Optional[pd.DataFrame]]:
     """
     The function `load_data` loads data from an Excel file and returns three dataframes, or None if the
-    file is not provided.
+    file is not provided. Only the sheets and columns of `workbook_loader.WORKBOOK_SCHEMA` are read.
     
     :param file_to_load: The `file_to_load` parameter is a string that represents the file path of the
     Excel file to be loaded
+    :param engine: The Excel reader engine, by default the fastest installed one (see `workbook_loader`)
     """
 
     if file_to_load:
         try:
-            data_dict = pd.read_excel(file_to_load, sheet_name=None)
+            data_dict = read_workbook(file_to_load, engine)
             return data_dict.get('tremps'), data_dict.get('users'), data_dict.get('users_in_tremps')  # same df[users]
         except Exception as e:
             st.error(f"Error loading data: {e}")
@@ -58,11 +75,14 @@ def transform_data(df_tremps: pd.DataFrame, df_users: pd.DataFrame, df_users_in_
     :param df_users: A DataFrame containing user data. Must include 'user_id' and 'full_name' columns. param :param
     :param df_users_in_tremp: A DataFrame mapping users to tremps. Must include 'user_id' and 'is_tremp_creator'
     columns. :return: A DataFrame derived from df_tremps with additional columns for 'tremp_date', 'creator',
-    and 'users_in_tremp'.
+    'users_in_tremp' and 'filled_seats'.
     """
     joined_df = df_tremps.copy()
     # df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN])
     joined_df[TREMP_DATE_COLUMN] = joined_df[DATE_COLUMN].dt.date  # new column with only date component, no time
+    # The seats taken in every tremp are counted once here, so the occupancy of any filtered view is read from
+    # its own rows
+    joined_df[FILLED_SEATS_COLUMN] = analytics.count_filled_seats(joined_df, df_users_in_tremp)
 
     df_users_in_tremp = merge_df(df_users_in_tremp, df_users[[USER_ID_COLUMN, FULL_NAME_COLUMN]], USER_ID_COLUMN)
     user_in_tremp = group_users_in_tremp(df_users_in_tremp)
@@ -78,7 +98,10 @@ def transform_data(df_tremps: pd.DataFrame, df_users: pd.DataFrame, df_users_in_
     joined_df = merge_df(joined_df, creator[[TREMP_ID_COLUMN, FULL_NAME_COLUMN]], TREMP_ID_COLUMN,
                          {FULL_NAME_COLUMN: CREATOR_COLUMN})
 
-    joined_df[ROUTES_COLUMN] = df_tremps[FROM_ROUTE_COLUMN] + " to " + df_tremps[TO_ROUTE_COLUMN]
+    # The text filters columns have only a few hundred distinct values, as categories the filters match the
+    # distinct values once instead of every row
+    for text_filter_column in TEXT_FILTER_COLUMNS:
+        joined_df[text_filter_column] = joined_df[text_filter_column].astype('category')
 
     return joined_df
 
@@ -132,92 +155,85 @@ def calculate_total_statistics(df_tremps: pd.DataFrame, df_users_in_tremp: pd.Da
     :return: tuple containing three values:
     `total_hitchhikers`, `avg_people_per_tremp`, and `total_tremps`.
     """
-    # Filter df_users_in_tremp dataframe
-    tremp_ids = df_tremps[TREMP_ID_COLUMN].unique()
-    df_users_in_tremp_filtered = df_users_in_tremp[df_users_in_tremp[TREMP_ID_COLUMN].isin(tremp_ids)]
-
-    # Exclude rows where the user is the creator of the tremp
-    non_creator_users_in_tremp = df_users_in_tremp_filtered[~df_users_in_tremp_filtered[IS_TREMP_CREATOR_COLUMN]]
-
-    total_hitchhikers = calculate_total_hitchhikers(df_tremps, non_creator_users_in_tremp)
-    total_tremps = non_creator_users_in_tremp[TREMP_ID_COLUMN].nunique()
-
-    # Avoid division by zero and only format once
-    avg_people_per_tremp = "{:.2f}".format(total_hitchhikers / total_tremps) if total_tremps != 0 else '0.00'
+    total_hitchhikers, total_tremps = analytics.calculate_participation_totals(df_tremps, df_users_in_tremp)
+    avg_people_per_tremp = analytics.format_average_people_per_tremp(total_hitchhikers, total_tremps)
 
     return total_hitchhikers, avg_people_per_tremp, total_tremps
 
 
-def calculate_total_hitchhikers(df_tremps: pd.DataFrame, non_creator_users_in_tremp: pd.DataFrame) -> int:
+def calculate_top_drivers(df_tremps: pd.DataFrame, df_users_in_tremp: pd.DataFrame,
+                          df_users: pd.DataFrame) -> pd.Series:
     """
-    The function calculates the total number of hitchhikers by summing the number of non-creator users
-    and the number of seats in hitchhiker tremps.
+    The function `calculate_top_drivers` takes in three dataframes and returns a series of the top 5
+    drivers based on the number of users they have in their tremps.    
     """
-    hitchhiker_tremps_with_non_creators = df_tremps[
-        (df_tremps[TREMP_ID_COLUMN].isin(non_creator_users_in_tremp[TREMP_ID_COLUMN].unique())) &
-        (df_tremps['tremp_type'] == 'hitchhiker')
-        ]
-    return non_creator_users_in_tremp.shape[0] + hitchhiker_tremps_with_non_creators['seats_amount'].sum()
+    # Drivers are the creators of driver tremps that someone joined and the users that joined hitchhiker tremps
+    top_drivers = analytics.calculate_top_drivers(df_tremps, df_users_in_tremp, rides_given_only=True)
+    return label_top_drivers(top_drivers, df_users)
 
 
-def calculate_top(df: pd.DataFrame, column_name: str, top_count: int = 5) -> pd.Series:
+def label_top_drivers(top_drivers: pd.Series, df_users: pd.DataFrame) -> pd.Series:
     """
-    The function calculates the top occurrences of a column in a DataFrame and returns the top items as
-    a Series.
+    The function sorts the ride counts of the top drivers ascending, for the chart, and labels them with the full
+    names of the drivers.
     """
-    top_items = df[column_name].value_counts().nlargest(top_count).sort_values(ascending=True)
-    return top_items
+    top_drivers = top_drivers.sort_values(ascending=True, kind='stable')
 
+    # Map user ID to full name
+    user_map = df_users.set_index(USER_ID_COLUMN)[FULL_NAME_COLUMN]
+    top_drivers.index = top_drivers.index.map(user_map)
 
-def filter_df_users_in_tremp(df_users_in_tremp, df_tremps, valid_driver_tremps, is_tremp_creator, tremp_type):
+    return top_drivers
+
+
+def use_approximate_top() -> bool:
     """
-    The function filters a DataFrame of users in tremps based on specified criteria.
+    The function returns whether the top drivers and routes are approximate, see APPROXIMATE_TOP_ENV.
     """
-    tremps_of_type = df_tremps[df_tremps[TREMP_TYPE_COLUMN] == tremp_type][TREMP_ID_COLUMN]
-    criteria = (
-            (df_users_in_tremp[IS_TREMP_CREATOR_COLUMN] == is_tremp_creator) &
-            df_users_in_tremp[TREMP_ID_COLUMN].isin(tremps_of_type) &
-            df_users_in_tremp[TREMP_ID_COLUMN].isin(valid_driver_tremps)
-    )
-    return df_users_in_tremp[criteria]
+    return os.environ.get(APPROXIMATE_TOP_ENV, '').lower() in ('1', 'true', 'yes')
 
 
-def calculate_top_drivers(df_tremps: pd.DataFrame, df_users_in_tremp: pd.DataFrame,
-                          df_users: pd.DataFrame) -> pd.Series:
+def label_with_bounds(top: pd.DataFrame, labels: pd.Index) -> pd.Series:
     """
-    The function `calculate_top_drivers` takes in three dataframes and returns a series of the top 5
-    drivers based on the number of users they have in their tremps.    
+    The function turns the heavy hitters top list into the Series of the dashboard charts, sorted ascending. An
+    approximate count is labeled with the range of the true count, like "Dana Levi (3-5)".
     """
-    # Find tremps that have more than one user
-    valid_driver_tremps = df_users_in_tremp[TREMP_ID_COLUMN].value_counts()
-    valid_driver_tremps = valid_driver_tremps[valid_driver_tremps > 1].index
-
-    # Filter for 'driver' type tremps that have more than one user and is created by the driver
-    df_users_in_tremp_drivers = filter_df_users_in_tremp(df_users_in_tremp, df_tremps, valid_driver_tremps, True,
-                                                         TREMP_TYPES[0])
-    # Filter for 'hitchhiker' type tremps that were not created by the user
-    df_users_in_tremp_hitchhiker = filter_df_users_in_tremp(df_users_in_tremp, df_tremps, valid_driver_tremps, False,
-                                                            TREMP_TYPES[1])
-    # Combine driver and hitchhiker data
-    df_all_drivers = pd.concat([df_users_in_tremp_drivers, df_users_in_tremp_hitchhiker])
+    labels = [label if lower == upper else f"{label} ({lower}-{upper})"
+              for label, lower, upper in zip(labels, top['lower'], top['upper'])]
+    top_counts = pd.Series(top['count'].to_numpy(), index=labels, name='count')
+    return top_counts.sort_values(ascending=True, kind='stable')
 
-    # Calculate top 5 drivers
-    top_drivers = calculate_top(df_all_drivers, USER_ID_COLUMN)
 
-    # Map user ID to full name
+def calculate_approximate_top_drivers(df_tremps: pd.DataFrame, df_users_in_tremp: pd.DataFrame,
+                                      df_users: pd.DataFrame) -> pd.Series:
+    """
+    The function `calculate_approximate_top_drivers` returns the top 5 drivers like `calculate_top_drivers`,
+    counted in bounded memory with heavy hitters over chunks of the participations.
+    """
+    top_drivers = analytics.sketch_driver_rides(df_tremps, df_users_in_tremp, rides_given_only=True).top()
     user_map = df_users.set_index(USER_ID_COLUMN)[FULL_NAME_COLUMN]
-    top_drivers.index = top_drivers.index.map(user_map)
+    return label_with_bounds(top_drivers, top_drivers.index.map(user_map))
 
-    return top_drivers
+
+def calculate_approximate_top_routes(df_tremps: pd.DataFrame) -> pd.Series:
+    """
+    The function `calculate_approximate_top_routes` returns the top 5 routes like `calculate_top_routes`,
+    counted in bounded memory with heavy hitters over chunks of the tremps.
+    """
+    top_routes = analytics.sketch_routes(df_tremps).top()
+    return label_with_bounds(top_routes, top_routes.index)
 
 
-def calculate_top_routes(df_tremps: pd.DataFrame) -> pd.Series:
+def calculate_route_statistics(df_tremps: pd.DataFrame) -> Tuple[pd.Series, pd.Series, pd.DataFrame]:
     """
-    The function calculates the top routes based on a DataFrame of tremps.
-    :return: a pandas Series object, which contains the top routes calculated from the input DataFrame.
+    The function calculates the route statistics of the dashboard from a single origin-destination matrix of the
+    tremps: the top routes of the "Top Statistics" section and the statistics of the "Routes" section.
+
+    :return: tuple containing the top routes, the number of tremps from every origin and the origin-destination
+    counts of the busiest places.
     """
-    top_routes = calculate_top(df_tremps, ROUTES_COLUMN)
-    return top_routes
+    route_matrix = analytics.build_route_matrix(df_tremps)
+    return route_matrix.top_routes(), route_matrix.origin_totals(), route_matrix.heatmap_frame()
 
 
 def calculate_top_hours(df_tremps: pd.DataFrame) -> pd.Series:
@@ -226,42 +242,20 @@ def calculate_top_hours(df_tremps: pd.DataFrame) -> pd.Series:
     :param df_tremps: A pandas DataFrame containing data about tremps
     :return: a pandas Series object, which represents the top hours calculated from the input DataFrame.
     """
-    rounded_hour_col = 'rounded_hour'
-
-    df_tremps[rounded_hour_col] = df_tremps[TREMP_TIME_COLUMN].apply(
-        lambda x: (x.hour + 1) if x.minute > 30 else x.hour)
-    df_tremps[rounded_hour_col] %= 24
-    top_hours = calculate_top(df_tremps, rounded_hour_col)
-    df_tremps.drop(columns=[rounded_hour_col], inplace=True)
-
-    # Convert the index to string type with specific format
-    top_hours.index = top_hours.index.map(lambda x: '{:02d}:00'.format(x))
-
-    return top_hours
+    top_hours = analytics.calculate_top_hours(df_tremps[TREMP_TIME_COLUMN], ROUND_UP_FROM_MINUTE)
+    return label_top_hours(top_hours)
 
 
-def count_by_criteria(df: pd.DataFrame, is_creator: bool, tremp_ids_of_given_type: pd.Series) -> int:
+def label_top_hours(top_hours: pd.Series) -> pd.Series:
     """
-    The function counts the number of rows in a DataFrame that meet certain criteria based on whether
-    the creator is specified and a given type of tremp ID.
+    The function sorts the tremp counts of the top hours ascending, for the chart, and labels them "HH:00".
     """
-    criteria = (
-            (df[IS_TREMP_CREATOR_COLUMN] == is_creator) &
-            df[TREMP_ID_COLUMN].isin(tremp_ids_of_given_type)
-    )
-    return df[criteria].shape[0]
+    top_hours = top_hours.sort_values(ascending=True, kind='stable')
 
+    # Convert the index to string type with specific format
+    top_hours.index = top_hours.index.map(lambda x: '{:02d}:00'.format(x))
 
-def count_by_tremp_type(df_tremps: pd.DataFrame, df_users_in_tremp: pd.DataFrame, tremp_type: str) -> Tuple[int, int]:
-    """
-    The function counts the number of creators and joiners in a given tremp type.
-    """
-    tremp_ids_of_given_type = df_tremps[df_tremps[TREMP_TYPE_COLUMN] == tremp_type][TREMP_ID_COLUMN]
-
-    creators = count_by_criteria(df_users_in_tremp, True, tremp_ids_of_given_type)
-    joiners = count_by_criteria(df_users_in_tremp, False, tremp_ids_of_given_type)
-
-    return creators, joiners
+    return top_hours
 
 
 def calculate_participation_counts_by_tremp_type(tremp_data: pd.DataFrame,
@@ -279,11 +273,12 @@ def calculate_participation_counts_by_tremp_type(tremp_data: pd.DataFrame,
     """
 
     participation_counts_by_type = {}
+    counts_by_type = analytics.calculate_participation_by_tremp_type(tremp_data, tremp_participation_data)
 
     for tremp_type in TREMP_TYPES:
-        creator_count, joiner_count = count_by_tremp_type(tremp_data, tremp_participation_data, tremp_type)
-        participation_counts_by_type[f'{tremp_type.capitalize()} Creators'] = creator_count
-        participation_counts_by_type[f'{tremp_type.capitalize()} Joiners'] = joiner_count
+        type_counts = counts_by_type.loc[tremp_type]
+        participation_counts_by_type[f'{tremp_type.capitalize()} Creators'] = type_counts['creators']
+        participation_counts_by_type[f'{tremp_type.capitalize()} Joiners'] = type_counts['joiners']
 
     # Remove entries where count is 0
     participation_counts_by_type = {tremp: count for tremp, count in participation_counts_by_type.items() if count != 0}
@@ -299,14 +294,17 @@ def group_by_gender_and_month(df_users: pd.DataFrame, df_users_in_tremp: pd.Data
     months.
     """
 
-    # merge dataframes to get complete information about users,  tremps, and tremp participation
-    tremps_with_users = df_users_in_tremp.merge(df_tremps[[TREMP_ID_COLUMN, DATE_COLUMN]], on=TREMP_ID_COLUMN)
-    merged_data_with_gender = tremps_with_users.merge(df_users[[GENDER_COLUMN, USER_ID_COLUMN]],
-                                                      left_on=USER_ID_COLUMN, right_on=USER_ID_COLUMN)
+    # count the participations of every gender and month, over the users, the tremps and the tremp participation
+    gender_month_counts = analytics.count_participations_by_month_and_gender(df_tremps, df_users, df_users_in_tremp)
+    return last_year_gender_counts(gender_month_counts)
 
-    # group-by gender and month and calculate the counts for each group
-    gender_month_counts = merged_data_with_gender.groupby(
-        [merged_data_with_gender[DATE_COLUMN].dt.to_period('M'), GENDER_COLUMN]).size().reset_index(name='counts')
+
+def last_year_gender_counts(gender_month_counts: pd.Series) -> pd.DataFrame:
+    """
+    The function returns the participation counts by month and gender of the last 12 months, with the date,
+    gender and counts columns.
+    """
+    gender_month_counts = gender_month_counts.reset_index(name='counts')
 
     # Filter the rows for the last 12 months
     last_month = gender_month_counts[DATE_COLUMN].max()
@@ -315,3 +313,46 @@ def group_by_gender_and_month(df_users: pd.DataFrame, df_users_in_tremp: pd.Data
 
     return filtered_gender_month_counts
 
+
+def calculate_out_of_core_statistics(df_tremps: pd.DataFrame, df_users_in_tremp: pd.DataFrame,
+                                     df_users: pd.DataFrame) -> Tuple[Tuple[int, str, int], pd.Series, pd.Series,
+                                                                      pd.DataFrame]:
+    """
+    The function calculates the total statistics, top drivers, top hours and gender-month counts of a view in one
+    map-reduce: the view is split into chunks of tremp id ranges and their partial aggregates are calculated in a
+    pool of worker processes, see `trempboss_analytics.map_reduce`. The dashboard keeps the tables of the file in
+    memory for its filters, so the chunks are sliced from them. Used when TREMPBOSS_OUT_OF_CORE is set.
+
+    :return: tuple containing the results of `calculate_total_statistics`, `calculate_top_drivers`,
+    `calculate_top_hours` and `group_by_gender_and_month`.
+    """
+    # Only the columns of the aggregates are sent to the workers
+    df_tremps = df_tremps[[TREMP_ID_COLUMN, TREMP_TYPE_COLUMN, SEATS_AMOUNT_COLUMN, DATE_COLUMN, TREMP_TIME_COLUMN]]
+    aggregates = analytics.map_reduce_aggregates(df_tremps, df_users, df_users_in_tremp, ROUND_UP_FROM_MINUTE,
+                                                 rides_given_only=True)
+    avg_people_per_tremp = analytics.format_average_people_per_tremp(aggregates.total_hitchhikers,
+                                                                     aggregates.joined_tremps)
+    return ((aggregates.total_hitchhikers, avg_people_per_tremp, aggregates.joined_tremps),
+            label_top_drivers(aggregates.top_drivers(), df_users),
+            label_top_hours(aggregates.top_hours()),
+            last_year_gender_counts(aggregates.participations_by_month_and_gender()))
+
+
+def calculate_seat_occupancy(df_tremps: pd.DataFrame) -> Tuple[analytics.SeatOccupancy]:
+    """
+    The function calculates the offered and filled seats of the driver tremps of a view by route, hour and month,
+    and the routes and hours with the most empty seats, from the filled_seats column of the transformed data.
+    :return: a tuple containing the occupancy, like the other sections.
+    """
+    return (analytics.calculate_seat_occupancy(df_tremps, ROUND_UP_FROM_MINUTE),)
+
+
+def calculate_user_profiles(df_tremps: pd.DataFrame, df_users: pd.DataFrame,
+                            df_users_in_tremp: pd.DataFrame) -> analytics.UserProfiles:
+    """
+    The function builds the activity profiles of all the users of a file in one pass over the participations,
+    with the hours rounded like the top hours of the dashboard.
+    :return: the profiles, looked up by user id.
+    """
+    return analytics.build_user_profiles(df_tremps, df_users, df_users_in_tremp, ROUND_UP_FROM_MINUTE)
+
@@ -1,9 +1,21 @@
 # /data_visualization.py
+from __future__ import annotations
+
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import streamlit as st
-from typing import Dict
+from concurrent.futures import Future, as_completed
+from typing import Dict, TYPE_CHECKING
+
+# plotly is imported inside the chart functions, so the first page (before any file is uploaded) doesn't wait
+# for it to load
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+    from event_stream import EventStream, WindowSnapshot
+    from trempboss_analytics import SeatOccupancy, UserProfiles
+
+from data_processing import use_approximate_top
+from background_statistics import (TOP_STATISTICS_SECTION, ROUTES_SECTION, TREMP_AND_GENDER_SECTION,
+                                   SEAT_OCCUPANCY_SECTION, TASK_TIMINGS)
 
 
 def create_horizontal_bar_chart(data: pd.Series, x_label: str, y_label: str, chart_title: str) -> go.Figure:
@@ -23,8 +35,9 @@ def create_horizontal_bar_chart(data: pd.Series, x_label: str, y_label: str, cha
     or content of the chart
     :return: a horizontal bar chart as a `go.Figure` object.
     """
+    import plotly.express as px
+
     chart_data = pd.DataFrame({x_label: data.index, y_label: data.values})
-    print(chart_data)
     bar_chart_fig = px.bar(
         chart_data,
         x=y_label,
@@ -48,6 +61,8 @@ def create_pie_chart(tremp_type_counts: Dict[str, int]) -> go.Figure:
     represent the corresponding counts
     :return: a pie chart figure object.
     """
+    import plotly.graph_objects as go
+
     labels = list(tremp_type_counts.keys())
     values = list(tremp_type_counts.values())
     pie_fig = go.Figure(data=[go.Pie(labels=labels, values=values)])
@@ -64,6 +79,8 @@ def create_grouped_bar_chart(gender_month_grouped: pd.DataFrame) -> go.Figure:
     data for the grouped bar chart. It should have the following columns:
     :return: a bar chart figure object.
     """
+    import plotly.graph_objects as go
+
     grouped_fig = go.Figure()
 
     for gender in gender_month_grouped['gender'].unique():
@@ -76,6 +93,21 @@ def create_grouped_bar_chart(gender_month_grouped: pd.DataFrame) -> go.Figure:
     return grouped_fig
 
 
+def create_heatmap(od_counts: pd.DataFrame) -> go.Figure:
+    """
+    The function creates a heatmap of the number of tremps between origins (rows) and destinations (columns).
+
+    :param od_counts: A DataFrame of counts indexed by origin, with a column for every destination.
+    :return: a heatmap figure object.
+    """
+    import plotly.express as px
+
+    heatmap_fig = px.imshow(od_counts, labels={'x': 'To', 'y': 'From', 'color': 'Tremps'},
+                            color_continuous_scale='Blues', aspect='auto', text_auto=True)
+    heatmap_fig.update_layout(title_text="Tremps Between the Busiest Places")
+    return heatmap_fig
+
+
 def render_html(content: str, font_size: int = 20, font_family: str = 'Arial') -> None:
     """
     Renders HTML with the specified content and style.
@@ -120,6 +152,9 @@ def display_top_statistics(top_drivers: pd.Series, top_routes: pd.Series, top_ho
     top_drivers, top_tracks, top_hours (DataFrames): DataFrames for displaying top statistics charts
     """
     st.header("Top Statistics")
+    if use_approximate_top():
+        st.caption("Top drivers and routes are approximate (bounded-memory heavy hitters): every count is an upper "
+                   "bound, and a range after a name is where the true count is guaranteed to be.")
     col1, col2 = st.columns(2)
 
     with col1:
@@ -134,6 +169,26 @@ def display_top_statistics(top_drivers: pd.Series, top_routes: pd.Series, top_ho
     st.plotly_chart(top_hours_chart)
 
 
+def display_route_statistics(origin_totals: pd.Series, od_counts: pd.DataFrame) -> None:
+    """
+    Display the origin-destination statistics charts using Streamlit.
+
+    Parameters:
+    origin_totals (Series): Number of tremps leaving every origin, the busiest first
+    od_counts (DataFrame): Origin-destination counts of the busiest places
+    """
+    st.header("Routes")
+    col1, col2 = st.columns(2)
+
+    with col1:
+        origins_chart = create_horizontal_bar_chart(origin_totals.head(5).sort_values(ascending=True), 'From',
+                                                    'Total Rides', 'Top 5 Origins')
+        st.plotly_chart(origins_chart)
+
+    with col2:
+        st.plotly_chart(create_heatmap(od_counts))
+
+
 def display_tremp_and_gender(tremp_type_counts: Dict[str, int], gender_grouped: pd.DataFrame) -> None:
     """
     Display tremp types and gender distribution charts using Streamlit.
@@ -153,25 +208,210 @@ def display_tremp_and_gender(tremp_type_counts: Dict[str, int], gender_grouped:
         st.plotly_chart(fig)
 
 
+def create_utilization_chart(occupancy: pd.DataFrame, x_label: str, chart_title: str) -> go.Figure:
+    """
+    The function creates a bar chart of the percentage of the offered seats that were filled in every group
+    (month or hour) of an occupancy table.
+
+    :param occupancy: The offered, filled and utilization columns of every group, indexed by the group.
+    :return: a bar chart figure object.
+    """
+    import plotly.express as px
+
+    chart_data = pd.DataFrame({x_label: occupancy.index.astype(str), 'Filled Seats (%)': occupancy['utilization'] * 100,
+                               'Offered Seats': occupancy['offered']})
+    bar_chart_fig = px.bar(chart_data, x=x_label, y='Filled Seats (%)', hover_data=['Offered Seats'],
+                           title=chart_title, range_y=[0, 100])
+    return bar_chart_fig
+
+
+def display_seat_occupancy(seat_occupancy: SeatOccupancy) -> None:
+    """
+    Display the seat occupancy of the driver tremps using Streamlit: the filled seats by month and by hour, the
+    routes and hours with the most empty seats, and the occupancy of every route.
+
+    Parameters:
+    seat_occupancy (SeatOccupancy): The offered and filled seats of the driver tremps of the view
+    """
+    st.header("Seat Occupancy")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Offered Seats", seat_occupancy.offered_seats)
+    col2.metric("Filled Seats", seat_occupancy.filled_seats)
+    col3.metric("Filled", f"{seat_occupancy.utilization:.1%}")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.plotly_chart(create_utilization_chart(seat_occupancy.by_month, 'Month', 'Seats Filled by Month'))
+    with col2:
+        by_hour = seat_occupancy.by_hour.set_axis([f"{hour:02d}:00" for hour in seat_occupancy.by_hour.index])
+        st.plotly_chart(create_utilization_chart(by_hour, 'Hour', 'Seats Filled by Hour'))
+
+    hotspots = seat_occupancy.hotspots
+    unfilled = pd.Series(hotspots['unfilled'].to_numpy(),
+                         index=[f"{route} {hour:02d}:00" for route, hour in zip(hotspots['route'], hotspots['hour'])])
+    st.plotly_chart(create_horizontal_bar_chart(unfilled.iloc[::-1], 'Route and Hour', 'Empty Seats',
+                                                'Routes and Hours with the Most Empty Seats'))
+    with st.expander("Seat Occupancy by Route"):
+        st.dataframe(seat_occupancy.by_route.sort_values('offered', ascending=False, kind='stable'))
+
+
+def display_sections_when_ready(section_futures: Dict[str, Future], section_renderers: Dict[str, callable]) -> None:
+    """
+    Display the dashboard sections that are calculated in the background, each one as soon as its statistics
+    are ready, while a progress bar shows how many sections are still being calculated.
+
+    Parameters:
+    section_futures (dict): Maps each section name to the future of its statistics
+    section_renderers (dict): Maps each section name to the function that displays its statistics
+    """
+    placeholders = {}
+    for index, section in enumerate(section_renderers):
+        if index:
+            st.markdown("---")
+        placeholders[section] = st.empty()
+
+    progress_bar = st.progress(0.0, text="Calculating statistics...")
+    futures_to_sections = {section_futures[section]: section for section in section_renderers}
+
+    for done_count, future in enumerate(as_completed(futures_to_sections), start=1):
+        section = futures_to_sections[future]
+        with placeholders[section].container():
+            section_renderers[section](*future.result())
+        progress_bar.progress(done_count / len(futures_to_sections),
+                              text=f"Calculated {done_count} of {len(futures_to_sections)} sections")
+
+    progress_bar.empty()
+
+
+def display_task_timings(task_timings: pd.DataFrame) -> None:
+    """
+    Display how long every statistic of the view took to calculate, and how long it waited for a worker.
+
+    Parameters:
+    task_timings (DataFrame): The Task, Run (s), Wait (s) and Worker of every statistic
+    """
+    with st.expander("Statistics Timing"):
+        st.caption(f"{task_timings['Run (s)'].sum():.3f}s of calculation in total")
+        st.dataframe(task_timings, hide_index=True)
+
+
+def display_user_profile(user_profiles: UserProfiles) -> None:
+    """
+    Display the activity profile of a chosen user using Streamlit. The profiles cover the whole file, not only
+    the filtered tremps.
+
+    Parameters:
+    user_profiles (UserProfiles): The profiles of all the users, looked up by user id
+    """
+    from trempboss_analytics import format_user_profile
+
+    st.header("User Profile")
+    user_id = st.selectbox("Choose a User:", options=user_profiles.table.index,
+                           format_func=lambda option: f"{user_profiles.full_name(option)} ({option})")
+    if user_id is None:
+        return
+    profile = format_user_profile(user_profiles.lookup(user_id))
+    columns = st.columns(4)
+    for column, (label, value) in zip(columns * 2, profile.items()):
+        column.metric(label, value)
+
+
+def display_downloads(view_futures: Dict[str, Future]) -> None:
+    """
+    Display the download buttons of the filtered data and of its statistics using Streamlit. The files are
+    built only when a button is clicked.
+
+    Parameters:
+    view_futures (dict): Futures of the view, including the filtered data and the statistics of every section
+    """
+    # pyarrow is only needed once the dashboard has data, like plotly
+    from export import EXPORT_FORMATS, filtered_data_exporter, statistics_exporter
+
+    st.header("Download")
+    export_format = st.radio("File Format:", options=list(EXPORT_FORMATS), index=0, horizontal=True)
+    extension, mime = EXPORT_FORMATS[export_format]
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("Download Filtered Data", data=filtered_data_exporter(view_futures, export_format),
+                           file_name=f"trempboss_filtered_data.{extension}", mime=mime, on_click='ignore')
+    with col2:
+        st.download_button("Download Statistics", data=statistics_exporter(view_futures, export_format),
+                           file_name=f"trempboss_statistics.{extension}", mime=mime, on_click='ignore')
+
+
+def display_live_window(window: WindowSnapshot) -> None:
+    """
+    Display the statistics of one sliding window of the live activity using Streamlit.
+
+    Parameters:
+    window (WindowSnapshot): A copy of the statistics of the events of the window
+    """
+    total_hitchhikers, avg_people_per_tremp, total_tremps = window.total_statistics
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Total Hitchhikers", total_hitchhikers)
+    col2.metric("Avg People per Tremp", avg_people_per_tremp)
+    col3.metric("Total Tremps", total_tremps)
+    st.caption(f"{window.event_count} events in the window, {window.late_events} arrived too late for it")
+
+    st.subheader("Tremps per Hour")
+    st.bar_chart(window.hourly_histogram)
+
+    col1, col2 = st.columns(2)
+    tremp_type_counts = window.tremp_type_counts
+    gender_grouped = window.gender_grouped
+    with col1:
+        if tremp_type_counts:
+            st.plotly_chart(create_pie_chart(tremp_type_counts), key=f"live_tremp_types_{window.label}")
+    with col2:
+        if not gender_grouped.empty:
+            st.plotly_chart(create_grouped_bar_chart(gender_grouped), key=f"live_gender_{window.label}")
+
+
+def display_live_activity(event_stream: EventStream, refresh_seconds: float) -> None:
+    """
+    Display the live activity of an event log using Streamlit, with a tab for every sliding window. Only this
+    section reruns every `refresh_seconds`, and every refresh reads only the events added to the log since the
+    last one.
+
+    Parameters:
+    event_stream (EventStream): The followed event log and the statistics of its windows
+    refresh_seconds (float): Seconds between the refreshes
+    """
+    @st.fragment(run_every=refresh_seconds)
+    def live_activity() -> None:
+        event_stream.poll()
+        # Only a copy of the windows is displayed, other sessions may poll the stream meanwhile
+        snapshot = event_stream.snapshot()
+        st.header("Live Activity")
+        st.caption(f"{snapshot.events_read} events read from {snapshot.path}, {snapshot.invalid_events} invalid")
+        tabs = st.tabs([f"Last {window.label}" for window in snapshot.windows])
+        for tab, window in zip(tabs, snapshot.windows):
+            with tab:
+                display_live_window(window)
+        st.markdown("---")
+
+    live_activity()
+
+
 def display_data(
         df: pd.DataFrame,
         total_hitchhikers: int,
         avg_people_per_tremp: str,
         total_tremps: int,
-        top_drivers: pd.Series,
-        top_routes: pd.Series,
-        top_hours: pd.Series,
-        tremp_type_counts: Dict[str, int],
-        gender_grouped: pd.DataFrame) -> None:
+        section_futures: Dict[str, Future],
+        user_profiles: UserProfiles) -> None:
     """
     This function takes in several parameters and displays data using the Streamlit library.
+    The general statistics are displayed right away and the other sections fill in as their background
+    calculations finish.
 
     Parameters:
     df (DataFrame): The dataframe to display
-    tremp_type, from_route, to_route, creator, user_in_tremp (list): Lists used for filtering the dataframe
     total_hitchhikers, avg_people_per_tremp, total_tremps (int): Integer values for display in general statistics
-    top_drivers, top_tracks, top_hours (DataFrames): DataFrames for displaying top statistics charts
-    tremp_type_counts, gender_grouped (DataFrames): DataFrames for displaying pie and bar charts respectively
+    section_futures (dict): Futures of the view, including the filtered data, the top statistics, routes and the
+    tremp types and gender sections
+    user_profiles (UserProfiles): The activity profiles of the users of the file, for the user drill-down
     """
     # Set Streamlit configurations
     st.title(":car: TrempBoss Dashboard")
@@ -183,10 +423,15 @@ def display_data(
     st.header("Tremp Data")
     st.dataframe(df)
     st.markdown("---")
-    display_top_statistics(top_drivers, top_routes, top_hours)
+    display_sections_when_ready(section_futures, {TOP_STATISTICS_SECTION: display_top_statistics,
+                                                  ROUTES_SECTION: display_route_statistics,
+                                                  TREMP_AND_GENDER_SECTION: display_tremp_and_gender,
+                                                  SEAT_OCCUPANCY_SECTION: display_seat_occupancy})
+    display_task_timings(section_futures[TASK_TIMINGS].result())
     st.markdown("---")
-    display_tremp_and_gender(tremp_type_counts, gender_grouped)
-
+    display_user_profile(user_profiles)
+    st.markdown("---")
+    display_downloads(section_futures)
     # Hide Streamlit style
     hide_st_style = """
                     <style>
@@ -0,0 +1,225 @@
+# /dataset_store.py
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, NamedTuple, Optional
+
+import pandas as pd
+import streamlit as st
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from data_processing import load_data, transform_data, calculate_user_profiles
+from filter_cache import remove_dataset_results
+from memory_profile import MemoryProfiler, profile_stage
+
+# RAM ceiling of the shared store, can be changed with the TREMPBOSS_STORE_MAX_MB environment variable
+DEFAULT_STORE_MAX_MB = 512
+STORE_MAX_MB_ENV = 'TREMPBOSS_STORE_MAX_MB'
+
+# Datasets whose user profiles are kept, the profiles are a small fraction of the size of their dataset
+USER_PROFILES_CACHE_ENTRIES = 8
+
+
+class DatasetTables(NamedTuple):
+    tremps: pd.DataFrame
+    users: pd.DataFrame
+    users_in_tremp: pd.DataFrame
+    transformed: pd.DataFrame
+
+
+class SharedDataset:
+    """
+    One immutable copy of a loaded and transformed file, together with the sessions that are viewing it.
+    """
+
+    def __init__(self, dataset_hash: str, tables: DatasetTables):
+        self.dataset_hash = dataset_hash
+        self.tables = tables
+        self.memory_bytes = int(sum(table.memory_usage(deep=True).sum() for table in tables))
+        self.sessions = set()
+        self.last_used = time.time()
+
+    def view(self) -> DatasetTables:
+        """
+        Returns read-only views of the tables, shallow copies that share the data of the stored tables.
+        """
+        return DatasetTables(*(table.copy(deep=False) for table in self.tables))
+
+
+class SharedDatasetStore:
+    """
+    A process-wide store that keeps one copy of every transformed dataset, keyed by the hash of the file
+    content, and evicts the least recently used datasets when the store grows over its RAM ceiling.
+    """
+
+    def __init__(self, max_bytes: int, on_evict: Optional[Callable[[str], None]] = None):
+        """
+        :param max_bytes: The RAM ceiling of the stored datasets.
+        :param on_evict: Called with the hash of every evicted dataset, to drop what was calculated from it.
+        """
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self._datasets = OrderedDict()
+        self._session_hashes = {}
+        self._lock = threading.Lock()
+        self._build_locks = {}
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(dataset.memory_bytes for dataset in self._datasets.values())
+
+    def get_or_build(self, dataset_hash: str, session_id: str,
+                     build: Callable[[], Optional[DatasetTables]]) -> Optional[DatasetTables]:
+        """
+        Returns views of the dataset with the given hash, building it with `build` only when no other session
+        has already stored it. `build` may return None when the file can't be loaded, nothing is stored then.
+
+        :param dataset_hash: The content hash of the uploaded file.
+        :param session_id: The id of the Streamlit session asking for the dataset, used for the sharing counts.
+        :param build: A function that loads and transforms the file.
+        """
+        with self._lock:
+            build_lock = self._build_locks.setdefault(dataset_hash, threading.Lock())
+
+        # Only one session builds a new dataset, the other sessions that uploaded the same file wait for it
+        with build_lock:
+            with self._lock:
+                dataset = self._datasets.get(dataset_hash)
+            if dataset is None:
+                tables = build()
+                if tables is None:
+                    return None
+                dataset = SharedDataset(dataset_hash, tables)
+
+            with self._lock:
+                self._datasets[dataset_hash] = dataset
+                self._datasets.move_to_end(dataset_hash)
+                dataset.last_used = time.time()
+                self._attach_session(session_id, dataset)
+                self._evict()
+                return dataset.view()
+
+    def _attach_session(self, session_id: str, dataset: SharedDataset) -> None:
+        previous_hash = self._session_hashes.get(session_id)
+        if previous_hash is not None and previous_hash != dataset.dataset_hash \
+                and previous_hash in self._datasets:
+            self._datasets[previous_hash].sessions.discard(session_id)
+        self._session_hashes[session_id] = dataset.dataset_hash
+        dataset.sessions.add(session_id)
+
+    def remove_ended_sessions(self, is_active: Callable[[str], bool]) -> None:
+        """
+        Removes the sessions that ended (their browser tab was closed) from the datasets they were viewing.
+
+        :param is_active: Returns whether the session with the given id is still running.
+        """
+        with self._lock:
+            ended_sessions = [session_id for session_id in self._session_hashes if not is_active(session_id)]
+            for session_id in ended_sessions:
+                dataset = self._datasets.get(self._session_hashes.pop(session_id))
+                if dataset is not None:
+                    dataset.sessions.discard(session_id)
+
+    def _evict(self) -> None:
+        # The most recently used dataset is never evicted, even when it alone is over the ceiling
+        while len(self._datasets) > 1 and self.memory_bytes > self.max_bytes:
+            evicted_hash, evicted = self._datasets.popitem(last=False)
+            self._build_locks.pop(evicted_hash, None)
+            for session_id in evicted.sessions:
+                self._session_hashes.pop(session_id, None)
+            if self.on_evict is not None:
+                self.on_evict(evicted_hash)
+
+    def report(self) -> pd.DataFrame:
+        """
+        Returns a dataframe with the memory and the number of sessions of every stored dataset, the most
+        recently used first. Ended sessions are counted until `remove_ended_sessions` removes them.
+        """
+        with self._lock:
+            rows = [{
+                'Dataset': dataset_hash[:12],
+                'Memory (MB)': round(dataset.memory_bytes / 2 ** 20, 2),
+                'Sessions': len(dataset.sessions),
+                'Last Used': pd.Timestamp(dataset.last_used, unit='s').strftime('%H:%M:%S'),
+            } for dataset_hash, dataset in reversed(self._datasets.items())]
+        return pd.DataFrame(rows, columns=['Dataset', 'Memory (MB)', 'Sessions', 'Last Used'])
+
+
+def hash_file_content(content: bytes) -> str:
+    """
+    The function returns the SHA-256 hash of a file content, used as the key of the dataset in the store.
+    """
+    return hashlib.sha256(content).hexdigest()
+
+
+@st.cache_resource
+def get_dataset_store() -> SharedDatasetStore:
+    """
+    The function returns the single store shared by all the sessions of the Streamlit server. The filter results
+    of a dataset are dropped together with it.
+    """
+    max_mb = float(os.environ.get(STORE_MAX_MB_ENV, DEFAULT_STORE_MAX_MB))
+    return SharedDatasetStore(int(max_mb * 2 ** 20), on_evict=remove_dataset_results)
+
+
+@st.cache_resource(max_entries=USER_PROFILES_CACHE_ENTRIES)
+def get_user_profiles(dataset_hash: str, _tables: DatasetTables, _built_profiles=None):
+    """
+    The function returns the activity profiles of the users of a dataset, built once for all the sessions. The
+    profiles are cached by the hash of the dataset, its tables aren't hashed. Profiles that were already built
+    (like the ones of a snapshot) are cached as they are instead of being built again.
+    """
+    if _built_profiles is not None:
+        return _built_profiles
+    return calculate_user_profiles(_tables.tremps, _tables.users, _tables.users_in_tremp)
+
+
+def get_session_id() -> str:
+    """
+    The function returns the id of the current Streamlit session.
+    """
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else 'local'
+
+
+def is_active_session(session_id: str) -> bool:
+    """
+    The function returns whether a Streamlit session is still running. Without a Streamlit server (like in a
+    script) the only session is the current one.
+    """
+    if not runtime.exists():
+        return True
+    return runtime.get_instance().is_active_session(session_id)
+
+
+def load_shared_dataset(uploaded_file, profiler: Optional[MemoryProfiler] = None) \
+        -> tuple[Optional[str], Optional[DatasetTables]]:
+    """
+    The function `load_shared_dataset` returns views of the loaded and transformed tables of an uploaded
+    file. The file is parsed and transformed only by the first session that uploads it, the other sessions
+    get views of the same stored copy.
+
+    :param uploaded_file: The file returned by the sidebar uploader, or None.
+    :param profiler: Traces the memory of loading and transforming the file, when it is loaded by this session.
+    :return: tuple containing the content hash of the file and its tables, or (None, None).
+    """
+    if not uploaded_file:
+        return None, None
+
+    def build() -> Optional[DatasetTables]:
+        with profile_stage(profiler, 'load'):
+            df_tremps, df_users, df_users_in_tremp = load_data(uploaded_file)
+        if df_tremps is None or df_users is None or df_users_in_tremp is None:
+            return None
+        with profile_stage(profiler, 'transform'):
+            transformed = transform_data(df_tremps, df_users, df_users_in_tremp)
+        return DatasetTables(df_tremps, df_users, df_users_in_tremp, transformed)
+
+    dataset_hash = hash_file_content(uploaded_file.getvalue())
+    tables = get_dataset_store().get_or_build(dataset_hash, get_session_id(), build)
+    if tables is None:
+        return None, None
+    return dataset_hash, tables
@@ -0,0 +1,502 @@
+# /event_stream.py
+"""
+Live activity of the dashboard, read from an append-only JSONL log of tremp, user and participation events.
+
+Every line of the log is one JSON event with an "event" kind and an ISO "time":
+    {"event": "tremp", "time": ..., "tremp_id": 7, "tremp_type": "driver", "seats_amount": 3, "date": "2023-05-01",
+     "tremp_time": "08:15:00", "from_route": ..., "to_route": ...}
+    {"event": "user", "time": ..., "user_id": 12, "full_name": ..., "gender": "female"}
+    {"event": "participation", "time": ..., "user_id": 12, "tremp_id": 7, "is_tremp_creator": false}
+
+The log is tailed: every poll reads only the lines added since the last one. The dashboard statistics are kept
+over sliding windows of event time (the last hour, day...), every event is added to a window once and removed
+once when it gets older than the window, so a refresh costs the new events and not the whole history.
+
+Usage, to write the events of a workbook to a log as a stand-in for the event producer:
+    python event_stream.py <workbook.xlsx> <events.jsonl> [--delay SECONDS]
+"""
+import argparse
+import datetime
+import heapq
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import constants_joined_cols_names as const
+from data_processing import ROUND_UP_FROM_MINUTE, TREMP_TYPES
+import trempboss_analytics as analytics
+from trempboss_analytics.columns import HITCHHIKER_TREMP_TYPE
+
+# The event log of the live activity, can also be given in the sidebar
+EVENT_LOG_ENV = 'TREMPBOSS_EVENT_LOG'
+
+# Seconds between the refreshes of the live activity
+EVENT_REFRESH_SECONDS_ENV = 'TREMPBOSS_EVENT_REFRESH_SECONDS'
+DEFAULT_EVENT_REFRESH_SECONDS = 5
+
+# The sliding windows of the live activity, like "1h,24h,7d" (s, m, h and d units)
+EVENT_WINDOWS_ENV = 'TREMPBOSS_EVENT_WINDOWS'
+DEFAULT_EVENT_WINDOWS = '1h,24h,7d'
+
+TREMP_EVENT = 'tremp'
+USER_EVENT = 'user'
+PARTICIPATION_EVENT = 'participation'
+
+WINDOW_UNITS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+# The most users whose gender is remembered, the least recently seen users are forgotten first
+MAX_REMEMBERED_USERS = 100_000
+
+# Bytes of the log read at a time, so a long unread backlog isn't read into memory in one piece
+READ_BLOCK_BYTES = 1024 * 1024
+
+
+def parse_window(window: str) -> Tuple[str, float]:
+    """
+    The function parses a window like "15m" or "7d".
+
+    :return: tuple containing the window label and its length in seconds.
+    """
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([smhd])\s*', window)
+    if match is None:
+        raise ValueError(f"Invalid window: {window!r}, expected a number and one of the units s, m, h, d")
+    return f"{match.group(1)}{match.group(2)}", float(match.group(1)) * WINDOW_UNITS[match.group(2)]
+
+
+def windows_from_environment() -> List[Tuple[str, float]]:
+    """
+    The function returns the sliding windows set in TREMPBOSS_EVENT_WINDOWS, or the default ones.
+    """
+    return [parse_window(window) for window in os.environ.get(EVENT_WINDOWS_ENV, DEFAULT_EVENT_WINDOWS).split(',')]
+
+
+def event_timestamp(event: dict) -> float:
+    """
+    The function returns the time of an event in seconds, from its ISO "time" or from a number of seconds.
+    """
+    event_time = event['time']
+    if isinstance(event_time, (int, float)):
+        return float(event_time)
+    return datetime.datetime.fromisoformat(event_time).timestamp()
+
+
+def rounded_hour(tremp_time: str) -> int:
+    """
+    The function rounds a tremp time ("HH:MM[:SS]") to an hour the way the dashboard does.
+    """
+    parsed_time = datetime.time.fromisoformat(tremp_time)
+    return (parsed_time.hour + (parsed_time.minute >= ROUND_UP_FROM_MINUTE)) % 24
+
+
+class TrempInfo(NamedTuple):
+    tremp_type: Optional[str]
+    seats_amount: int
+    # The month of the tremp date, the gender counts are by the month of the tremp like in the dashboard
+    month: Optional[str]
+
+
+class WindowEntry(NamedTuple):
+    """
+    What an event added to a window, so removing it later takes out exactly the same counts.
+    """
+    kind: str
+    tremp_id: int
+    tremp_type: Optional[str]
+    seats_amount: int
+    is_creator: bool
+    hour: int
+    month: Optional[str]
+    gender: Optional[str]
+
+
+class WindowSnapshot(NamedTuple):
+    """
+    The statistics of a sliding window at one moment, copied out of it so they can be displayed while the window
+    keeps changing.
+    """
+    label: str
+    event_count: int
+    late_events: int
+    total_statistics: Tuple[int, str, int]
+    hourly_histogram: pd.Series
+    tremp_type_counts: Dict[str, int]
+    gender_grouped: pd.DataFrame
+
+
+class StreamSnapshot(NamedTuple):
+    """
+    The state of an event stream and of all its windows at one moment.
+    """
+    path: str
+    events_read: int
+    invalid_events: int
+    windows: List[WindowSnapshot]
+
+
+class SlidingWindowAggregates:
+    """
+    The dashboard statistics of the events of the last `length_seconds` of event time. The window ends at the
+    newest event time seen, events that are already older than the window when they arrive are counted as late
+    and left out.
+    """
+
+    def __init__(self, label: str, length_seconds: float):
+        self.label = label
+        self.length_seconds = length_seconds
+        self.newest_time = float('-inf')
+        self.late_events = 0
+        self._entries: List[Tuple[float, int, WindowEntry]] = []
+        self._sequence = 0
+
+        self.hour_counts = np.zeros(24, dtype=np.int64)
+        self.participations_by_type: Dict[Tuple[str, bool], int] = {}
+        self.gender_month_counts: Dict[Tuple[str, str], int] = {}
+        # Joiners in the window of every tremp and the seats its first joiner added to asked_seats, a tremp with
+        # joiners is a joined tremp
+        self._tremp_joiners: Dict[int, Tuple[int, int]] = {}
+        self.joiners = 0
+        self.joined_tremps = 0
+        self.asked_seats = 0
+
+    def add(self, timestamp: float, entry: WindowEntry) -> List[WindowEntry]:
+        """
+        Adds an event to the window, and removes the events that the newer time pushed out of it.
+
+        :return: the entries that left the window, including the new one when it is late.
+        """
+        self.newest_time = max(self.newest_time, timestamp)
+        if timestamp <= self.newest_time - self.length_seconds:
+            self.late_events += 1
+            return [entry]
+        self._apply(entry, 1)
+        self._sequence += 1
+        heapq.heappush(self._entries, (timestamp, self._sequence, entry))
+        return self.expire()
+
+    def expire(self) -> List[WindowEntry]:
+        """
+        Removes the events that are older than the window.
+
+        :return: the removed entries.
+        """
+        window_start = self.newest_time - self.length_seconds
+        expired = []
+        while self._entries and self._entries[0][0] <= window_start:
+            _, _, entry = heapq.heappop(self._entries)
+            self._apply(entry, -1)
+            expired.append(entry)
+        return expired
+
+    def _apply(self, entry: WindowEntry, sign: int) -> None:
+        if entry.kind == TREMP_EVENT:
+            if entry.hour >= 0:
+                self.hour_counts[entry.hour] += sign
+            return
+
+        if entry.tremp_type is not None:
+            type_key = (entry.tremp_type, entry.is_creator)
+            self.participations_by_type[type_key] = self.participations_by_type.get(type_key, 0) + sign
+        if entry.gender is not None and entry.month is not None:
+            gender_key = (entry.month, entry.gender)
+            self.gender_month_counts[gender_key] = self.gender_month_counts.get(gender_key, 0) + sign
+        if entry.is_creator:
+            return
+
+        self.joiners += sign
+        joiners, asked_seats = self._tremp_joiners.get(entry.tremp_id, (0, 0))
+        # The tremp becomes joined with its first joiner in the window and stops being joined with its last. The
+        # last joiner takes out the seats the first one added, its own entry may know a different tremp type
+        if sign > 0 and joiners == 0:
+            self.joined_tremps += 1
+            asked_seats = entry.seats_amount if entry.tremp_type == HITCHHIKER_TREMP_TYPE else 0
+            self.asked_seats += asked_seats
+        elif sign < 0 and joiners == 1:
+            self.joined_tremps -= 1
+            self.asked_seats -= asked_seats
+        if joiners + sign:
+            self._tremp_joiners[entry.tremp_id] = (joiners + sign, asked_seats)
+        else:
+            del self._tremp_joiners[entry.tremp_id]
+
+    @property
+    def event_count(self) -> int:
+        return len(self._entries)
+
+    def total_statistics(self) -> Tuple[int, str, int]:
+        """
+        Returns the total hitchhikers, the average people per tremp and the total (joined) tremps of the window,
+        like `data_processing.calculate_total_statistics`.
+        """
+        total_hitchhikers = self.joiners + self.asked_seats
+        avg_people_per_tremp = analytics.format_average_people_per_tremp(total_hitchhikers, self.joined_tremps)
+        return total_hitchhikers, avg_people_per_tremp, self.joined_tremps
+
+    def tremp_type_counts(self) -> Dict[str, int]:
+        """
+        Returns the creators and joiners of every tremp type, like
+        `data_processing.calculate_participation_counts_by_tremp_type`.
+        """
+        counts = {}
+        for tremp_type in TREMP_TYPES:
+            counts[f'{tremp_type.capitalize()} Creators'] = self.participations_by_type.get((tremp_type, True), 0)
+            counts[f'{tremp_type.capitalize()} Joiners'] = self.participations_by_type.get((tremp_type, False), 0)
+        return {tremp: count for tremp, count in counts.items() if count != 0}
+
+    def hourly_histogram(self) -> pd.Series:
+        """
+        Returns the number of tremps of every rounded hour, indexed by "HH:00".
+        """
+        return pd.Series(self.hour_counts, index=[f'{hour:02d}:00' for hour in range(24)], name='count')
+
+    def gender_grouped(self) -> pd.DataFrame:
+        """
+        Returns the participations per month and gender with the date, gender and counts columns, like
+        `data_processing.group_by_gender_and_month`.
+        """
+        rows = sorted((month, gender, count) for (month, gender), count in self.gender_month_counts.items()
+                      if count)
+        gender_grouped = pd.DataFrame(rows, columns=[const.DATE_COLUMN, 'gender', 'counts'])
+        gender_grouped[const.DATE_COLUMN] = pd.PeriodIndex(gender_grouped[const.DATE_COLUMN], freq='M')
+        return gender_grouped
+
+    def snapshot(self) -> WindowSnapshot:
+        """
+        Returns a copy of the statistics of the window, the caller must keep the window from changing meanwhile.
+        """
+        return WindowSnapshot(self.label, self.event_count, self.late_events, self.total_statistics(),
+                              self.hourly_histogram().copy(), self.tremp_type_counts(), self.gender_grouped())
+
+
+class EventLogTail:
+    """
+    Reads the complete lines added to a log since the last read. A line that is still being written (without
+    its newline) is read once it is complete. A log that got shorter was replaced, and is read from the start.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offset = 0
+        self.bad_lines = 0
+
+    def read_events(self) -> Tuple[List[dict], bool]:
+        """
+        :return: tuple containing the new events and whether the log was replaced since the last read.
+        """
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return [], False
+        replaced = size < self.offset
+        if replaced:
+            self.offset = 0
+            self.bad_lines = 0
+
+        events = []
+        with open(self.path, 'rb') as log_file:
+            log_file.seek(self.offset)
+            # The incomplete last line of a block is carried over to the next one, the offset moves past the
+            # complete lines only
+            carried_bytes = b''
+            remaining = size - self.offset
+            while remaining > 0:
+                block = log_file.read(min(READ_BLOCK_BYTES, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+                new_bytes = carried_bytes + block
+                complete_length = new_bytes.rfind(b'\n') + 1
+                self._parse_lines(new_bytes[:complete_length], events)
+                self.offset += complete_length
+                carried_bytes = new_bytes[complete_length:]
+        return events, replaced
+
+    def _parse_lines(self, lines: bytes, events: List[dict]) -> None:
+        for line in lines.splitlines():
+            if not line.strip():
+                continue
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                self.bad_lines += 1
+
+
+class EventStream:
+    """
+    Follows an event log and keeps the statistics of its sliding windows. The tremps and users seen so far are
+    remembered, so a participation is counted with the type, seats and month of its tremp and the gender of its
+    user. A participation that arrives before its tremp or user is counted in the totals only. A tremp is
+    forgotten once no event of it is left in the longest window, and only the MAX_REMEMBERED_USERS most recently
+    seen users are kept, so the memory doesn't grow with the history of the log. Polls and snapshots take the
+    lock of the stream, so several sessions can poll it and display its snapshots at once. The windows themselves
+    are only read under that lock.
+    """
+
+    def __init__(self, path: str, windows: List[Tuple[str, float]]):
+        self.path = path
+        self.window_lengths = windows
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.tail = EventLogTail(self.path)
+        self.windows = [SlidingWindowAggregates(label, length) for label, length in self.window_lengths]
+        self.longest_window = max(self.windows, key=lambda window: window.length_seconds)
+        self.tremps: Dict[int, TrempInfo] = {}
+        # Entries of every tremp in the longest window, the tremp is forgotten when it has none left
+        self._tremp_entries: Dict[int, int] = {}
+        self.user_genders: OrderedDict[int, str] = OrderedDict()
+        self.events_read = 0
+        self.invalid_events = 0
+
+    def poll(self) -> int:
+        """
+        Reads the new events of the log into the windows.
+
+        :return: the number of new events.
+        """
+        with self._lock:
+            events, replaced = self.tail.read_events()
+            if replaced:
+                # A new log, its statistics start over
+                self._reset()
+                events, _ = self.tail.read_events()
+            for event in events:
+                try:
+                    self._ingest(event)
+                except (KeyError, TypeError, ValueError):
+                    self.invalid_events += 1
+            self.events_read += len(events)
+            return len(events)
+
+    def snapshot(self) -> StreamSnapshot:
+        """
+        Returns a copy of the statistics of every window and of the counts of the stream, made under the lock so
+        a poll of another session can't change them while they are copied.
+        """
+        with self._lock:
+            return StreamSnapshot(self.path, self.events_read, self.invalid_events + self.tail.bad_lines,
+                                  [window.snapshot() for window in self.windows])
+
+    def _ingest(self, event: dict) -> None:
+        kind = event['event']
+        if kind == USER_EVENT:
+            user_id = int(event['user_id'])
+            self.user_genders[user_id] = event['gender']
+            self.user_genders.move_to_end(user_id)
+            if len(self.user_genders) > MAX_REMEMBERED_USERS:
+                self.user_genders.popitem(last=False)
+            return
+
+        timestamp = event_timestamp(event)
+        if kind == TREMP_EVENT:
+            tremp_id = int(event[const.TREMP_ID_COLUMN])
+            tremp_info = TrempInfo(event[const.TREMP_TYPE_COLUMN], int(event.get(const.SEATS_AMOUNT_COLUMN) or 0),
+                                   event[const.DATE_COLUMN][:7] if event.get(const.DATE_COLUMN) else None)
+            hour = rounded_hour(event[const.TREMP_TIME_COLUMN]) if event.get(const.TREMP_TIME_COLUMN) else -1
+            self.tremps[tremp_id] = tremp_info
+            entry = WindowEntry(TREMP_EVENT, tremp_id, tremp_info.tremp_type, tremp_info.seats_amount, True, hour,
+                                tremp_info.month, None)
+        elif kind == PARTICIPATION_EVENT:
+            tremp_id = int(event[const.TREMP_ID_COLUMN])
+            tremp_info = self.tremps.get(tremp_id, TrempInfo(None, 0, None))
+            user_id = int(event['user_id'])
+            if user_id in self.user_genders:
+                self.user_genders.move_to_end(user_id)
+            entry = WindowEntry(PARTICIPATION_EVENT, tremp_id, tremp_info.tremp_type, tremp_info.seats_amount,
+                                bool(event['is_tremp_creator']), -1, tremp_info.month, self.user_genders.get(user_id))
+        else:
+            raise ValueError(f"Unknown event kind: {kind}")
+
+        self._tremp_entries[tremp_id] = self._tremp_entries.get(tremp_id, 0) + 1
+        for window in self.windows:
+            expired = window.add(timestamp, entry)
+            if window is self.longest_window:
+                self._forget_expired(expired)
+
+    def _forget_expired(self, expired: List[WindowEntry]) -> None:
+        for entry in expired:
+            remaining = self._tremp_entries[entry.tremp_id] - 1
+            if remaining:
+                self._tremp_entries[entry.tremp_id] = remaining
+            else:
+                del self._tremp_entries[entry.tremp_id]
+                self.tremps.pop(entry.tremp_id, None)
+
+
+@st.cache_resource
+def get_event_stream(path: str, windows: Tuple[Tuple[str, float], ...]) -> EventStream:
+    """
+    The function returns the stream of an event log shared by all the sessions of the Streamlit server, so the
+    log is read once however many sessions follow it.
+    """
+    return EventStream(path, list(windows))
+
+
+class EventLogWriter:
+    """
+    Appends events to a JSONL log, one flushed line per event. Stands in for the event producer.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def write(self, events) -> None:
+        with open(self.path, 'a', encoding='utf-8') as log_file:
+            for event in events:
+                log_file.write(json.dumps(event, ensure_ascii=False, default=str) + '\n')
+                log_file.flush()
+
+
+def workbook_events(df_tremps: pd.DataFrame, df_users: pd.DataFrame,
+                    df_users_in_tremp: pd.DataFrame) -> Iterator[dict]:
+    """
+    The function turns the tables of a workbook into events: every user first, then the tremps by their date and
+    time, each followed by its participations. The time of a tremp and its participations is its date and time.
+    """
+    for user in df_users.itertuples(index=False):
+        yield {'event': USER_EVENT, 'time': 0, 'user_id': int(user.user_id), 'full_name': user.full_name,
+               'gender': user.gender}
+
+    participations = df_users_in_tremp.groupby(const.TREMP_ID_COLUMN)
+    tremp_times = df_tremps[const.DATE_COLUMN] + pd.to_timedelta(df_tremps[const.TREMP_TIME_COLUMN].astype(str))
+    for position in np.argsort(tremp_times.to_numpy(), kind='stable'):
+        tremp = df_tremps.iloc[position]
+        tremp_id = int(tremp[const.TREMP_ID_COLUMN])
+        event_time = tremp_times.iloc[position].isoformat()
+        yield {'event': TREMP_EVENT, 'time': event_time, 'tremp_id': tremp_id,
+               'tremp_type': tremp[const.TREMP_TYPE_COLUMN], 'seats_amount': int(tremp[const.SEATS_AMOUNT_COLUMN]),
+               'date': tremp[const.DATE_COLUMN].date().isoformat(), 'tremp_time': str(tremp[const.TREMP_TIME_COLUMN]),
+               'from_route': tremp[const.FROM_ROUTE_COLUMN], 'to_route': tremp[const.TO_ROUTE_COLUMN]}
+        if tremp_id in participations.groups:
+            for participation in participations.get_group(tremp_id).itertuples(index=False):
+                yield {'event': PARTICIPATION_EVENT, 'time': event_time, 'user_id': int(participation.user_id),
+                       'tremp_id': tremp_id, 'is_tremp_creator': bool(participation.is_tremp_creator)}
+
+
+def main() -> None:
+    from data_processing import load_data
+
+    parser = argparse.ArgumentParser(description="Write the tables of a workbook to an event log as events.")
+    parser.add_argument('workbook', help="the TrempBoss workbook to read")
+    parser.add_argument('event_log', help="the JSONL log the events are appended to")
+    parser.add_argument('--delay', type=float, default=0.0, help="seconds to wait between tremps")
+    args = parser.parse_args()
+
+    df_tremps, df_users, df_users_in_tremp = load_data(args.workbook)
+    writer = EventLogWriter(args.event_log)
+    for event in workbook_events(df_tremps, df_users, df_users_in_tremp):
+        writer.write([event])
+        if args.delay and event['event'] == TREMP_EVENT:
+            time.sleep(args.delay)
+
+
+if __name__ == "__main__":
+    main()
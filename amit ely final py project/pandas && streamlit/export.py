@@ -0,0 +1,229 @@
+# /export.py
+import io
+from concurrent.futures import Future
+from typing import Dict, Iterable, Iterator, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.ipc as pa_ipc
+import pyarrow.parquet as pq
+
+from background_statistics import (FILTERED_DATA, GENERAL_STATISTICS_SECTION, TOP_STATISTICS_SECTION,
+                                   ROUTES_SECTION, TREMP_AND_GENDER_SECTION, SEAT_OCCUPANCY_SECTION,
+                                   SECTION_STATISTICS)
+
+# Download formats, with the extension and MIME type of their files
+EXPORT_FORMATS = {
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'Arrow IPC': ('arrow', 'application/vnd.apache.arrow.file'),
+    'CSV': ('csv', 'text/csv'),
+}
+
+# Rows per record batch, the writers hold a single batch of converted values at a time
+EXPORT_BATCH_ROWS = 64 * 1024
+
+# Joins the users of a tremp in the CSV export, CSV has no list type
+CSV_LIST_SEPARATOR = ', '
+
+STATISTICS_COLUMNS = ['section', 'statistic', 'label', 'value']
+
+
+def to_arrow_schema(df: pd.DataFrame) -> pa.Schema:
+    """
+    The function returns the Arrow schema of a dataframe, read from its first batch of rows. Only a column with
+    no values in those rows is read in full to find its type.
+    """
+    schema = pa.Schema.from_pandas(df.head(EXPORT_BATCH_ROWS), preserve_index=False)
+    for index, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            schema = schema.set(index, pa.field(field.name, pa.array(df[field.name], from_pandas=True).type))
+    return schema
+
+
+def to_record_batches(df: pd.DataFrame, schema: pa.Schema) -> Iterator[pa.RecordBatch]:
+    """
+    The function converts a dataframe to Arrow record batches one slice of EXPORT_BATCH_ROWS rows at a time, so
+    only the batch being written is ever converted. Numeric columns are wrapped without converting their values
+    one by one and categorical columns become dictionary columns that keep their codes.
+    """
+    for start in range(0, len(df), EXPORT_BATCH_ROWS):
+        yield pa.RecordBatch.from_pandas(df.iloc[start:start + EXPORT_BATCH_ROWS], schema=schema,
+                                         preserve_index=False)
+
+
+def to_csv_schema(schema: pa.Schema) -> pa.Schema:
+    """
+    The function returns the schema with the columns CSV can't hold turned into text: list columns are joined
+    and dictionary columns are decoded.
+    """
+    for index, field in enumerate(schema):
+        if pa.types.is_list(field.type) or pa.types.is_dictionary(field.type):
+            schema = schema.set(index, pa.field(field.name, pa.string()))
+    return schema
+
+
+def to_csv_batch(batch: pa.RecordBatch, csv_schema: pa.Schema) -> pa.RecordBatch:
+    """
+    The function turns the list and dictionary columns of a record batch into the text columns of `csv_schema`.
+    """
+    columns = []
+    for column, field in zip(batch.columns, batch.schema):
+        if pa.types.is_list(field.type):
+            column = pc.binary_join(column.cast(pa.list_(pa.string())), CSV_LIST_SEPARATOR)
+        elif pa.types.is_dictionary(field.type):
+            column = column.cast(pa.string())
+        columns.append(column)
+    return pa.RecordBatch.from_arrays(columns, schema=csv_schema)
+
+
+def write_batches(batches: Iterable[pa.RecordBatch], schema: pa.Schema, export_format: str) -> pa.Buffer:
+    """
+    The function `write_batches` streams record batches through the writer of the export format into an Arrow
+    buffer. Each batch is written as soon as it is made, so the file is the only full copy of the data.
+
+    :param batches: The record batches of the table.
+    :param schema: The schema of the batches.
+    :param export_format: One of EXPORT_FORMATS.
+    :return: the Arrow buffer holding the exported file.
+    """
+    sink = pa.BufferOutputStream()
+    if export_format == 'Parquet':
+        writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    elif export_format == 'Arrow IPC':
+        writer = pa_ipc.new_file(sink, schema)
+    elif export_format == 'CSV':
+        writer = pa_csv.CSVWriter(sink, schema)
+    else:
+        raise ValueError(f"Unknown export format: {export_format}")
+
+    with writer:
+        for batch in batches:
+            writer.write_batch(batch)
+    return sink.getvalue()
+
+
+def export_dataframe(df: pd.DataFrame, export_format: str) -> pa.Buffer:
+    """
+    The function `export_dataframe` converts a dataframe to a file of the export format, converting and writing
+    it a slice at a time, so neither a full Arrow table nor a bytes copy of the file is ever made.
+
+    :param df: The dataframe to export, like the output of `filter_data`.
+    :param export_format: One of EXPORT_FORMATS.
+    :return: the Arrow buffer holding the exported file.
+    """
+    schema = to_arrow_schema(df)
+    batches = to_record_batches(df, schema)
+    if export_format == 'CSV':
+        schema = to_csv_schema(schema)
+        batches = (to_csv_batch(batch, schema) for batch in batches)
+    return write_batches(batches, schema, export_format)
+
+
+class BufferFile(io.RawIOBase):
+    """
+    A read-only binary file over an Arrow buffer. Streamlit takes downloads as bytes or as a binary file, and
+    reading this file makes the one bytes copy Streamlit keeps, straight from the buffer.
+    """
+
+    def __init__(self, buffer: pa.Buffer):
+        super().__init__()
+        self._view = memoryview(buffer)
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(base + offset, 0)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def readinto(self, target) -> int:
+        chunk = self._view[self._position:self._position + len(target)]
+        target[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def readall(self) -> bytes:
+        data = self._view[self._position:].tobytes()
+        self._position = len(self._view)
+        return data
+
+
+def series_rows(section: str, statistic: str, series: pd.Series) -> list[Tuple[str, str, str, float]]:
+    """
+    The function returns a row of the statistics table for every value of a series, labeled by its index.
+    """
+    return [(section, statistic, str(label), float(value)) for label, value in series.items()]
+
+
+def statistics_frame(section_results: Dict[str, tuple]) -> pd.DataFrame:
+    """
+    The function `statistics_frame` puts the statistics of every section of a view in one long table, with a
+    row per value: the section, the statistic, the label of the value (a driver, a route, an hour...) and the
+    value itself.
+
+    :param section_results: Maps each section name to its calculated statistics.
+    :return: a DataFrame with the STATISTICS_COLUMNS columns.
+    """
+    total_hitchhikers, avg_people_per_tremp, total_tremps = section_results[GENERAL_STATISTICS_SECTION]
+    rows = [(GENERAL_STATISTICS_SECTION, 'total_hitchhikers', '', float(total_hitchhikers)),
+            (GENERAL_STATISTICS_SECTION, 'avg_people_per_tremp', '', float(avg_people_per_tremp)),
+            (GENERAL_STATISTICS_SECTION, 'total_tremps', '', float(total_tremps))]
+
+    top_drivers, top_routes, top_hours = section_results[TOP_STATISTICS_SECTION]
+    rows += series_rows(TOP_STATISTICS_SECTION, 'top_drivers', top_drivers)
+    rows += series_rows(TOP_STATISTICS_SECTION, 'top_routes', top_routes)
+    rows += series_rows(TOP_STATISTICS_SECTION, 'top_hours', top_hours)
+
+    origin_totals, od_counts = section_results[ROUTES_SECTION]
+    rows += series_rows(ROUTES_SECTION, 'origin_totals', origin_totals)
+    route_counts = od_counts.stack()
+    route_counts.index = [f"{origin} to {destination}" for origin, destination in route_counts.index]
+    rows += series_rows(ROUTES_SECTION, 'route_counts', route_counts[route_counts > 0])
+
+    tremp_type_counts, gender_grouped = section_results[TREMP_AND_GENDER_SECTION]
+    rows += series_rows(TREMP_AND_GENDER_SECTION, 'tremp_type_counts', pd.Series(tremp_type_counts))
+    rows += [(TREMP_AND_GENDER_SECTION, 'gender_per_month', f"{row.date} {row.gender}", float(row.counts))
+             for row in gender_grouped.itertuples(index=False)]
+
+    seat_occupancy, = section_results[SEAT_OCCUPANCY_SECTION]
+    rows += [(SEAT_OCCUPANCY_SECTION, 'offered_seats', '', float(seat_occupancy.offered_seats)),
+             (SEAT_OCCUPANCY_SECTION, 'filled_seats', '', float(seat_occupancy.filled_seats))]
+    rows += series_rows(SEAT_OCCUPANCY_SECTION, 'utilization_by_route', seat_occupancy.by_route['utilization'])
+    rows += series_rows(SEAT_OCCUPANCY_SECTION, 'utilization_by_hour', seat_occupancy.by_hour['utilization'])
+    rows += series_rows(SEAT_OCCUPANCY_SECTION, 'utilization_by_month', seat_occupancy.by_month['utilization'])
+    rows += [(SEAT_OCCUPANCY_SECTION, 'unfilled_hotspots', f"{row.route} {row.hour:02d}:00", float(row.unfilled))
+             for row in seat_occupancy.hotspots.itertuples(index=False)]
+
+    return pd.DataFrame(rows, columns=STATISTICS_COLUMNS)
+
+
+def filtered_data_exporter(view_futures: Dict[str, Future], export_format: str) -> callable:
+    """
+    The function returns a callable that exports the filtered dataframe of a view. Streamlit calls it only when
+    the download button is clicked, on its own thread, so the file is never built unless it is downloaded.
+    """
+    def export() -> BufferFile:
+        df_filtered, = view_futures[FILTERED_DATA].result()
+        return BufferFile(export_dataframe(df_filtered, export_format))
+    return export
+
+
+def statistics_exporter(view_futures: Dict[str, Future], export_format: str) -> callable:
+    """
+    The function returns a callable that exports the statistics of all the sections of a view, waiting for
+    the sections that are still being calculated.
+    """
+    def export() -> BufferFile:
+        section_results = {section: view_futures[section].result() for section in SECTION_STATISTICS}
+        return BufferFile(export_dataframe(statistics_frame(section_results), export_format))
+    return export
@@ -0,0 +1,141 @@
+# /filter_cache.py
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable, Optional
+
+import pandas as pd
+import streamlit as st
+
+# Number of filter results kept in memory, can be changed with the TREMPBOSS_FILTER_CACHE_SIZE environment variable
+DEFAULT_FILTER_CACHE_SIZE = 64
+FILTER_CACHE_SIZE_ENV = 'TREMPBOSS_FILTER_CACHE_SIZE'
+
+# RAM ceiling of the filter results, apart from the datasets of the shared store, can be changed with the
+# TREMPBOSS_FILTER_CACHE_MAX_MB environment variable
+DEFAULT_FILTER_CACHE_MAX_MB = 256
+FILTER_CACHE_MAX_MB_ENV = 'TREMPBOSS_FILTER_CACHE_MAX_MB'
+
+
+def result_bytes(value: Any) -> int:
+    """
+    The function returns the memory of the dataframes and series in a filter result: a view made of futures, or
+    the tuples, lists and dictionaries of their results. Futures that aren't done yet count as nothing.
+    """
+    if isinstance(value, Future):
+        if not value.done() or value.cancelled() or value.exception() is not None:
+            return 0
+        return result_bytes(value.result())
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, dict):
+        return sum(result_bytes(item) for item in value.values())
+    if isinstance(value, (tuple, list)):
+        return sum(result_bytes(item) for item in value)
+    return 0
+
+
+class LRUCache:
+    """
+    A bounded, thread-safe mapping that drops the least recently used entries once it holds more than
+    `max_entries` entries, or more than `max_bytes` bytes as measured by `sizeof`. The most recently used entry is
+    kept even when it alone is over `max_bytes`.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: Optional[int] = None,
+                 sizeof: Callable[[Any], int] = lambda value: 0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: Hashable) -> bool:
+        # Checking for a key doesn't count as using it, so it doesn't change the eviction order
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Returns the value of the key and marks it as the most recently used, or None when it isn't cached.
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Stores the value as the most recently used entry, dropping the least recently used ones if needed.
+        """
+        size = self.sizeof(value)
+        with self._lock:
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def update_size(self, key: Hashable) -> None:
+        """
+        Measures the value of the key again, for values that grow after they are stored (like futures that
+        finished), and drops the least recently used entries if the cache is now over its ceiling.
+        """
+        with self._lock:
+            value = self._entries.get(key)
+        if value is None:
+            return
+        size = self.sizeof(value)
+        with self._lock:
+            # The key may have been dropped or given another value meanwhile
+            if self._entries.get(key) is value:
+                self._sizes[key] = size
+                self._evict()
+
+    def remove_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        """
+        Drops every entry whose key matches the predicate.
+        """
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+                del self._sizes[key]
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_entries or \
+                (self.max_bytes is not None and len(self._entries) > 1 and self.memory_bytes > self.max_bytes):
+            key, _ = self._entries.popitem(last=False)
+            del self._sizes[key]
+
+
+@st.cache_resource
+def get_filter_cache() -> LRUCache:
+    """
+    The function returns the filter results cache shared by all the sessions of the Streamlit server. The keys
+    start with the hash of the dataset, so sessions viewing the same file also share their filter results.
+    """
+    max_mb = float(os.environ.get(FILTER_CACHE_MAX_MB_ENV, DEFAULT_FILTER_CACHE_MAX_MB))
+    return LRUCache(int(os.environ.get(FILTER_CACHE_SIZE_ENV, DEFAULT_FILTER_CACHE_SIZE)), int(max_mb * 2 ** 20),
+                    result_bytes)
+
+
+def remove_dataset_results(dataset_hash: str) -> None:
+    """
+    The function drops the filter results of a dataset, when the shared store evicts it.
+    """
+    get_filter_cache().remove_where(lambda key: key[0] == dataset_hash)
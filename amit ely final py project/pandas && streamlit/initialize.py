@@ -1,14 +1,28 @@
 # /initialize.py
+import os
+
+import pandas as pd
 import streamlit as st
 
-from data_processing import (load_data, transform_data, calculate_total_statistics, calculate_top_drivers,
-                             calculate_top_routes, calculate_top_hours, calculate_participation_counts_by_tremp_type,
-                             group_by_gender_and_month)
-from data_visualization import (display_data)
-from sidebar import sidebar_upload, sidebar_filters, filter_data
+from background_statistics import (start_precomputation, get_view_futures, FILTERED_DATA,
+                                   GENERAL_STATISTICS_SECTION, TASK_TIMINGS)
+from data_visualization import (display_data, display_live_activity)
+from dataset_store import get_dataset_store, get_user_profiles, is_active_session, load_shared_dataset
+from event_stream import (EVENT_LOG_ENV, EVENT_REFRESH_SECONDS_ENV, DEFAULT_EVENT_REFRESH_SECONDS, get_event_stream,
+                          windows_from_environment)
+from memory_profile import memory_profiler_from_environment, profile_stage
+from sidebar import (sidebar_upload, sidebar_filters, sidebar_dataset_store_report, sidebar_event_log,
+                     sidebar_snapshot)
+from snapshot import SNAPSHOT_ENV, SnapshotError, load_snapshot_dataset
 
 import constants_joined_cols_names as const
 
+# Set once for the whole dashboard, before any table is loaded. The sessions get views that share their memory
+# with the datasets of the shared store, and the statistic tasks get views of the filtered dataframes. With
+# copy-on-write, a session or a task that writes to its view gets its own copy of the changed column, and the
+# shared tables stay untouched.
+pd.set_option('mode.copy_on_write', True)
+
 
 def init_statistic_bord():
     """
@@ -17,31 +31,66 @@ def init_statistic_bord():
     """
     st.set_page_config(page_title="TrempBoss DashBoard", page_icon=":car:", layout="wide")
     uploaded_file = sidebar_upload()
-    df_tremps, df_users, df_users_in_tremp = load_data(uploaded_file)
-
-    # This code block checks if the variables `df_tremps`, `df_users`, and `df_users_in_tremp` are not
-    # None. If all three variables are not None, it proceeds to perform data transformation,
-    # filtering, and calculations on the data. It then displays the data using the `display_data`
-    # function.
-    if df_tremps is not None and df_users is not None and df_users_in_tremp is not None:
-        df = transform_data(df_tremps, df_users, df_users_in_tremp)
-        tremp_type, from_route, to_route, creator, user_in_tremp, start_date, end_date = sidebar_filters(df)
-        df = filter_data(df, tremp_type, from_route, to_route, creator, user_in_tremp, start_date, end_date)
-
-        total_hitchhikers, avg_people_per_tremp, total_tremps = calculate_total_statistics(df, df_users_in_tremp)
-        top_drivers = calculate_top_drivers(df, df_users_in_tremp, df_users)
-        top_tracks = calculate_top_routes(df)
-        top_hours = calculate_top_hours(df)
-        tremp_type_counts = calculate_participation_counts_by_tremp_type(df, df_users_in_tremp)
-        gender_grouped = group_by_gender_and_month(df_users, df_users_in_tremp, df)
+    # With TREMPBOSS_MEMORY_PROFILE set, the memory of the run that loads a new file is traced stage by stage
+    profiler = memory_profiler_from_environment('streamlit', uploaded_file.name) if uploaded_file else None
+    # Sessions that upload the same file share one loaded and transformed copy of it
+    dataset_hash, dataset = load_shared_dataset(uploaded_file, profiler)
+    if profiler is not None and not profiler.stages:
+        # The file was already loaded, by an earlier run or another session
+        profiler = None
+
+    # Without an upload, the dashboard shows the snapshot it was started with, its default view is already
+    # calculated
+    snapshot_path = os.environ.get(SNAPSHOT_ENV, '')
+    snapshot_error = None
+    if not uploaded_file and snapshot_path:
+        try:
+            dataset_hash, dataset, snapshot = load_snapshot_dataset(snapshot_path)
+            sidebar_snapshot(snapshot.source_name, snapshot.created)
+        except (OSError, SnapshotError) as error:
+            snapshot_error = str(error)
+
+    store = get_dataset_store()
+    # The sessions whose browser was closed no longer count as viewing their dataset
+    store.remove_ended_sessions(is_active_session)
+    sidebar_dataset_store_report(store.report(), store.memory_bytes / 2 ** 20, store.max_bytes / 2 ** 20)
+
+    # The live activity of an event log is kept up to date incrementally, next to the dashboard of the file
+    event_log = sidebar_event_log(os.environ.get(EVENT_LOG_ENV, ''))
+    if event_log:
+        display_live_activity(get_event_stream(event_log, tuple(windows_from_environment())),
+                              float(os.environ.get(EVENT_REFRESH_SECONDS_ENV, DEFAULT_EVENT_REFRESH_SECONDS)))
+
+    # This code block checks if the file was loaded. If it was, it proceeds to perform filtering and
+    # calculations on the data. It then displays the data using the `display_data` function.
+    if dataset is not None:
+        df_tremps, df_users, df_users_in_tremp, df = dataset
+
+        # The filter results and their statistics are memoized, so a view that was already shown costs nothing
+        filters = sidebar_filters(df)
+        with profile_stage(profiler, 'statistics'):
+            view_futures = get_view_futures(dataset_hash, df, df_users, df_users_in_tremp, filters)
+            if profiler is not None:
+                # The statistics run in the background, the stage lasts until all of them are done
+                view_futures[TASK_TIMINGS].result()
+        if profiler is not None:
+            st.sidebar.caption(f"Memory report written to {profiler.write_report()}")
+
+        # Start calculating the statistics of the common filter presets while the user looks at the sidebar
+        start_precomputation(dataset_hash, df, df_users, df_users_in_tremp)
+        df, = view_futures[FILTERED_DATA].result()
+
+        # The general statistics are cheap, so they are ready right away and shown first
+        total_hitchhikers, avg_people_per_tremp, total_tremps = view_futures[GENERAL_STATISTICS_SECTION].result()
 
         # selecting specific columns from the DataFrame `df` and assigning the result back to `df`.
         df = df[[const.TREMP_ID_COLUMN, const.TREMP_TYPE_COLUMN, const.TREMP_DATE_COLUMN, const.TREMP_TIME_COLUMN,
                  const.SEATS_AMOUNT_COLUMN, const.FROM_ROUTE_COLUMN, const.TO_ROUTE_COLUMN,
                  const.USERS_IN_TREMP_COLUMN, const.CREATOR_COLUMN]]
 
-        display_data(df, total_hitchhikers,
-                     avg_people_per_tremp, total_tremps, top_drivers, top_tracks, top_hours, tremp_type_counts,
-                     gender_grouped)
-    else:
+        display_data(df, total_hitchhikers, avg_people_per_tremp, total_tremps, view_futures,
+                     get_user_profiles(dataset_hash, dataset))
+    elif snapshot_error:
+        st.error(f"The snapshot can't be read: {snapshot_error}")
+    elif not event_log:
         st.error("Please upload an Excel file.")
@@ -1,4 +1,12 @@
 # /main.py
+import os
+import sys
+
+# The statistics shared by both front ends are in the trempboss_analytics package, next to this folder
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.append(PROJECT_DIR)
+
 from initialize import init_statistic_bord
 
 
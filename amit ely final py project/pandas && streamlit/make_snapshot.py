@@ -0,0 +1,40 @@
+# /make_snapshot.py
+# Makes a snapshot of a workbook offline, for a dashboard that shows it right away:
+#     python make_snapshot.py <workbook.xlsx> <snapshot file>
+#     TREMPBOSS_SNAPSHOT=<snapshot file> streamlit run main.py
+import argparse
+import os
+import sys
+import time
+
+# The statistics shared by both front ends are in the trempboss_analytics package, next to this folder
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.append(PROJECT_DIR)
+
+from snapshot import SnapshotError, build_snapshot, write_snapshot
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load a TrempBoss workbook, calculate every statistic of the "
+                                                 "dashboard and save them all to a snapshot file.")
+    parser.add_argument('workbook', help="the TrempBoss workbook to read")
+    parser.add_argument('snapshot', help="the snapshot file to write")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    try:
+        snapshot = build_snapshot(args.workbook)
+    except SnapshotError as error:
+        print(error, file=sys.stderr)
+        return 1
+    write_snapshot(snapshot, args.snapshot)
+
+    print(f"Snapshot of {snapshot.source_name} written to {args.snapshot} "
+          f"({os.path.getsize(args.snapshot) / 2 ** 10:.1f} KB) in {time.perf_counter() - start_time:.2f}s, "
+          f"{snapshot.task_timings['Run (s)'].sum():.3f}s of statistics")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,7 +3,9 @@ from typing import Tuple
 import pandas as pd
 import datetime
 import streamlit as st
+import os
 import constants_joined_cols_names as const
+from text_match import MATCH_CONTAINS, MATCH_MODES, match_text_column
 
 DATE_COLUMN = const.DATE_COLUMN
 
@@ -19,14 +21,48 @@ def sidebar_upload():
     return uploaded_file
 
 
-def sidebar_filters(df: pd.DataFrame) -> Tuple[str, str, str, str, str, datetime.date, datetime.date]:
+def sidebar_event_log(default_event_log: str) -> str:
+    """
+    The function `sidebar_event_log` creates a sidebar input for the path of a JSONL event log, whose live
+    activity is shown above the dashboard of the uploaded file.
+    :return: the path of the event log, or an empty string.
+    """
+    st.sidebar.header("Live Activity:")
+    event_log = st.sidebar.text_input("Event Log (JSONL):", default_event_log)
+    if event_log and not os.path.exists(event_log):
+        st.sidebar.caption("Waiting for the event log to be created")
+    return event_log
+
+
+def sidebar_snapshot(source_name: str, created: float) -> None:
+    """
+    The function `sidebar_snapshot` shows in the sidebar the workbook of the snapshot the dashboard started
+    with, until a file is uploaded.
+    """
+    st.sidebar.header("Snapshot:")
+    st.sidebar.caption(f"{source_name}, calculated on {pd.Timestamp(created, unit='s').strftime('%Y-%m-%d %H:%M')}."
+                       f" Upload a file to replace it.")
+
+
+def sidebar_dataset_store_report(store_report: pd.DataFrame, store_memory_mb: float, store_max_mb: float) -> None:
+    """
+    The function shows in the sidebar the datasets kept in the shared store, with the memory of each one
+    and the number of sessions viewing it.
+    """
+    with st.sidebar.expander("Shared Datasets"):
+        st.caption(f"{store_memory_mb:.2f} MB used of {store_max_mb:.0f} MB")
+        st.dataframe(store_report, hide_index=True)
+
+
+def sidebar_filters(df: pd.DataFrame) -> Tuple[str, str, str, str, str, datetime.date, datetime.date, str]:
     """
     The `sidebar_filters` function generates an interactive sidebar with various filter options 
     on a Streamlit application for a given dataframe `df`.
 
     It provides filter options based on unique values of 'tremp_type', and custom input options
     for 'from_route', 'to_route', 'creator', and 'user_in_tremp'. It also provides date range selection
-    based on the minimum and maximum dates in the provided dataframe.
+    based on the minimum and maximum dates in the provided dataframe, and the way the route and creator
+    filters match the text.
     """
      
     st.sidebar.header("Please Filter Here:")
@@ -39,6 +75,7 @@ def sidebar_filters(df: pd.DataFrame) -> Tuple[str, str, str, str, str, datetime
     to_route = st.sidebar.text_input("To Route:", "")
     creator = st.sidebar.text_input("Creator:", "")
     user_in_tremp = st.sidebar.text_input("User in Tremp:", "")
+    match_mode = st.sidebar.radio("Match Route and Creator By:", options=MATCH_MODES, index=0, horizontal=True)
 
     # Date filter
     min_date = df[DATE_COLUMN].min().date()
@@ -47,15 +84,16 @@ def sidebar_filters(df: pd.DataFrame) -> Tuple[str, str, str, str, str, datetime
     start_date = st.sidebar.date_input('Start date', min_date)
     end_date = st.sidebar.date_input('End date', max_date)
 
-    return tremp_type, from_route, to_route, creator, user_in_tremp, start_date, end_date
+    return tremp_type, from_route, to_route, creator, user_in_tremp, start_date, end_date, match_mode
 
 
 def filter_data(df_filter, filter_tremp_type, filter_from_route, filter_to_route, filter_creator, filter_user_in_tremp,
-                start_date, end_date):
+                start_date, end_date, match_mode=MATCH_CONTAINS):
     """
     The function `filter_data` filters a DataFrame based on various criteria such as tremp type, routes,
     creator, users in tremp, and date range.
 
+    :param match_mode: How the route and creator filters match, one of `text_match.MATCH_MODES`.
     :return: the filtered dataframe, df_filter.
     """
 
@@ -65,18 +103,18 @@ def filter_data(df_filter, filter_tremp_type, filter_from_route, filter_to_route
     if filter_tremp_type != 'All':
         df_filter = df_filter[df_filter.tremp_type == filter_tremp_type]
 
-    # where the 'from_route' column contains the 'filter_from_route' value.
-    # The 'str.contains' method is used to check if 'filter_from_route' is in 'from_route' for each row.
-    # The 'case=False' argument ensures the match is case-insensitive.
-    # The 'na=False' argument ignores 'from_route' values that are NaN.
+    # where the 'from_route' column matches the 'filter_from_route' value.
+    # The route and creator columns are categorical, so the text is matched (case-insensitive) against
+    # their distinct values once, and the rows are selected through the category codes.
+    # Rows where 'from_route' is NaN never match.
     if filter_from_route:
-        df_filter = df_filter[df_filter.from_route.str.contains(filter_from_route, case=False, na=False)]
+        df_filter = df_filter[match_text_column(df_filter.from_route, filter_from_route, match_mode)]
 
     if filter_to_route:
-        df_filter = df_filter[df_filter.to_route.str.contains(filter_to_route, case=False, na=False)]
+        df_filter = df_filter[match_text_column(df_filter.to_route, filter_to_route, match_mode)]
 
     if filter_creator:
-        df_filter = df_filter[df_filter.creator.str.contains(filter_creator, case=False, na=False)]
+        df_filter = df_filter[match_text_column(df_filter.creator, filter_creator, match_mode)]
 
     # The filtering process checks if the value of 'filter_user_in_tremp' exists
     # in the 'users_in_tremp' column for each row in the dataframe.
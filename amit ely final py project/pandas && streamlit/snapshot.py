@@ -0,0 +1,121 @@
+# /snapshot.py
+"""
+Snapshots of the dashboard: a workbook loaded, transformed and with every statistic of its default view already
+calculated, saved to one compressed file by make_snapshot.py. The dashboard started with a snapshot shows the
+default view and the user profiles right away, and calculates the statistics only of the filters that differ from
+the defaults.
+
+A snapshot is a pickle, so it is only read from the path the server was started with (the TREMPBOSS_SNAPSHOT
+environment variable) and never from a path or a file given in the browser.
+"""
+import os
+import time
+from typing import Any, Dict, NamedTuple, Optional
+
+import pandas as pd
+import streamlit as st
+
+from background_statistics import (FilterKey, default_filters, filter_view, calculate_statistics,
+                                   statistic_function_names, completed_view, seed_view)
+from data_processing import load_data, transform_data, calculate_user_profiles
+from dataset_store import DatasetTables, get_dataset_store, get_session_id, get_user_profiles, hash_file_content
+import trempboss_analytics as analytics
+
+SNAPSHOT_ENV = 'TREMPBOSS_SNAPSHOT'
+
+# Changes whenever the content of a snapshot changes, older snapshots have to be made again
+SNAPSHOT_VERSION = 3
+SNAPSHOT_COMPRESSION = 'gzip'
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class Snapshot(NamedTuple):
+    source_name: str
+    # The content hash of the workbook, the same key an upload of the workbook gets in the dataset store
+    dataset_hash: str
+    tables: DatasetTables
+    filters: FilterKey
+    # The default view, None when it is the same as the transformed table
+    filtered: Optional[pd.DataFrame]
+    statistics: Dict[str, Any]
+    statistic_functions: Dict[str, str]
+    task_timings: pd.DataFrame
+    user_profiles: analytics.UserProfiles
+    created: float
+
+    def default_view(self) -> pd.DataFrame:
+        return self.tables.transformed if self.filtered is None else self.filtered
+
+
+def build_snapshot(workbook_path: str) -> Snapshot:
+    """
+    The function `build_snapshot` runs the whole pipeline of the dashboard on a workbook: it loads and transforms
+    the tables, calculates every statistic of the view of the default filters and builds the user profiles.
+    """
+    with open(workbook_path, 'rb') as workbook_file:
+        dataset_hash = hash_file_content(workbook_file.read())
+    df_tremps, df_users, df_users_in_tremp = load_data(workbook_path)
+    if df_tremps is None or df_users is None or df_users_in_tremp is None:
+        raise SnapshotError(f"{workbook_path} is missing a sheet of the TrempBoss report")
+    df = transform_data(df_tremps, df_users, df_users_in_tremp)
+
+    filters = default_filters(df)
+    df_filtered, = filter_view(df, filters)
+    statistics, task_timings = calculate_statistics(df_filtered, df_users, df_users_in_tremp)
+    return Snapshot(os.path.basename(workbook_path), dataset_hash,
+                    DatasetTables(df_tremps, df_users, df_users_in_tremp, df), filters,
+                    None if df_filtered.equals(df) else df_filtered, statistics, statistic_function_names(),
+                    task_timings, calculate_user_profiles(df_tremps, df_users, df_users_in_tremp), time.time())
+
+
+def write_snapshot(snapshot: Snapshot, snapshot_path: str) -> None:
+    """
+    The function writes a snapshot as plain values (a dict of tables and statistics), through a temporary file so
+    a running dashboard never reads half a snapshot.
+    """
+    content = {'version': SNAPSHOT_VERSION, **snapshot._asdict(), 'tables': tuple(snapshot.tables)}
+    temporary_path = f'{snapshot_path}.tmp'
+    pd.to_pickle(content, temporary_path, compression=SNAPSHOT_COMPRESSION)
+    os.replace(temporary_path, snapshot_path)
+
+
+def read_snapshot(snapshot_path: str) -> Snapshot:
+    """
+    The function reads a snapshot written by `write_snapshot`.
+    """
+    content = pd.read_pickle(snapshot_path, compression=SNAPSHOT_COMPRESSION)
+    if not isinstance(content, dict) or content.get('version') != SNAPSHOT_VERSION:
+        raise SnapshotError(f"{snapshot_path} was made by another version of the dashboard, make it again with "
+                            f"make_snapshot.py")
+    content.pop('version')
+    return Snapshot(**dict(content, tables=DatasetTables(*content['tables'])))
+
+
+# Only the latest snapshot is kept, its tables are shared with the dataset store
+@st.cache_resource(max_entries=1)
+def get_snapshot(snapshot_path: str, modified_time: float) -> Snapshot:
+    """
+    The function reads a snapshot once for all the sessions, and again only when the file changes.
+    """
+    return read_snapshot(snapshot_path)
+
+
+def load_snapshot_dataset(snapshot_path: str) -> tuple[str, DatasetTables, Snapshot]:
+    """
+    The function `load_snapshot_dataset` returns views of the tables of a snapshot like `load_shared_dataset`,
+    and puts its default view in the filter results cache and its user profiles in the profiles cache. The
+    statistics of the default view are used only when they were calculated by the same functions the dashboard
+    uses now.
+
+    :return: tuple containing the content hash of the workbook of the snapshot, its tables and the snapshot.
+    """
+    snapshot = get_snapshot(snapshot_path, os.path.getmtime(snapshot_path))
+    tables = get_dataset_store().get_or_build(snapshot.dataset_hash, get_session_id(), lambda: snapshot.tables)
+    if snapshot.statistic_functions == statistic_function_names():
+        seed_view(snapshot.dataset_hash, snapshot.filters,
+                  completed_view(snapshot.default_view(), snapshot.statistics, snapshot.task_timings))
+    get_user_profiles(snapshot.dataset_hash, tables, snapshot.user_profiles)
+    return snapshot.dataset_hash, tables, snapshot
@@ -0,0 +1,177 @@
+# /task_scheduler.py
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Iterable, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+# Runs the statistics in worker processes instead of threads, for example TREMPBOSS_STATISTICS_EXECUTOR=process.
+# Processes use all the cores for large data, but every task pickles its dataframes to the worker and back.
+EXECUTOR_ENV = 'TREMPBOSS_STATISTICS_EXECUTOR'
+THREAD_EXECUTOR = 'thread'
+PROCESS_EXECUTOR = 'process'
+
+# Number of workers, by default one per core and at least 2 so a slow statistic doesn't hold up all the others
+WORKERS_ENV = 'TREMPBOSS_STATISTICS_WORKERS'
+
+TIMING_COLUMNS = ['Task', 'Run (s)', 'Wait (s)', 'Worker']
+
+
+class TaskTiming(NamedTuple):
+    task: str
+    run_seconds: float
+    # Time from the submission until a worker started the task
+    wait_seconds: float
+    worker: str
+
+
+class TaskFuture(Future):
+    """
+    The future of a scheduled task, its `timing` is set once the task finished successfully.
+    """
+
+    def __init__(self, name: str):
+        super().__init__()
+        self.name = name
+        self.timing: Optional[TaskTiming] = None
+
+
+def run_timed(name: str, function: Callable, args: tuple, submitted_at: float) -> Tuple[Any, TaskTiming]:
+    """
+    The function runs a task in a worker and measures it, the time is taken inside the worker so it doesn't
+    include moving the arguments and the result to and from a worker process.
+    """
+    started_at = time.time()
+    start = time.perf_counter()
+    result = function(*args)
+    run_seconds = time.perf_counter() - start
+
+    worker = threading.current_thread().name if threading.current_thread() is not threading.main_thread() \
+        else f'process {os.getpid()}'
+    return result, TaskTiming(name, run_seconds, max(0.0, started_at - submitted_at), worker)
+
+
+def read_only_argument(argument: Any) -> Any:
+    """
+    The function gives a task its own view of a dataframe argument. With copy-on-write the view shares the
+    data of the original, and changing it copies only the changed columns, so the original is never changed.
+    """
+    if isinstance(argument, (pd.DataFrame, pd.Series)):
+        return argument.copy(deep=False)
+    return argument
+
+
+def chain_future(source: Future, target: Future) -> None:
+    """
+    The function sets the result (or the exception) of the source future on the target future once it is done.
+    """
+    def copy_outcome(done_future: Future) -> None:
+        if done_future.exception() is not None:
+            target.set_exception(done_future.exception())
+        else:
+            target.set_result(done_future.result())
+    source.add_done_callback(copy_outcome)
+
+
+def part_future(source: Future, position: int) -> Future:
+    """
+    The function returns a future of one part of the tuple result of the source future, set once it is done.
+    """
+    part = Future()
+
+    def pick_part(done_future: Future) -> None:
+        if done_future.exception() is not None:
+            part.set_exception(done_future.exception())
+        else:
+            part.set_result(done_future.result()[position])
+    source.add_done_callback(pick_part)
+    return part
+
+
+def gather_futures(futures: Iterable[Future]) -> Future:
+    """
+    The function returns a future of the results of all the futures as a tuple, in their order. It fails with
+    the first exception of any of them.
+    """
+    futures = list(futures)
+    gathered = Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def on_done(_: Future) -> None:
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        failed = [future for future in futures if future.exception() is not None]
+        if failed:
+            gathered.set_exception(failed[0].exception())
+        else:
+            gathered.set_result(tuple(future.result() for future in futures))
+
+    if not futures:
+        gathered.set_result(())
+    for future in futures:
+        future.add_done_callback(on_done)
+    return gathered
+
+
+def timing_frame(task_futures: Iterable[TaskFuture]) -> pd.DataFrame:
+    """
+    The function returns the timing of the finished tasks as a DataFrame with the TIMING_COLUMNS columns.
+    """
+    rows = [[future.timing.task, round(future.timing.run_seconds, 4), round(future.timing.wait_seconds, 4),
+             future.timing.worker] for future in task_futures if future.timing is not None]
+    return pd.DataFrame(rows, columns=TIMING_COLUMNS)
+
+
+class TaskScheduler:
+    """
+    Runs independent tasks concurrently on a pool of threads or processes and times every one of them. Each
+    task gets its own read-only view of its dataframe arguments, so tasks never see each other's changes.
+    """
+
+    def __init__(self, max_workers: int, use_processes: bool = False):
+        self.max_workers = max_workers
+        self.use_processes = use_processes
+        if use_processes:
+            # Forking the threads of the Streamlit server isn't safe, the workers start as fresh interpreters
+            self._executor: Executor = ProcessPoolExecutor(max_workers=max_workers,
+                                                           mp_context=multiprocessing.get_context('spawn'))
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='trempboss-statistics')
+
+    @classmethod
+    def from_environment(cls) -> 'TaskScheduler':
+        """
+        Creates the scheduler configured by the TREMPBOSS_STATISTICS_EXECUTOR and TREMPBOSS_STATISTICS_WORKERS
+        environment variables.
+        """
+        max_workers = int(os.environ.get(WORKERS_ENV, max(2, os.cpu_count() or 1)))
+        use_processes = os.environ.get(EXECUTOR_ENV, THREAD_EXECUTOR) == PROCESS_EXECUTOR
+        return cls(max_workers, use_processes)
+
+    def submit(self, name: str, function: Callable, *args) -> TaskFuture:
+        """
+        Submits a task to the pool. The function and its arguments must be picklable when the pool uses
+        processes, so it should be a module level function.
+
+        :return: the future of the task result.
+        """
+        task_future = TaskFuture(name)
+        # Worker processes get a pickled copy of the arguments anyway
+        if not self.use_processes:
+            args = tuple(read_only_argument(argument) for argument in args)
+        executor_future = self._executor.submit(run_timed, name, function, args, time.time())
+
+        def finish(done_future: Future) -> None:
+            if done_future.exception() is not None:
+                task_future.set_exception(done_future.exception())
+            else:
+                result, task_future.timing = done_future.result()
+                task_future.set_result(result)
+        executor_future.add_done_callback(finish)
+        return task_future
@@ -0,0 +1,134 @@
+# /text_match.py
+from collections import defaultdict
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from filter_cache import LRUCache
+
+# Ways to match the text filters of the sidebar
+MATCH_CONTAINS = 'Contains'
+MATCH_PREFIX = 'Starts with'
+MATCH_SIMILAR = 'Similar'
+MATCH_MODES = [MATCH_CONTAINS, MATCH_PREFIX, MATCH_SIMILAR]
+
+# Minimal trigram similarity for the 'Similar' mode, 0.3 is the common default of trigram matching (pg_trgm)
+SIMILARITY_THRESHOLD = 0.3
+
+# The indexes of recently filtered columns, a dataset has a few text columns and there are only a few datasets
+_index_cache = LRUCache(32)
+
+
+def get_trigrams(text: str) -> set[str]:
+    """
+    The function returns the trigrams of a lower-cased text, padded with two spaces at the start and one at the
+    end so that short words and word starts have trigrams too.
+    """
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    An index from every trigram to the ids of the dictionary values that contain it, used to find the matching
+    values of a text filter without comparing the query to every value.
+    """
+
+    def __init__(self, categories: pd.Index):
+        self.categories = categories
+        self._values = [str(value).lower() for value in categories]
+
+        postings = defaultdict(list)
+        trigram_counts = []
+        for value_id, value in enumerate(self._values):
+            value_trigrams = get_trigrams(value)
+            trigram_counts.append(len(value_trigrams))
+            for trigram in value_trigrams:
+                postings[trigram].append(value_id)
+
+        self._postings = {trigram: np.array(ids, dtype=np.int32) for trigram, ids in postings.items()}
+        self._trigram_counts = np.array(trigram_counts, dtype=np.int32)
+
+    def _candidates(self, trigrams: Iterable[str]) -> np.ndarray:
+        # Values that contain every one of the trigrams, starting from the rarest one
+        candidates = None
+        for trigram in sorted(trigrams, key=lambda t: len(self._postings.get(t, ()))):
+            ids = self._postings.get(trigram)
+            if ids is None:
+                return np.array([], dtype=np.int32)
+            candidates = ids if candidates is None else np.intersect1d(candidates, ids, assume_unique=True)
+        return np.arange(len(self._values), dtype=np.int32) if candidates is None else candidates
+
+    def _verified(self, candidates: np.ndarray, predicate) -> np.ndarray:
+        matches = np.zeros(len(self._values), dtype=bool)
+        matches[[value_id for value_id in candidates if predicate(self._values[value_id])]] = True
+        return matches
+
+    def contains(self, query: str) -> np.ndarray:
+        """
+        Returns a boolean array that marks the dictionary values containing the query.
+        """
+        inner_trigrams = {query[i:i + 3] for i in range(len(query) - 2)}
+        return self._verified(self._candidates(inner_trigrams), lambda value: query in value)
+
+    def prefix(self, query: str) -> np.ndarray:
+        """
+        Returns a boolean array that marks the dictionary values starting with the query.
+        """
+        start_trigrams = {trigram for trigram in get_trigrams(query) if not trigram.endswith(' ')}
+        return self._verified(self._candidates(start_trigrams), lambda value: value.startswith(query))
+
+    def similar(self, query: str, threshold: float = SIMILARITY_THRESHOLD) -> np.ndarray:
+        """
+        Returns a boolean array that marks the dictionary values containing the query or whose trigram
+        similarity (shared trigrams divided by all the trigrams of both) to the query reaches the threshold.
+        """
+        query_trigrams = get_trigrams(query)
+        shared_ids = [self._postings[trigram] for trigram in query_trigrams if trigram in self._postings]
+        if not shared_ids:
+            return self.contains(query)
+
+        shared_counts = np.bincount(np.concatenate(shared_ids), minlength=len(self._values))
+        similarity = shared_counts / (len(query_trigrams) + self._trigram_counts - shared_counts)
+        return (similarity >= threshold) | self.contains(query)
+
+    def match(self, query: str, match_mode: str = MATCH_CONTAINS) -> np.ndarray:
+        """
+        Returns a boolean array that marks the dictionary values matching the query, ignoring case.
+        """
+        query = query.lower()
+        if match_mode == MATCH_PREFIX:
+            return self.prefix(query)
+        if match_mode == MATCH_SIMILAR:
+            return self.similar(query)
+        return self.contains(query)
+
+
+def get_trigram_index(categories: pd.Index) -> TrigramIndex:
+    """
+    The function returns the trigram index of a categorical column dictionary. Slices of a categorical column
+    share its categories object, so the index is built once per column and reused for every filter.
+    """
+    index = _index_cache.get(id(categories))
+    # The index keeps a reference to its categories, so a matching id always belongs to the same object
+    if index is None or index.categories is not categories:
+        index = TrigramIndex(categories)
+        _index_cache.put(id(categories), index)
+    return index
+
+
+def match_text_column(column: pd.Series, query: str, match_mode: str = MATCH_CONTAINS) -> np.ndarray:
+    """
+    The function `match_text_column` finds the rows of a categorical column matching a text filter. The query
+    is matched once against the unique values of the column and the result is mapped to the rows through
+    their category codes, missing values never match.
+
+    :param column: A column with a 'category' dtype.
+    :param query: The text typed in the filter.
+    :param match_mode: One of MATCH_MODES.
+    :return: a boolean array with one value per row.
+    """
+    value_matches = get_trigram_index(column.cat.categories).match(query, match_mode)
+    # Missing values have the code -1, which picks the False appended at the end
+    return np.append(value_matches, False)[column.cat.codes.to_numpy()]
@@ -0,0 +1,508 @@
+# /performance_suite.py
+"""
+End-to-end performance checks of both front ends, compared with performance_baseline.json.
+
+Workbooks of fixed sizes are generated from a fixed seed, and both front ends are driven on each of them the way a
+user drives them: the Streamlit dashboard (`init_statistic_bord`) through Streamlit's app-testing harness, with the
+workbook uploaded and the sidebar filters changed one by one, and the matplotlib menu (`display_menu`) with
+scripted answers and the non-GUI Agg backend. Every interaction (a rerun of the dashboard, an option of the menu)
+gets its latency and its peak memory: the most memory allocated at once while it ran, above what was allocated
+before it, as traced by tracemalloc (so the memory of native readers and of worker processes isn't counted).
+
+Every run is a fresh interpreter, started in an empty folder with none of the TREMPBOSS_* settings, so no cache of
+an earlier run is reused. The latency is the median of the --repeat runs, the memory is measured in one more run,
+since tracing slows everything down. A measurement fails when it is over its baseline by more than the tolerance
+of the baseline file: a ratio of the baseline plus an absolute margin, for the noise of the short interactions.
+Latencies depend on the machine, so the baseline file keeps the results of every machine (Python version,
+architecture and CPU count) apart, and a run is checked against the results of its own machine. Run with --update
+to measure them: the measured sizes and front ends replace those of this machine only. On a machine without
+results of its own, the run is checked against the results of another machine and fails on slower latencies as
+well, unless --latency-warnings is given to report them as warnings. Nothing is downloaded and no browser or
+display is needed.
+
+Usage: python performance_suite.py [--sizes small,medium] [--repeat N] [--output results.json] [--update]
+                                   [--latency-warnings]
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(PROJECT_DIR, 'performance_baseline.json')
+MATPLOTLIB_DIR = os.path.join(PROJECT_DIR, 'pandas && matplotlib')
+STREAMLIT_DIR = os.path.join(PROJECT_DIR, 'pandas && streamlit')
+
+FRONT_ENDS = ['streamlit', 'matplotlib']
+
+# Tolerance of the checks when the baseline file has none
+DEFAULT_TOLERANCE = {
+    'latency_ratio': 0.5,
+    'latency_seconds': 0.1,
+    'memory_ratio': 0.25,
+    'memory_mib': 1.0,
+}
+
+# Longest rerun of the dashboard before the app-testing harness gives up on it
+STREAMLIT_RUN_TIMEOUT_SECONDS = 300
+
+WORKBOOK_SEED = 2024
+
+
+class WorkbookSize(NamedTuple):
+    tremps: int
+    users: int
+
+
+WORKBOOK_SIZES = {
+    'small': WorkbookSize(tremps=300, users=100),
+    'medium': WorkbookSize(tremps=3000, users=600),
+    'large': WorkbookSize(tremps=15000, users=2500),
+}
+
+PLACES = ['Jerusalem', 'Tel Aviv', 'Haifa', 'Ashkelon', 'Ashdod', 'Rehovot', 'Beersheba', 'Bat Yam', 'Netanya',
+          'Holon', 'Ariel', 'Eilat', 'Herzliya', 'Kfar Saba', "Ra'anana", 'Beitar Illit', 'Petah Tikva', 'Hadera',
+          "Modi'in-Maccabim-Re'ut", 'Rishon LeZion', 'Nazareth', 'Tiberias', 'Safed', 'Afula', 'Dimona']
+FIRST_NAMES = ['Roni', 'Hila', 'Neta', 'Yossi', 'Dana', 'Omer', 'Noa', 'Itai', 'Maya', 'Avi', 'Shira', 'Eitan',
+               'Tamar', 'Yael', 'Guy', 'Lior', 'Michal', 'Amit', 'Eli', 'Tal']
+LAST_NAMES = ['Levi', 'Cohen', 'Mizrahi', 'Peretz', 'Biton', 'Dahan', 'Avraham', 'Friedman', 'Azoulay', 'Katz',
+              'Malka', 'Shapiro', 'Ohana', 'Golan', 'Segal']
+FIRST_DATE = datetime.date(2022, 1, 1)
+DATE_RANGE_DAYS = 730
+
+# The interactions of the dashboard, in order. Every one changes one widget of the last run and reruns the script.
+STREAMLIT_INTERACTIONS = [
+    'upload',
+    'tremp_type',
+    'from_route',
+    'start_date',
+    'reset_filters',
+    'user_profile',
+]
+
+# The interactions of the menu, in order, with the answers each one gives to the prompts
+MATPLOTLIB_INTERACTIONS = [
+    ('load_tables', ['1']),
+    ('tremps_by_year_month', ['4', '1']),
+    ('top_5_drivers', ['5']),
+    ('top_5_routes', ['6', '1']),
+    ('routes_heatmap', ['6', '2']),
+    ('top_5_hours', ['7']),
+    ('tremp_types', ['8']),
+    ('gender_percentages', ['9', '1']),
+    ('user_profile', ['12', '1']),
+    ('seat_occupancy_by_month', ['13', '1']),
+    ('export_charts', ['11']),
+]
+MENU_EXIT_ANSWER = '0'
+
+
+def generate_workbook(workbook_path: str, size: WorkbookSize, seed: int = WORKBOOK_SEED) -> None:
+    """
+    The function writes a TrempBoss workbook with the sheets of a real report and `size` tremps and users. The
+    same size and seed always give the same workbook. Every tremp has a creator, the drivers are joined by up to
+    one more user than their seats and the hitchhikers by at most one driver.
+    """
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    tremp_ids = np.arange(1, size.tremps + 1)
+    tremp_types = np.where(rng.random(size.tremps) < 0.6, 'driver', 'hitchhiker')
+    days = rng.integers(0, DATE_RANGE_DAYS, size.tremps)
+    minutes = rng.integers(5 * 60, 23 * 60, size.tremps)
+    seats = rng.integers(1, 7, size.tremps)
+    origins = rng.integers(0, len(PLACES), size.tremps)
+    # A destination is never the origin
+    destinations = (origins + rng.integers(1, len(PLACES), size.tremps)) % len(PLACES)
+    df_tremps = pd.DataFrame({
+        'tremp_id': tremp_ids,
+        'tremp_type': tremp_types,
+        'date': pd.to_datetime(FIRST_DATE) + pd.to_timedelta(days, unit='D'),
+        'tremp_time': [datetime.time(minute // 60, minute % 60) for minute in minutes],
+        'seats_amount': seats,
+        'from_route': np.array(PLACES)[origins],
+        'to_route': np.array(PLACES)[destinations],
+    })
+
+    user_ids = np.arange(1, size.users + 1)
+    first_names = np.array(FIRST_NAMES)[rng.integers(0, len(FIRST_NAMES), size.users)]
+    last_names = np.array(LAST_NAMES)[rng.integers(0, len(LAST_NAMES), size.users)]
+    df_users = pd.DataFrame({
+        'user_id': user_ids,
+        'email': [f'{first}{last}{user_id}@email.com'
+                  for first, last, user_id in zip(first_names, last_names, user_ids)],
+        'full_name': [f'{first} {last}' for first, last in zip(first_names, last_names)],
+        'gender': np.where(rng.random(size.users) < 0.5, 'male', 'female'),
+    })
+
+    participations = []
+    for tremp_id, tremp_type, seats_amount in zip(tremp_ids, tremp_types, seats):
+        most_joiners = seats_amount + 1 if tremp_type == 'driver' else 1
+        joiners = int(rng.integers(0, most_joiners + 1))
+        creator, *joined = rng.choice(user_ids, size=min(joiners + 1, size.users), replace=False)
+        participations.append((creator, tremp_id, True))
+        participations += [(user_id, tremp_id, False) for user_id in joined]
+    df_users_in_tremp = pd.DataFrame(participations, columns=['user_id', 'tremp_id', 'is_tremp_creator'])
+
+    with pd.ExcelWriter(workbook_path, engine='openpyxl') as writer:
+        df_tremps.to_excel(writer, sheet_name='tremps', index=False)
+        df_users.to_excel(writer, sheet_name='users', index=False)
+        df_users_in_tremp.to_excel(writer, sheet_name='users_in_tremps', index=False)
+
+
+class InteractionRecorder:
+    """
+    Records the latency and, when tracing, the peak memory of the interactions of a run, one at a time.
+    """
+
+    def __init__(self, trace_memory: bool):
+        self.trace_memory = trace_memory
+        self.results: Dict[str, dict] = {}
+        self._name: Optional[str] = None
+        self._start = 0.0
+        self._memory_before = 0
+
+    def start(self, name: str) -> None:
+        self.finish()
+        # Garbage of the earlier interactions isn't counted in this one
+        gc.collect()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            self._memory_before, _ = tracemalloc.get_traced_memory()
+        self._name = name
+        self._start = time.perf_counter()
+
+    def finish(self) -> None:
+        if self._name is None:
+            return
+        seconds = time.perf_counter() - self._start
+        result = {'seconds': round(seconds, 4)}
+        if self.trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            result['peak_mib'] = round((peak - self._memory_before) / 2 ** 20, 3)
+        self.results[self._name] = result
+        self._name = None
+
+
+def streamlit_app(workbook_path: str) -> None:
+    # The dashboard with the workbook uploaded, the app-testing harness has no file uploads
+    import io
+    import os
+
+    import initialize
+
+    class UploadedWorkbook(io.BytesIO):
+        pass
+
+    def upload_workbook():
+        with open(workbook_path, 'rb') as workbook_file:
+            uploaded_file = UploadedWorkbook(workbook_file.read())
+        uploaded_file.name = os.path.basename(workbook_path)
+        return uploaded_file
+
+    initialize.sidebar_upload = upload_workbook
+    initialize.init_statistic_bord()
+
+
+def widget(widgets, label: str):
+    """
+    The function returns the widget with the label from a list of widgets of the app-testing harness.
+    """
+    return next(item for item in widgets if item.label == label)
+
+
+def streamlit_interactions(app) -> Dict[str, Callable[[], None]]:
+    """
+    The function returns the widget changes of the STREAMLIT_INTERACTIONS, each one is read from the last run of
+    the app, so they must run in order.
+    """
+    default_dates = {}
+
+    def tremp_type():
+        # Nothing was filtered yet, the dates are the defaults: the first and last date of the workbook
+        default_dates['start'] = widget(app.sidebar.date_input, 'Start date').value
+        default_dates['end'] = widget(app.sidebar.date_input, 'End date').value
+        widget(app.sidebar.selectbox, 'Select Tremp Type:').set_value('driver')
+
+    def start_date():
+        middle_date = default_dates['start'] + (default_dates['end'] - default_dates['start']) / 2
+        widget(app.sidebar.date_input, 'Start date').set_value(middle_date)
+
+    def reset_filters():
+        widget(app.sidebar.selectbox, 'Select Tremp Type:').set_value('All')
+        widget(app.sidebar.text_input, 'From Route:').set_value('')
+        widget(app.sidebar.date_input, 'Start date').set_value(default_dates['start'])
+
+    def user_profile():
+        # The generated user ids are consecutive, the next user after the one shown
+        user_selectbox = widget(app.selectbox, 'Choose a User:')
+        user_selectbox.set_value(user_selectbox.value + 1)
+
+    return {
+        'upload': lambda: None,
+        'tremp_type': tremp_type,
+        'from_route': lambda: widget(app.sidebar.text_input, 'From Route:').set_value('a'),
+        'start_date': start_date,
+        'reset_filters': reset_filters,
+        'user_profile': user_profile,
+    }
+
+
+def run_streamlit_scenario(workbook_path: str, recorder: InteractionRecorder) -> None:
+    """
+    The function runs the STREAMLIT_INTERACTIONS on the dashboard. A run that raised fails the scenario.
+    """
+    sys.path.insert(0, STREAMLIT_DIR)
+    sys.path.append(PROJECT_DIR)
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_function(streamlit_app, args=(workbook_path,),
+                                default_timeout=STREAMLIT_RUN_TIMEOUT_SECONDS)
+    interactions = streamlit_interactions(app)
+    for name in STREAMLIT_INTERACTIONS:
+        interactions[name]()
+        recorder.start(name)
+        app.run()
+        recorder.finish()
+        if app.exception:
+            raise RuntimeError(f"The dashboard failed in '{name}': {app.exception[0].message}")
+
+
+def run_matplotlib_scenario(workbook_path: str, recorder: InteractionRecorder) -> None:
+    """
+    The function answers the prompts of the menu with the MATPLOTLIB_INTERACTIONS and exits it. An interaction
+    lasts from its first answer until the menu asks for the next option.
+    """
+    import builtins
+
+    os.environ['MPLBACKEND'] = 'Agg'
+    sys.path.insert(0, MATPLOTLIB_DIR)
+    sys.path.append(PROJECT_DIR)
+    from initialize import LazyTables
+    from menu import display_menu
+
+    interactions = MATPLOTLIB_INTERACTIONS + [(None, [MENU_EXIT_ANSWER])]
+    answers = [(name if position == 0 else None, answer)
+               for name, interaction_answers in interactions
+               for position, answer in enumerate(interaction_answers)]
+    remaining_answers = iter(answers)
+
+    def scripted_input(prompt: str = '') -> str:
+        try:
+            starts_interaction, answer = next(remaining_answers)
+        except StopIteration:
+            raise RuntimeError(f"The menu asked for more answers than scripted: {prompt!r}") from None
+        if starts_interaction is not None:
+            recorder.start(starts_interaction)
+        elif answer == MENU_EXIT_ANSWER:
+            recorder.finish()
+        return answer
+
+    builtins.input = scripted_input
+    display_menu(LazyTables(workbook_path))
+    recorder.finish()
+    if next(remaining_answers, None) is not None:
+        raise RuntimeError("The menu exited before all the scripted answers were given")
+
+
+def run_scenario(front_end: str, workbook_path: str, trace_memory: bool) -> Dict[str, dict]:
+    """
+    The function runs the interactions of a front end on a workbook in this interpreter.
+    """
+    if trace_memory:
+        tracemalloc.start()
+    recorder = InteractionRecorder(trace_memory)
+    # The menu and the dashboard print a lot, only the results are of interest
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            if front_end == 'streamlit':
+                run_streamlit_scenario(workbook_path, recorder)
+            else:
+                run_matplotlib_scenario(workbook_path, recorder)
+        finally:
+            sys.stdout = stdout
+    return recorder.results
+
+
+def measure_scenario(front_end: str, workbook_path: str, trace_memory: bool) -> Dict[str, dict]:
+    """
+    The function runs the interactions of a front end on a workbook in a fresh interpreter, in an empty folder
+    (for the files the menu writes and the chart cache) and without the TREMPBOSS_* settings of this one.
+    """
+    env = {name: value for name, value in os.environ.items() if not name.startswith('TREMPBOSS_')}
+    env.update(MPLBACKEND='Agg', STREAMLIT_BROWSER_GATHER_USAGE_STATS='false')
+    with tempfile.TemporaryDirectory() as run_dir:
+        results_path = os.path.join(run_dir, 'results.json')
+        command = [sys.executable, os.path.abspath(__file__), '--scenario', front_end, workbook_path,
+                   '--scenario-output', results_path]
+        if trace_memory:
+            command.append('--trace-memory')
+        process = subprocess.run(command, cwd=run_dir, env=env, text=True, stdout=subprocess.PIPE,
+                                 stderr=subprocess.STDOUT)
+        if process.returncode != 0:
+            raise RuntimeError(f"The {front_end} scenario failed on {os.path.basename(workbook_path)}:\n"
+                               f"{process.stdout[-3000:]}")
+        with open(results_path) as results_file:
+            return json.load(results_file)
+
+
+def measure_front_end(front_end: str, workbook_path: str, repeat: int) -> Dict[str, dict]:
+    """
+    The function returns the median latency of `repeat` runs and the peak memory of one traced run of every
+    interaction of a front end on a workbook.
+    """
+    runs = [measure_scenario(front_end, workbook_path, trace_memory=False) for _ in range(repeat)]
+    traced_run = measure_scenario(front_end, workbook_path, trace_memory=True)
+    return {name: {'seconds': round(statistics.median(run[name]['seconds'] for run in runs), 4),
+                   'peak_mib': traced_run[name]['peak_mib']}
+            for name in runs[0]}
+
+
+def over_tolerance(measured: float, baseline: float, ratio: float, margin: float) -> bool:
+    return measured > baseline * (1 + ratio) + margin
+
+
+def compare_with_baseline(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: dict,
+                          check_latency: bool = True) -> Tuple[List[str], List[str]]:
+    """
+    The function compares the measurements with the baseline, results and baseline are nested by front end,
+    workbook size and interaction. Interactions without a baseline aren't checked.
+
+    :param check_latency: Whether a slower latency is a regression, or only a warning (--latency-warnings with
+        the baseline of another machine).
+    :return: tuple containing the regressions, empty when every checked measurement is within the tolerance, and
+        the warnings.
+    """
+    regressions = []
+    warnings = []
+    for front_end, sizes in results.items():
+        for size, interactions in sizes.items():
+            for name, measured in interactions.items():
+                expected = baseline.get(front_end, {}).get(size, {}).get(name)
+                if expected is None:
+                    continue
+                label = f"{front_end}/{size}/{name}"
+                if over_tolerance(measured['seconds'], expected['seconds'], tolerance['latency_ratio'],
+                                  tolerance['latency_seconds']):
+                    (regressions if check_latency else warnings).append(
+                        f"{label}: took {measured['seconds']:.3f}s, baseline is {expected['seconds']:.3f}s")
+                if over_tolerance(measured['peak_mib'], expected['peak_mib'], tolerance['memory_ratio'],
+                                  tolerance['memory_mib']):
+                    regressions.append(f"{label}: peak memory {measured['peak_mib']:.2f} MiB, "
+                                       f"baseline is {expected['peak_mib']:.2f} MiB")
+    return regressions, warnings
+
+
+def machine_description() -> dict:
+    return {'python': platform.python_version(), 'machine': platform.machine(), 'cpus': os.cpu_count()}
+
+
+def machine_key(machine: dict) -> str:
+    """
+    The function returns the key of the baseline of a machine in the baseline file, like
+    "x86_64 1 cpus python 3.11.7".
+    """
+    return f"{machine['machine']} {machine['cpus']} cpus python {machine['python']}"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure the latency and peak memory of the interactions of both "
+                                                 "front ends and check them against the baseline.")
+    parser.add_argument('--sizes', default=','.join(WORKBOOK_SIZES),
+                        help=f"comma separated workbook sizes, of {', '.join(WORKBOOK_SIZES)}")
+    parser.add_argument('--front-ends', default=','.join(FRONT_ENDS), help="comma separated front ends")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per scenario, the median latency is kept")
+    parser.add_argument('--output', help="write the measurements to this JSON file")
+    parser.add_argument('--update', action='store_true',
+                        help="write the measurements as the new baseline of this machine")
+    parser.add_argument('--latency-warnings', action='store_true',
+                        help="report slower latencies as warnings when this machine has no baseline of its own")
+    # A single scenario, run by the suite in a fresh interpreter
+    parser.add_argument('--scenario', nargs=2, metavar=('FRONT_END', 'WORKBOOK'), help=argparse.SUPPRESS)
+    parser.add_argument('--scenario-output', help=argparse.SUPPRESS)
+    parser.add_argument('--trace-memory', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        front_end, workbook_path = args.scenario
+        results = run_scenario(front_end, workbook_path, args.trace_memory)
+        with open(args.scenario_output, 'w') as output_file:
+            json.dump(results, output_file)
+        return 0
+
+    sizes = args.sizes.split(',')
+    front_ends = args.front_ends.split(',')
+    unknown = (set(sizes) - set(WORKBOOK_SIZES)) | (set(front_ends) - set(FRONT_ENDS))
+    if unknown:
+        parser.error(f"unknown sizes or front ends: {', '.join(sorted(unknown))}")
+
+    # The baselines of every machine, by the key of the machine
+    baseline_content = {'tolerance': DEFAULT_TOLERANCE, 'baselines': {}}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE) as baseline_file:
+            baseline_content = json.load(baseline_file)
+    tolerance = dict(DEFAULT_TOLERANCE, **baseline_content.get('tolerance', {}))
+    baselines = baseline_content.get('baselines', {})
+    this_machine = machine_key(machine_description())
+    same_machine = this_machine in baselines
+    # A machine without a baseline of its own is checked against the first one of the file
+    baseline_machine = this_machine if this_machine in baselines else next(iter(sorted(baselines)), this_machine)
+    baseline_results = baselines.get(baseline_machine, {}).get('results', {})
+    if not same_machine and baselines and not args.update:
+        print(f"There is no baseline of this machine ({this_machine}), checking against the baseline of "
+              f"{baseline_machine}. Slower latencies are "
+              f"{'only warnings' if args.latency_warnings else 'regressions'}, run with --update for a baseline "
+              f"of this machine")
+
+    results: Dict[str, Dict[str, dict]] = {front_end: {} for front_end in front_ends}
+    with tempfile.TemporaryDirectory() as workbook_dir:
+        for size in sizes:
+            workbook_path = os.path.join(workbook_dir, f'{size} TrempBoss report.xlsx')
+            generate_workbook(workbook_path, WORKBOOK_SIZES[size])
+            for front_end in front_ends:
+                results[front_end][size] = measure_front_end(front_end, workbook_path, args.repeat)
+                print(f"{front_end} on the {size} workbook ({WORKBOOK_SIZES[size].tremps} tremps):")
+                expected = baseline_results.get(front_end, {}).get(size, {})
+                for name, measured in results[front_end][size].items():
+                    baseline_text = (f"  (baseline {expected[name]['seconds']:.3f}s, "
+                                     f"{expected[name]['peak_mib']:.2f} MiB)" if name in expected else '')
+                    print(f"    {name:<24} {measured['seconds']:8.3f}s {measured['peak_mib']:9.2f} MiB"
+                          f"{baseline_text}")
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.update:
+        # Only the baseline of this machine is changed, and only for the measured sizes and front ends
+        machine_results = baselines.get(this_machine, {}).get('results', {})
+        for front_end, front_end_results in results.items():
+            machine_results.setdefault(front_end, {}).update(front_end_results)
+        baselines[this_machine] = {'machine': machine_description(), 'results': machine_results}
+        with open(BASELINE_FILE, 'w') as baseline_file:
+            json.dump({'tolerance': tolerance, 'baselines': baselines}, baseline_file, indent=2)
+        print(f"Baseline of {this_machine} written to {BASELINE_FILE}")
+        return 0
+
+    regressions, warnings = compare_with_baseline(results, baseline_results, tolerance,
+                                                  check_latency=same_machine or not args.latency_warnings)
+    for warning in warnings:
+        print(f"WARNING - {warning}")
+    for regression in regressions:
+        print(f"REGRESSION - {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+# /startup_benchmark.py
+"""
+Measures the startup of both front ends and checks it against startup_budget.json.
+
+For every entry point it records the import time of every module loaded at startup (from `python -X importtime`)
+and the time from starting a fresh interpreter to the first output: the printed menu for the matplotlib
+front end, the first page (the upload prompt) for the Streamlit front end. The Streamlit script is run in
+Streamlit's bare mode, the app-testing harness itself imports plotly and would hide a regression.
+The run fails when the cold start is over its budget or when a module that should be loaded lazily was
+imported at startup.
+
+Usage: python startup_benchmark.py [--repeat N] [--output results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, NamedTuple
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+BUDGET_FILE = os.path.join(PROJECT_DIR, 'startup_budget.json')
+
+# Number of slowest imports printed per entry point, the output file has all of them
+SLOWEST_IMPORTS_SHOWN = 10
+
+# Runs the Streamlit script once in bare mode and prints a line when the first page is rendered
+STREAMLIT_FIRST_PAGE_CODE = """
+import runpy
+runpy.run_path('main.py', run_name='__main__')
+print('first page rendered', flush=True)
+"""
+
+ENTRY_POINTS = {
+    'matplotlib': {
+        'directory': os.path.join(PROJECT_DIR, 'pandas && matplotlib'),
+        'command': ['main.py'],
+        # Exit right away from the menu
+        'stdin': '0\n',
+    },
+    'streamlit': {
+        'directory': os.path.join(PROJECT_DIR, 'pandas && streamlit'),
+        'command': ['-c', STREAMLIT_FIRST_PAGE_CODE],
+        'stdin': '',
+    },
+}
+
+
+class ImportRecord(NamedTuple):
+    module: str
+    depth: int
+    self_us: int
+    cumulative_us: int
+
+
+class StartupRun(NamedTuple):
+    first_output_seconds: float
+    imports: List[ImportRecord]
+
+
+def parse_import_times(stderr: str) -> List[ImportRecord]:
+    """
+    The function parses the `-X importtime` report, every nesting level of an import is indented by two spaces.
+    """
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        module = name.strip()
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        records.append(ImportRecord(module, depth, int(self_us), int(cumulative_us)))
+    return records
+
+
+def run_cold_start(entry_point: dict) -> StartupRun:
+    """
+    The function starts the entry point in a fresh interpreter and measures the time until its first line of
+    output, the imports of the whole run are recorded too.
+    """
+    env = dict(os.environ, MPLBACKEND='Agg', PYTHONUNBUFFERED='1')
+    # The import report goes to a temporary file, a full stderr pipe would block the process before its output
+    with tempfile.TemporaryFile(mode='w+') as stderr_file:
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, '-X', 'importtime', *entry_point['command']],
+                                   cwd=entry_point['directory'], env=env, text=True,
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr_file)
+        process.stdin.write(entry_point['stdin'])
+        process.stdin.close()
+
+        first_line = process.stdout.readline()
+        first_output_seconds = time.perf_counter() - start
+        process.stdout.read()
+        return_code = process.wait()
+        stderr_file.seek(0)
+        stderr = stderr_file.read()
+
+    if return_code != 0 or not first_line:
+        raise RuntimeError(f"Entry point failed to start:\n{stderr[-2000:]}")
+
+    return StartupRun(first_output_seconds, parse_import_times(stderr))
+
+
+def import_times(imports: List[ImportRecord]) -> Dict[str, float]:
+    """
+    The function returns the cumulative import time in milliseconds of every imported module, the time of a
+    module includes the modules it imported.
+    """
+    return {record.module: record.cumulative_us / 1000 for record in imports}
+
+
+def check_budget(name: str, first_output_seconds: float, imported_modules: set, budget: dict) -> List[str]:
+    """
+    The function compares a startup measurement with the budget of its entry point.
+
+    :return: a list of the budget violations, empty when the startup is within the budget.
+    """
+    violations = []
+    if first_output_seconds > budget['cold_start_seconds']:
+        violations.append(f"{name}: cold start took {first_output_seconds:.2f}s, "
+                          f"budget is {budget['cold_start_seconds']:.2f}s")
+    for module in budget.get('lazy_modules', []):
+        if module in imported_modules:
+            violations.append(f"{name}: '{module}' is imported at startup but should be loaded lazily")
+    return violations
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure and check the startup time of both front ends.")
+    parser.add_argument('--repeat', type=int, default=3, help="cold starts per entry point, the median is kept")
+    parser.add_argument('--output', help="write the measurements to this JSON file")
+    args = parser.parse_args()
+
+    with open(BUDGET_FILE) as budget_file:
+        budgets = json.load(budget_file)
+
+    results = {}
+    violations = []
+    for name, entry_point in ENTRY_POINTS.items():
+        runs = [run_cold_start(entry_point) for _ in range(args.repeat)]
+        first_output_seconds = statistics.median(run.first_output_seconds for run in runs)
+        imported_modules = {record.module for record in runs[-1].imports}
+        module_times = import_times(runs[-1].imports)
+
+        results[name] = {'first_output_seconds': first_output_seconds, 'import_ms': module_times}
+        violations += check_budget(name, first_output_seconds, imported_modules, budgets[name])
+
+        print(f"{name}: first output after {first_output_seconds:.3f}s (median of {args.repeat})")
+        for module, import_ms in sorted(module_times.items(), key=lambda item: -item[1])[:SLOWEST_IMPORTS_SHOWN]:
+            print(f"    {import_ms:9.1f} ms  {module}")
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    for violation in violations:
+        print(f"OVER BUDGET - {violation}")
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
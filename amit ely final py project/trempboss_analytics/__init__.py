@@ -0,0 +1,27 @@
+# /trempboss_analytics/__init__.py
+"""
+The statistics of TrempBoss shared by the matplotlib menu and the Streamlit dashboard. Every statistic is
+calculated with vectorized (numpy / pandas) operations over the loaded sheets, and each front end only formats
+the results for its own charts. golden_outputs.py checks that the results stay the same. Approximate top lists
+in bounded memory are in `heavy_hitters`, for data too large for exact counts, and `map_reduce` calculates the
+exact statistics chunk by chunk in a pool of worker processes, reading the chunks of a workbook with
+`workbook_chunks` without loading its sheets. `profiles` holds the activity profile of every
+user, and `occupancy` the seats offered and filled in the driver tremps.
+"""
+from trempboss_analytics.metrics import (HALF_HOUR_MINUTE, calculate_participation_totals,
+                                         format_average_people_per_tremp, round_hours, count_hours, rank_top_hours,
+                                         calculate_top_hours, calculate_driver_ride_counts, calculate_top_drivers,
+                                         calculate_participation_by_tremp_type, order_tremp_types,
+                                         calculate_tremp_type_percentages, count_participations_by_month_and_gender)
+from trempboss_analytics.routes import HEATMAP_MAX_PLACES, RouteMatrix, build_route_matrix
+from trempboss_analytics.chunks import DEFAULT_CHUNK_ROWS, participation_chunks, row_chunks
+from trempboss_analytics.heavy_hitters import (HeavyHitters, SpaceSaving, CountMinSketch, sketch_driver_rides,
+                                               sketch_routes)
+from trempboss_analytics.profiles import (ACTIVITY_COLUMNS, PROFILE_COLUMNS, PROFILE_LABELS, NO_HOUR, UserProfiles,
+                                          build_user_profiles, format_user_profile)
+from trempboss_analytics.occupancy import (OCCUPANCY_COLUMNS, HOTSPOT_COLUMNS, SeatOccupancy, count_filled_seats,
+                                           calculate_seat_occupancy)
+from trempboss_analytics.partials import PartialAggregates
+from trempboss_analytics.map_reduce import (OUT_OF_CORE_ENV, use_out_of_core, table_chunks, reduce_chunks,
+                                            map_reduce_aggregates)
+from trempboss_analytics.workbook_chunks import read_users_sheet, workbook_chunks, out_of_core_aggregates
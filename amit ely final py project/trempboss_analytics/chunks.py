@@ -0,0 +1,48 @@
+# /trempboss_analytics/chunks.py
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from trempboss_analytics.columns import TREMP_ID_COLUMN
+
+# Rows of a chunk of the participations (or of the tremps) when a statistic is calculated chunk by chunk
+DEFAULT_CHUNK_ROWS = 100_000
+
+
+def tremp_range_bounds(tremp_ids: np.ndarray, chunk_rows: int) -> np.ndarray:
+    """
+    The function splits sorted tremp ids into ranges of about `chunk_rows` rows that never split a tremp: every
+    cut is moved back to the first row of the tremp it falls in.
+
+    :return: the row positions where the ranges start, followed by the number of rows.
+    """
+    cuts = np.arange(chunk_rows, len(tremp_ids), chunk_rows)
+    cuts = np.searchsorted(tremp_ids, tremp_ids[cuts], side='left') if len(cuts) else cuts
+    # A tremp longer than a chunk moves two cuts to the same row
+    return np.unique(np.concatenate(([0], cuts, [len(tremp_ids)])))
+
+
+def participation_chunks(df_users_in_tremp: pd.DataFrame,
+                         chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    The function `participation_chunks` yields the participations in chunks of consecutive tremp id ranges.
+    All the participations of a tremp are in the same chunk, so a statistic that looks at the other users of a
+    tremp gets the same result on a chunk as on the whole table.
+
+    :param df_users_in_tremp: A DataFrame of the users in every tremp with the tremp_id column.
+    :param chunk_rows: The number of rows of a chunk, a chunk is longer when its last tremp would be split.
+    """
+    order = np.argsort(df_users_in_tremp[TREMP_ID_COLUMN].to_numpy(), kind='stable')
+    tremp_ids = df_users_in_tremp[TREMP_ID_COLUMN].to_numpy()[order]
+    bounds = tremp_range_bounds(tremp_ids, chunk_rows)
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        yield df_users_in_tremp.iloc[order[start:end]]
+
+
+def row_chunks(df: pd.DataFrame, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    The function yields the rows of a DataFrame in chunks of `chunk_rows` rows, in their order.
+    """
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
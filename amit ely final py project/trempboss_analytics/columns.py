@@ -0,0 +1,27 @@
+# /trempboss_analytics/columns.py
+
+# col names in tremps / users_in_tremps
+TREMP_ID_COLUMN = 'tremp_id'
+
+# col names in tremps
+TREMP_TYPE_COLUMN = 'tremp_type'
+SEATS_AMOUNT_COLUMN = 'seats_amount'
+TREMP_TIME_COLUMN = 'tremp_time'
+FROM_ROUTE_COLUMN = 'from_route'
+TO_ROUTE_COLUMN = 'to_route'
+DATE_COLUMN = 'date'
+# The seats of a tremp taken by the users who joined it, see occupancy.count_filled_seats
+FILLED_SEATS_COLUMN = 'filled_seats'
+
+# col names in users / users_in_tremps
+USER_ID_COLUMN = 'user_id'
+IS_TREMP_CREATOR_COLUMN = 'is_tremp_creator'
+
+# col names in users
+GENDER_COLUMN = 'gender'
+FULL_NAME_COLUMN = 'full_name'
+
+# col tremp_type data
+DRIVER_TREMP_TYPE = 'driver'
+HITCHHIKER_TREMP_TYPE = 'hitchhiker'
+TREMP_TYPES = [DRIVER_TREMP_TYPE, HITCHHIKER_TREMP_TYPE]
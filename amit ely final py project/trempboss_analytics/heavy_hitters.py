@@ -0,0 +1,231 @@
+# /trempboss_analytics/heavy_hitters.py
+"""
+Approximate top lists in bounded memory, for key spaces (drivers, routes) that grow without bound.
+
+A Space-Saving summary keeps at most `capacity` counters, and for every counted item an upper bound of its count
+and how much of it may be error. A Count-Min sketch, a fixed table of counters, gives a second upper bound of
+any item. Both are mergeable: summaries of chunks, of files or of worker processes are merged into the summary of
+all of them, with the same guarantees.
+"""
+import math
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from trempboss_analytics.chunks import DEFAULT_CHUNK_ROWS, participation_chunks, row_chunks
+from trempboss_analytics.columns import FROM_ROUTE_COLUMN, TO_ROUTE_COLUMN
+from trempboss_analytics.metrics import calculate_driver_ride_counts
+
+# Counters of a Space-Saving summary, items ranked below them are only bounded by `missing_bound`
+DEFAULT_COUNTERS = 256
+# Count-Min error: with probability 1 - delta, an estimate is at most epsilon * (total count) over the true count
+DEFAULT_EPSILON = 0.001
+DEFAULT_DELTA = 0.01
+
+# The hash functions of every Count-Min row, fixed so sketches built in different processes can be merged
+SKETCH_SEED = 20240101
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+TOP_COLUMNS = ['count', 'lower', 'upper']
+
+
+def rank_counts(counts: pd.Series, errors: pd.Series) -> pd.Index:
+    """
+    The function returns the items ordered by their count, the highest first. Ties are ordered by the smaller
+    error and then by the item, so the order doesn't depend on the order of the chunks.
+    """
+    ranking = pd.DataFrame({'count': counts, 'error': errors}).sort_index()
+    return ranking.sort_values(['count', 'error'], ascending=[False, True], kind='stable').index
+
+
+class SpaceSaving:
+    """
+    A Space-Saving summary: the true count of a counted item is between `counts - errors` and `counts`, and the
+    true count of an item that isn't counted is at most `missing_bound`.
+    """
+
+    def __init__(self, capacity: int, counts: Optional[pd.Series] = None, errors: Optional[pd.Series] = None,
+                 missing_bound: int = 0, total: int = 0):
+        self.capacity = capacity
+        self.counts = counts if counts is not None else pd.Series(dtype=np.int64)
+        self.errors = errors if errors is not None else pd.Series(dtype=np.int64)
+        self.missing_bound = missing_bound
+        self.total = total
+
+    @classmethod
+    def truncated(cls, capacity: int, counts: pd.Series, errors: pd.Series, missing_bound: int,
+                  total: int) -> 'SpaceSaving':
+        """
+        Keeps the `capacity` items with the highest counts. The items left out had at most the highest count
+        left out, which becomes part of the bound of the items that aren't counted.
+        """
+        ranked = rank_counts(counts, errors)
+        if len(ranked) > capacity:
+            missing_bound = max(missing_bound, int(counts[ranked[capacity]]))
+            ranked = ranked[:capacity]
+        return cls(capacity, counts[ranked], errors[ranked], missing_bound, total)
+
+    @classmethod
+    def from_counts(cls, counts: pd.Series, capacity: int = DEFAULT_COUNTERS) -> 'SpaceSaving':
+        """
+        Builds the summary of exact counts, like the counts of one chunk.
+        """
+        counts = counts[counts > 0].astype(np.int64)
+        return cls.truncated(capacity, counts, pd.Series(0, index=counts.index, dtype=np.int64), 0,
+                             int(counts.sum()))
+
+    def merge(self, other: 'SpaceSaving') -> 'SpaceSaving':
+        """
+        Returns the summary of the items of both summaries. An item that only one of them counts may have up to
+        the `missing_bound` of the other, which is added to both its count and its error.
+        """
+        items = self.counts.index.union(other.counts.index)
+        counts = (self.counts.reindex(items, fill_value=self.missing_bound) +
+                  other.counts.reindex(items, fill_value=other.missing_bound))
+        errors = (self.errors.reindex(items, fill_value=self.missing_bound) +
+                  other.errors.reindex(items, fill_value=other.missing_bound))
+        return SpaceSaving.truncated(max(self.capacity, other.capacity), counts, errors,
+                                     self.missing_bound + other.missing_bound, self.total + other.total)
+
+
+class CountMinSketch:
+    """
+    A Count-Min sketch: `depth` rows of `width` counters, every item adds its count to one counter of each row.
+    The smallest of its counters is never below the true count of an item.
+    """
+
+    def __init__(self, width: int, depth: int, table: Optional[np.ndarray] = None, total: int = 0):
+        self.width = width
+        self.depth = depth
+        self.table = table if table is not None else np.zeros((depth, width), dtype=np.int64)
+        self.total = total
+        self.seeds = np.random.default_rng(SKETCH_SEED).integers(1, 2 ** 63, size=depth, dtype=np.uint64)
+
+    @classmethod
+    def with_error(cls, epsilon: float = DEFAULT_EPSILON, delta: float = DEFAULT_DELTA) -> 'CountMinSketch':
+        """
+        Creates a sketch whose estimates are, with probability 1 - delta, at most epsilon * total over the truth.
+        """
+        return cls(math.ceil(math.e / epsilon), math.ceil(math.log(1 / delta)))
+
+    @property
+    def error_bound(self) -> int:
+        """
+        The most an estimate is over the true count, with probability 1 - delta.
+        """
+        return math.ceil(math.e / self.width * self.total)
+
+    def columns(self, items: pd.Index) -> np.ndarray:
+        """
+        Returns the counter of every item in every row, as a depth x items array.
+        """
+        hashes = pd.util.hash_array(items.to_numpy())
+        mixed = (hashes[np.newaxis, :] ^ self.seeds[:, np.newaxis]) * HASH_MULTIPLIER
+        mixed ^= mixed >> np.uint64(31)
+        return (mixed % np.uint64(self.width)).astype(np.int64)
+
+    def add(self, counts: pd.Series) -> None:
+        """
+        Adds the counts of a Series indexed by the items.
+        """
+        columns = self.columns(counts.index)
+        values = counts.to_numpy(dtype=np.int64)
+        for row in range(self.depth):
+            np.add.at(self.table[row], columns[row], values)
+        self.total += int(values.sum())
+
+    def estimate(self, items: pd.Index) -> np.ndarray:
+        """
+        Returns an upper bound of the count of every item.
+        """
+        if len(items) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return self.table[np.arange(self.depth)[:, np.newaxis], self.columns(items)].min(axis=0)
+
+    def merge(self, other: 'CountMinSketch') -> 'CountMinSketch':
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError("Only Count-Min sketches of the same width and depth can be merged")
+        return CountMinSketch(self.width, self.depth, self.table + other.table, self.total + other.total)
+
+
+class HeavyHitters:
+    """
+    The items with the highest counts of a stream of counts, in a fixed amount of memory. Every reported count
+    comes with the range the true count is guaranteed to be in.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_COUNTERS, epsilon: float = DEFAULT_EPSILON,
+                 delta: float = DEFAULT_DELTA):
+        self.space_saving = SpaceSaving(capacity)
+        self.count_min = CountMinSketch.with_error(epsilon, delta)
+
+    @property
+    def total(self) -> int:
+        return self.space_saving.total
+
+    def update(self, counts: pd.Series) -> None:
+        """
+        Adds exact counts, like the counts of one chunk, indexed by the items.
+        """
+        counts = counts[counts > 0]
+        self.space_saving = self.space_saving.merge(SpaceSaving.from_counts(counts, self.space_saving.capacity))
+        self.count_min.add(counts)
+
+    def merge(self, other: 'HeavyHitters') -> 'HeavyHitters':
+        """
+        Returns the heavy hitters of the counts of both.
+        """
+        merged = HeavyHitters.__new__(HeavyHitters)
+        merged.space_saving = self.space_saving.merge(other.space_saving)
+        merged.count_min = self.count_min.merge(other.count_min)
+        return merged
+
+    def top(self, top_count: int = 5) -> pd.DataFrame:
+        """
+        Returns the items with the highest counts, the highest first, with the TOP_COLUMNS columns: the reported
+        count and the lowest and highest possible true count. The count is the upper bound, exact when both
+        bounds are the same.
+        """
+        space_saving = self.space_saving
+        upper = np.minimum(space_saving.counts.to_numpy(), self.count_min.estimate(space_saving.counts.index))
+        lower = (space_saving.counts - space_saving.errors).clip(lower=0).to_numpy()
+        bounds = pd.DataFrame({'count': upper, 'lower': lower, 'upper': upper}, index=space_saving.counts.index)
+        ranked = rank_counts(bounds['upper'], bounds['upper'] - bounds['lower'])
+        return bounds.loc[ranked[:top_count]]
+
+
+def sketch_driver_rides(df_tremps: pd.DataFrame, df_users_in_tremp: pd.DataFrame, rides_given_only: bool = False,
+                        chunk_rows: int = DEFAULT_CHUNK_ROWS, capacity: int = DEFAULT_COUNTERS) -> HeavyHitters:
+    """
+    The function `sketch_driver_rides` counts the rides of the drivers (see `calculate_driver_ride_counts`) chunk
+    by chunk of the participations into heavy hitters, so only one chunk of counts is in memory at a time.
+
+    :return: the heavy hitters of the rides, by the user id of the driver.
+    """
+    heavy_hitters = HeavyHitters(capacity)
+    for chunk in participation_chunks(df_users_in_tremp, chunk_rows):
+        heavy_hitters.update(calculate_driver_ride_counts(df_tremps, chunk, rides_given_only))
+    return heavy_hitters
+
+
+def route_counts(df_tremps: pd.DataFrame) -> pd.Series:
+    """
+    The function counts the tremps of every route of a DataFrame of tremps, labeled "<from> to <to>". Only the
+    routes that appear get a label.
+    """
+    counts = df_tremps.groupby([FROM_ROUTE_COLUMN, TO_ROUTE_COLUMN], observed=True, sort=False).size()
+    return pd.Series(counts.to_numpy(), index=[f"{origin} to {destination}" for origin, destination in counts.index])
+
+
+def sketch_routes(df_tremps: pd.DataFrame, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                  capacity: int = DEFAULT_COUNTERS) -> HeavyHitters:
+    """
+    The function `sketch_routes` counts the tremps of every route chunk by chunk of the tremps into heavy hitters.
+
+    :return: the heavy hitters of the routes, labeled "<from> to <to>".
+    """
+    heavy_hitters = HeavyHitters(capacity)
+    for chunk in row_chunks(df_tremps, chunk_rows):
+        heavy_hitters.update(route_counts(chunk))
+    return heavy_hitters
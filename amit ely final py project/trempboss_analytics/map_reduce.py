@@ -0,0 +1,134 @@
+# /trempboss_analytics/map_reduce.py
+"""
+Out-of-core execution of the statistics: the participations are split into chunks of tremp id ranges, the partial
+aggregates of every chunk are calculated in a pool of worker processes, and the partials are merged as they
+arrive. The results are exactly the results of the in-memory statistics.
+
+Only a few chunks are sent to the workers at a time, so a reader that yields the chunks of a file that doesn't fit
+in memory can feed `reduce_chunks` directly, like `workbook_chunks.workbook_chunks`. `table_chunks` splits tables
+that are already in memory. The front ends use this mode when TREMPBOSS_OUT_OF_CORE is set.
+"""
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from trempboss_analytics.chunks import DEFAULT_CHUNK_ROWS, tremp_range_bounds
+from trempboss_analytics.columns import TREMP_ID_COLUMN, USER_ID_COLUMN, GENDER_COLUMN
+from trempboss_analytics.metrics import HALF_HOUR_MINUTE
+from trempboss_analytics.partials import PartialAggregates
+
+# Calculates the totals, hours, drivers and month/gender statistics chunk by chunk in worker processes, for example
+# TREMPBOSS_OUT_OF_CORE=1
+OUT_OF_CORE_ENV = 'TREMPBOSS_OUT_OF_CORE'
+
+# Chunks sent to the pool for every worker, enough to keep the workers busy while the partials are merged
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+
+# A chunk: its tremps, the row of each of them in the whole tremps table and the participations in them
+TableChunk = Tuple[pd.DataFrame, np.ndarray, pd.DataFrame]
+
+# The users table of a worker process, sent once when the worker starts instead of with every chunk
+_worker_users: Optional[pd.DataFrame] = None
+
+
+def use_out_of_core() -> bool:
+    """
+    The function returns whether the front ends calculate their statistics chunk by chunk, see OUT_OF_CORE_ENV.
+    """
+    return os.environ.get(OUT_OF_CORE_ENV, '').lower() in ('1', 'true', 'yes')
+
+
+def table_chunks(df_tremps: pd.DataFrame, df_users_in_tremp: pd.DataFrame,
+                 chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[TableChunk]:
+    """
+    The function `table_chunks` splits the tremps and their participations into chunks of consecutive tremp id
+    ranges, of about `chunk_rows` participations each. A tremp and all of its participations are always in the
+    same chunk.
+    """
+    participation_order = np.argsort(df_users_in_tremp[TREMP_ID_COLUMN].to_numpy(), kind='stable')
+    participation_ids = df_users_in_tremp[TREMP_ID_COLUMN].to_numpy()[participation_order]
+    bounds = tremp_range_bounds(participation_ids, chunk_rows)
+    # The first tremp id of every range but the first one
+    range_starts = participation_ids[bounds[1:-1]]
+
+    tremp_chunks = np.searchsorted(range_starts, df_tremps[TREMP_ID_COLUMN].to_numpy(), side='right')
+    tremp_order = np.argsort(tremp_chunks, kind='stable')
+    tremp_bounds = np.searchsorted(tremp_chunks[tremp_order], np.arange(len(range_starts) + 2))
+
+    for chunk in range(len(range_starts) + 1):
+        tremp_rows = tremp_order[tremp_bounds[chunk]:tremp_bounds[chunk + 1]]
+        participation_rows = participation_order[bounds[chunk]:bounds[chunk + 1]] if chunk + 1 < len(bounds) \
+            else participation_order[:0]
+        yield df_tremps.iloc[tremp_rows], tremp_rows, df_users_in_tremp.iloc[participation_rows]
+
+
+def set_worker_users(df_users: pd.DataFrame) -> None:
+    global _worker_users
+    _worker_users = df_users
+
+
+def aggregate_chunk(chunk: TableChunk, round_up_from_minute: int, rides_given_only: bool) -> PartialAggregates:
+    """
+    The function calculates the partial aggregates of a chunk in a worker process.
+    """
+    df_tremps, tremp_rows, df_users_in_tremp = chunk
+    return PartialAggregates.from_chunk(df_tremps, _worker_users, df_users_in_tremp, tremp_rows,
+                                        round_up_from_minute, rides_given_only)
+
+
+def reduce_chunks(chunks: Iterable[TableChunk], df_users: pd.DataFrame, round_up_from_minute: int = HALF_HOUR_MINUTE,
+                  rides_given_only: bool = False, max_workers: Optional[int] = None) -> PartialAggregates:
+    """
+    The function `reduce_chunks` calculates the partial aggregates of every chunk in a pool of worker processes
+    and merges them.
+
+    :param chunks: At least one chunk, like the ones of `table_chunks`. They are taken from the iterable only as workers
+    free up, CHUNKS_IN_FLIGHT_PER_WORKER per worker.
+    :param df_users: The users, only the user_id and gender columns are sent to the workers.
+    :param max_workers: The number of worker processes, by default one per core. With one worker the chunks are
+    calculated in this process.
+    :return: the aggregates of all the chunks.
+    """
+    df_users = df_users[[USER_ID_COLUMN, GENDER_COLUMN]]
+    max_workers = max_workers or os.cpu_count() or 1
+    merged = None
+
+    def merge(partial: PartialAggregates) -> None:
+        nonlocal merged
+        merged = partial if merged is None else merged.merge(partial)
+
+    if max_workers == 1:
+        set_worker_users(df_users)
+        for chunk in chunks:
+            merge(aggregate_chunk(chunk, round_up_from_minute, rides_given_only))
+        return merged
+
+    chunks = iter(chunks)
+    # Workers start as fresh interpreters, forking a process with threads (like the Streamlit server) isn't safe
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=set_worker_users, initargs=(df_users,)) as executor:
+        in_flight = set()
+        for chunk in chunks:
+            in_flight.add(executor.submit(aggregate_chunk, chunk, round_up_from_minute, rides_given_only))
+            if len(in_flight) >= max_workers * CHUNKS_IN_FLIGHT_PER_WORKER:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    merge(future.result())
+        for future in in_flight:
+            merge(future.result())
+    return merged
+
+
+def map_reduce_aggregates(df_tremps: pd.DataFrame, df_users: pd.DataFrame, df_users_in_tremp: pd.DataFrame,
+                          round_up_from_minute: int = HALF_HOUR_MINUTE, rides_given_only: bool = False,
+                          chunk_rows: int = DEFAULT_CHUNK_ROWS, max_workers: Optional[int] = None) -> PartialAggregates:
+    """
+    The function `map_reduce_aggregates` calculates the aggregates of the tables chunk by chunk of tremp id
+    ranges in a pool of worker processes, see `reduce_chunks`.
+    """
+    return reduce_chunks(table_chunks(df_tremps, df_users_in_tremp, chunk_rows), df_users, round_up_from_minute,
+                         rides_given_only, max_workers)
@@ -0,0 +1,228 @@
+# /trempboss_analytics/metrics.py
+import datetime
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from trempboss_analytics.columns import (TREMP_ID_COLUMN, TREMP_TYPE_COLUMN, SEATS_AMOUNT_COLUMN, USER_ID_COLUMN,
+                                         IS_TREMP_CREATOR_COLUMN, DATE_COLUMN, GENDER_COLUMN, DRIVER_TREMP_TYPE,
+                                         HITCHHIKER_TREMP_TYPE, TREMP_TYPES)
+
+# Minute from which a tremp time is rounded up to the next hour. The matplotlib menu rounds hh:30 up, the
+# dashboard rounds up only from hh:31, each front end passes its own.
+HALF_HOUR_MINUTE = 30
+
+
+def get_tremp_positions(df_tremps: pd.DataFrame, df_users_in_tremp: pd.DataFrame) -> np.ndarray:
+    """
+    The function returns for every row of users_in_tremps the row of its tremp in df_tremps, or -1 when the
+    tremp isn't there (like a tremp that was filtered out). The tremp ids must be unique.
+    """
+    return pd.Index(df_tremps[TREMP_ID_COLUMN]).get_indexer(df_users_in_tremp[TREMP_ID_COLUMN])
+
+
+def calculate_participation_totals(df_tremps: pd.DataFrame, df_users_in_tremp: pd.DataFrame) -> Tuple[int, int]:
+    """
+    The function `calculate_participation_totals` counts the hitchhikers and the tremps that were joined, only
+    for the tremps in df_tremps. Every user that joined a tremp is a hitchhiker, and so are the seats asked for
+    in a hitchhiker tremp that someone joined.
+
+    :param df_tremps: A DataFrame of tremps with the tremp_id, tremp_type and seats_amount columns.
+    :param df_users_in_tremp: A DataFrame of the users in every tremp with the tremp_id and is_tremp_creator
+    columns.
+    :return: tuple containing the total hitchhikers and the number of tremps that someone joined.
+    """
+    tremp_positions = get_tremp_positions(df_tremps, df_users_in_tremp)
+    is_joiner = (tremp_positions >= 0) & ~df_users_in_tremp[IS_TREMP_CREATOR_COLUMN].to_numpy(dtype=bool)
+
+    joined_tremps = np.zeros(len(df_tremps), dtype=bool)
+    joined_tremps[tremp_positions[is_joiner]] = True
+    is_hitchhiker_tremp = df_tremps[TREMP_TYPE_COLUMN].to_numpy() == HITCHHIKER_TREMP_TYPE
+    asked_seats = df_tremps[SEATS_AMOUNT_COLUMN].to_numpy()[joined_tremps & is_hitchhiker_tremp].sum()
+
+    return int(is_joiner.sum() + asked_seats), int(joined_tremps.sum())
+
+
+def format_average_people_per_tremp(total_hitchhikers: int, total_tremps: int) -> str:
+    """
+    The function returns the average hitchhikers per joined tremp with two decimals, '0.00' without tremps.
+    """
+    return "{:.2f}".format(total_hitchhikers / total_tremps) if total_tremps != 0 else '0.00'
+
+
+def get_hours_and_minutes(times: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The function returns the hour and the minute of every time in a column of times (datetime.time objects or
+    "HH:MM:SS" strings). The distinct times are converted once and mapped back to the rows, missing times
+    get the hour -1.
+    """
+    if pd.api.types.is_datetime64_any_dtype(times):
+        hours = times.dt.hour.fillna(-1).to_numpy(dtype=np.int64)
+        return hours, times.dt.minute.fillna(0).to_numpy(dtype=np.int64)
+
+    codes, unique_times = pd.factorize(times)
+    unique_times = [datetime.time.fromisoformat(time) if isinstance(time, str) else time for time in unique_times]
+    unique_hours = np.array([time.hour for time in unique_times] + [-1], dtype=np.int64)
+    unique_minutes = np.array([time.minute for time in unique_times] + [0], dtype=np.int64)
+    # Missing times have the code -1, which picks the value appended at the end
+    return unique_hours[codes], unique_minutes[codes]
+
+
+def round_hours(times: pd.Series, round_up_from_minute: int = HALF_HOUR_MINUTE) -> np.ndarray:
+    """
+    The function rounds every time to an hour (0-23), times from `round_up_from_minute` past the hour round
+    up. Missing times are -1.
+    """
+    hours, minutes = get_hours_and_minutes(times)
+    rounded_hours = (hours + (minutes >= round_up_from_minute)) % 24
+    return np.where(hours >= 0, rounded_hours, -1)
+
+
+def count_hours(times: pd.Series, round_up_from_minute: int = HALF_HOUR_MINUTE,
+                positions: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The function counts the tremps of every rounded hour with one bincount over the 24 hours.
+
+    :param positions: The row number of every time, by default its position in `times`. A chunk of the tremps
+    passes the rows of its tremps in the whole table, so the first appearances of the chunks can be compared.
+    :return: tuple containing the tremp counts of the 24 hours and the first row of every hour (the largest
+    int64 for hours without tremps).
+    """
+    rounded_hours = round_hours(times, round_up_from_minute)
+    positions = np.arange(len(times)) if positions is None else np.asarray(positions)
+    has_hour = rounded_hours >= 0
+    rounded_hours, positions = rounded_hours[has_hour], positions[has_hour]
+
+    hour_counts = np.bincount(rounded_hours, minlength=24)
+    first_seen = np.full(24, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(first_seen, rounded_hours, positions)
+    return hour_counts, first_seen
+
+
+def rank_top_hours(hour_counts: np.ndarray, first_seen: np.ndarray, top_count: int = 5) -> pd.Series:
+    """
+    The function returns the `top_count` hours with the most tremps as a Series of tremp counts indexed by the
+    hour, the busiest first. Tied hours keep the order in which they first appear, like `value_counts`.
+    """
+    top_hours = np.lexsort((first_seen, -hour_counts))[:top_count]
+    top_hours = top_hours[hour_counts[top_hours] > 0]
+    return pd.Series(hour_counts[top_hours], index=top_hours, name='count')
+
+
+def calculate_top_hours(times: pd.Series, round_up_from_minute: int = HALF_HOUR_MINUTE,
+                        top_count: int = 5) -> pd.Series:
+    """
+    The function `calculate_top_hours` counts the tremps of every rounded hour with one bincount over the 24
+    hours.
+
+    :param times: The tremp_time column.
+    :param round_up_from_minute: The minute from which a time rounds up to the next hour.
+    :param top_count: The number of hours returned.
+    :return: a Series of tremp counts indexed by the hour, the busiest first. Tied hours keep the order in which
+    they first appear, like `value_counts`.
+    """
+    return rank_top_hours(*count_hours(times, round_up_from_minute), top_count)
+
+
+def calculate_driver_ride_counts(df_tremps: pd.DataFrame, df_users_in_tremp: pd.DataFrame,
+                                 rides_given_only: bool = False) -> pd.Series:
+    """
+    The function `calculate_driver_ride_counts` counts the rides of every driver, only for the tremps in
+    df_tremps.
+
+    :param df_tremps: A DataFrame of tremps with the tremp_id and tremp_type columns.
+    :param df_users_in_tremp: A DataFrame of the users in every tremp with the user_id, tremp_id and
+    is_tremp_creator columns.
+    :param rides_given_only: By default every driver tremp a user opened is a ride. When True, only tremps that
+    someone joined count, and joining a hitchhiker tremp counts as a ride of the user who joined it.
+    :return: a Series of ride counts indexed by the user id of the driver.
+    """
+    tremp_positions = get_tremp_positions(df_tremps, df_users_in_tremp)
+    # The tremp type of every row of users_in_tremps, missing tremps get an empty type
+    participation_types = np.append(df_tremps[TREMP_TYPE_COLUMN].to_numpy(dtype=object), '')[tremp_positions]
+    is_creator = df_users_in_tremp[IS_TREMP_CREATOR_COLUMN].to_numpy(dtype=bool)
+
+    is_ride = (participation_types == DRIVER_TREMP_TYPE) & is_creator
+    if rides_given_only:
+        # Counted over all of users_in_tremps, the other users of a tremp don't depend on the shown tremps
+        participant_counts = df_users_in_tremp.groupby(TREMP_ID_COLUMN)[TREMP_ID_COLUMN].transform('size')
+        is_ride = (is_ride | ((participation_types == HITCHHIKER_TREMP_TYPE) & ~is_creator)) & \
+            (participant_counts.to_numpy() > 1)
+
+    return df_users_in_tremp[USER_ID_COLUMN][is_ride].value_counts(sort=False)
+
+
+def calculate_top_drivers(df_tremps: pd.DataFrame, df_users_in_tremp: pd.DataFrame, rides_given_only: bool = False,
+                          top_count: int = 5) -> pd.Series:
+    """
+    The function returns the drivers with the most rides (see `calculate_driver_ride_counts`) as a Series of
+    ride counts indexed by their user id, the busiest first. Tied drivers are in the order of their user ids.
+    """
+    ride_counts = calculate_driver_ride_counts(df_tremps, df_users_in_tremp, rides_given_only)
+    return ride_counts.sort_index().sort_values(ascending=False, kind='stable').head(top_count)
+
+
+def calculate_participation_by_tremp_type(df_tremps: pd.DataFrame, df_users_in_tremp: pd.DataFrame) -> pd.DataFrame:
+    """
+    The function `calculate_participation_by_tremp_type` counts, for every tremp type, the tremps, the users that
+    created them and the users that joined them, in one pass over users_in_tremps.
+
+    :param df_tremps: A DataFrame of tremps with the tremp_id and tremp_type columns.
+    :param df_users_in_tremp: A DataFrame of the users in every tremp with the tremp_id and is_tremp_creator
+    columns.
+    :return: a DataFrame indexed by the tremp type (driver and hitchhiker first) with the tremps, creators and
+    joiners columns.
+    """
+    tremp_types = df_tremps[TREMP_TYPE_COLUMN].to_numpy(dtype=object)
+    tremp_positions = get_tremp_positions(df_tremps, df_users_in_tremp)
+    in_tremps = tremp_positions >= 0
+    participation_types = tremp_types[tremp_positions[in_tremps]]
+    is_creator = df_users_in_tremp[IS_TREMP_CREATOR_COLUMN].to_numpy(dtype=bool)[in_tremps]
+
+    counts = pd.DataFrame({
+        'tremps': pd.Series(tremp_types).value_counts(),
+        'creators': pd.Series(participation_types[is_creator], dtype=object).value_counts(),
+        'joiners': pd.Series(participation_types[~is_creator], dtype=object).value_counts(),
+    })
+    return order_tremp_types(counts)
+
+
+def order_tremp_types(counts: pd.DataFrame) -> pd.DataFrame:
+    """
+    The function puts the driver and hitchhiker rows of counts by tremp type first and any other types after them
+    by name, with 0 for missing counts.
+    """
+    tremp_type_order = TREMP_TYPES + sorted(set(counts.index) - set(TREMP_TYPES))
+    return counts.reindex(tremp_type_order).fillna(0).astype(np.int64)
+
+
+def calculate_tremp_type_percentages(df_tremps: pd.DataFrame,
+                                     df_users_in_tremp: pd.DataFrame) -> Tuple[float, float, float, float]:
+    """
+    The function splits all the activity (opening a tremp or joining one) by tremp type.
+
+    :return: tuple containing the percentages of opened rides, joined rides, joined tremps and opened tremps,
+    where a ride is a driver tremp and a tremp is a hitchhiker tremp.
+    """
+    counts = calculate_participation_by_tremp_type(df_tremps, df_users_in_tremp)
+    open_rides = counts.at[DRIVER_TREMP_TYPE, 'tremps']
+    open_tremps = counts.at[HITCHHIKER_TREMP_TYPE, 'tremps']
+    join_drive = counts.at[DRIVER_TREMP_TYPE, 'joiners']
+    join_tremp = counts.at[HITCHHIKER_TREMP_TYPE, 'joiners']
+
+    total_activity = open_rides + open_tremps + join_drive + join_tremp
+    return tuple(float(count / total_activity * 100) for count in (open_rides, join_drive, join_tremp, open_tremps))
+
+
+def count_participations_by_month_and_gender(df_tremps: pd.DataFrame, df_users: pd.DataFrame,
+                                             df_users_in_tremp: pd.DataFrame) -> pd.Series:
+    """
+    The function counts the participations in the tremps of df_tremps by the month of the tremp and the gender of
+    the user.
+
+    :return: a Series of counts indexed by the month (a monthly Period) and the gender, sorted.
+    """
+    tremps_with_users = df_users_in_tremp.merge(df_tremps[[TREMP_ID_COLUMN, DATE_COLUMN]], on=TREMP_ID_COLUMN)
+    with_gender = tremps_with_users.merge(df_users[[GENDER_COLUMN, USER_ID_COLUMN]], on=USER_ID_COLUMN)
+    return with_gender.groupby([with_gender[DATE_COLUMN].dt.to_period('M'), GENDER_COLUMN]).size()
@@ -0,0 +1,139 @@
+# /trempboss_analytics/occupancy.py
+"""
+Seat occupancy of the driver tremps: the seats a driver offered and how many of them were filled by the users who
+joined, in total, by route, by hour and by month, and the routes and hours that leave the most seats empty.
+
+The filled seats of every tremp are counted once, with one bincount over the participations, and kept next to the
+tremps. Every occupancy statistic of any subset of the tremps is then a grouped sum of those two columns.
+"""
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from trempboss_analytics.columns import (TREMP_TYPE_COLUMN, SEATS_AMOUNT_COLUMN, TREMP_TIME_COLUMN,
+                                         FROM_ROUTE_COLUMN, TO_ROUTE_COLUMN, DATE_COLUMN, FILLED_SEATS_COLUMN,
+                                         IS_TREMP_CREATOR_COLUMN, DRIVER_TREMP_TYPE)
+from trempboss_analytics.metrics import HALF_HOUR_MINUTE, get_tremp_positions, round_hours
+from trempboss_analytics.routes import get_place_codes
+
+OCCUPANCY_COLUMNS = ['offered', 'filled', 'utilization']
+HOTSPOT_COLUMNS = ['route', 'hour', 'unfilled', 'offered', 'utilization']
+
+# Number of unfilled capacity hotspots reported
+DEFAULT_HOTSPOT_COUNT = 5
+
+
+class SeatOccupancy(NamedTuple):
+    # Offered and filled seats of all the driver tremps
+    offered_seats: int
+    filled_seats: int
+    # OCCUPANCY_COLUMNS indexed by the route ("<from> to <to>"), the rounded hour and the month ("YYYY-MM")
+    by_route: pd.DataFrame
+    by_hour: pd.DataFrame
+    by_month: pd.DataFrame
+    # HOTSPOT_COLUMNS of the routes and hours with the most empty seats, the emptiest first
+    hotspots: pd.DataFrame
+
+    @property
+    def utilization(self) -> float:
+        return self.filled_seats / self.offered_seats if self.offered_seats else 0.0
+
+
+def count_filled_seats(df_tremps: pd.DataFrame, df_users_in_tremp: pd.DataFrame) -> np.ndarray:
+    """
+    The function counts the filled seats of every tremp in df_tremps, in its order: the users who joined it,
+    at most the seats it offered. Participations in other tremps are left out.
+    """
+    tremp_positions = get_tremp_positions(df_tremps, df_users_in_tremp)
+    is_joiner = (tremp_positions >= 0) & ~df_users_in_tremp[IS_TREMP_CREATOR_COLUMN].to_numpy(dtype=bool)
+    joiners = np.bincount(tremp_positions[is_joiner], minlength=len(df_tremps))
+    return np.minimum(joiners, df_tremps[SEATS_AMOUNT_COLUMN].to_numpy(dtype=np.int64))
+
+
+def sum_seats(codes: np.ndarray, labels: pd.Index, offered: np.ndarray, filled: np.ndarray) -> pd.DataFrame:
+    """
+    The function sums the offered and filled seats of the tremps by their group codes (-1 for no group) and
+    returns the OCCUPANCY_COLUMNS of every group that has tremps, indexed by `labels[code]`.
+    """
+    has_group = codes >= 0
+    group_codes, inverse = np.unique(codes[has_group], return_inverse=True)
+    offered_sums = np.bincount(inverse, weights=offered[has_group], minlength=len(group_codes)).astype(np.int64)
+    filled_sums = np.bincount(inverse, weights=filled[has_group], minlength=len(group_codes)).astype(np.int64)
+    return pd.DataFrame({
+        'offered': offered_sums,
+        'filled': filled_sums,
+        'utilization': filled_sums / np.maximum(offered_sums, 1),
+    }, index=labels[group_codes])
+
+
+def route_labels(origins: pd.Index, destinations: pd.Index, route_codes: np.ndarray) -> pd.Index:
+    """
+    The function returns the "<from> to <to>" label of every route code (origin * destinations + destination).
+    """
+    origin_codes, destination_codes = np.divmod(route_codes, max(len(destinations), 1))
+    return pd.Index([f"{origin} to {destination}"
+                     for origin, destination in zip(origins[origin_codes], destinations[destination_codes])])
+
+
+def calculate_seat_occupancy(df_tremps: pd.DataFrame, round_up_from_minute: int = HALF_HOUR_MINUTE,
+                             hotspot_count: int = DEFAULT_HOTSPOT_COUNT) -> SeatOccupancy:
+    """
+    The function `calculate_seat_occupancy` sums the offered and filled seats of the driver tremps by route, hour
+    and month, and finds the route and hour pairs with the most empty seats. It only reads the columns of the
+    tremps, so a filtered subset of them needs no merge.
+
+    :param df_tremps: A DataFrame of tremps with the tremp_type, seats_amount, filled_seats (see
+    `count_filled_seats`), date, tremp_time, from_route and to_route columns. The dates may be datetimes or
+    "YYYY-MM-DD" strings.
+    :param round_up_from_minute: The minute from which a tremp time rounds up to the next hour.
+    :param hotspot_count: The number of hotspots.
+    :return: the occupancy of the driver tremps.
+    """
+    driver_tremps = df_tremps[df_tremps[TREMP_TYPE_COLUMN].to_numpy() == DRIVER_TREMP_TYPE]
+    offered = driver_tremps[SEATS_AMOUNT_COLUMN].to_numpy(dtype=np.int64)
+    filled = driver_tremps[FILLED_SEATS_COLUMN].to_numpy(dtype=np.int64)
+
+    origin_codes, origins = get_place_codes(driver_tremps[FROM_ROUTE_COLUMN])
+    destination_codes, destinations = get_place_codes(driver_tremps[TO_ROUTE_COLUMN])
+    route_codes = np.where((origin_codes >= 0) & (destination_codes >= 0),
+                           origin_codes.astype(np.int64) * len(destinations) + destination_codes, -1)
+    # The routes are numbered by the routes that appear, so the labels are made only for them
+    has_route = route_codes >= 0
+    used_routes, used_route_index = np.unique(route_codes[has_route], return_inverse=True)
+    route_index = np.full(len(route_codes), -1, dtype=np.int64)
+    route_index[has_route] = used_route_index
+    labels = route_labels(origins, destinations, used_routes)
+
+    hours = round_hours(driver_tremps[TREMP_TIME_COLUMN], round_up_from_minute)
+    months = pd.to_datetime(driver_tremps[DATE_COLUMN]).to_numpy(dtype='datetime64[M]')
+    month_codes, month_labels = pd.factorize(months, sort=True)
+
+    by_route = sum_seats(route_index, labels, offered, filled)
+    by_hour = sum_seats(hours, pd.RangeIndex(24, name='hour'), offered, filled)
+    by_month = sum_seats(month_codes, pd.Index(np.datetime_as_string(month_labels, unit='M'), name='month'),
+                         offered, filled)
+
+    return SeatOccupancy(int(offered.sum()), int(filled.sum()), by_route.rename_axis('route'), by_hour,
+                         by_month, unfilled_hotspots(route_index, labels, hours, offered, filled, hotspot_count))
+
+
+def unfilled_hotspots(route_index: np.ndarray, labels: pd.Index, hours: np.ndarray, offered: np.ndarray,
+                      filled: np.ndarray, hotspot_count: int) -> pd.DataFrame:
+    """
+    The function returns the route and hour pairs with the most empty seats as HOTSPOT_COLUMNS, the emptiest
+    first. Ties are in the order of the route and then the hour.
+    """
+    pair_codes = np.where((route_index >= 0) & (hours >= 0), route_index * 24 + hours, -1)
+    pairs = sum_seats(pair_codes, pd.RangeIndex(max(len(labels), 1) * 24), offered, filled)
+    pairs['unfilled'] = pairs['offered'] - pairs['filled']
+    pairs = pairs[pairs['unfilled'] > 0].sort_values('unfilled', ascending=False, kind='stable').head(hotspot_count)
+    pair_routes, pair_hours = np.divmod(pairs.index.to_numpy(), 24)
+    return pd.DataFrame({
+        'route': labels[pair_routes],
+        'hour': pair_hours,
+        'unfilled': pairs['unfilled'].to_numpy(),
+        'offered': pairs['offered'].to_numpy(),
+        'utilization': pairs['utilization'].to_numpy(),
+    }, columns=HOTSPOT_COLUMNS)
+
@@ -0,0 +1,98 @@
+# /trempboss_analytics/partials.py
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from trempboss_analytics.columns import TREMP_TIME_COLUMN
+from trempboss_analytics.metrics import (HALF_HOUR_MINUTE, calculate_participation_totals, count_hours,
+                                         rank_top_hours, calculate_driver_ride_counts,
+                                         calculate_participation_by_tremp_type, order_tremp_types,
+                                         count_participations_by_month_and_gender)
+
+
+def add_counts(counts: pd.Series, other_counts: pd.Series) -> pd.Series:
+    """
+    The function adds two Series of counts item by item, an item missing from one of them counts 0 there.
+    """
+    return counts.add(other_counts, fill_value=0).astype(np.int64)
+
+
+class PartialAggregates:
+    """
+    The aggregates of a chunk of the data: a range of tremp ids with their tremps and all of their participations.
+    Every aggregate is a sum (or a minimum) over the tremps, so the aggregates of all the chunks merge into
+    exactly the aggregates of the whole data, in any order.
+    """
+
+    def __init__(self, total_hitchhikers: int, joined_tremps: int, counts_by_type: pd.DataFrame,
+                 hour_counts: np.ndarray, hour_first_seen: np.ndarray, driver_rides: pd.Series,
+                 month_gender_counts: pd.Series):
+        self.total_hitchhikers = total_hitchhikers
+        self.joined_tremps = joined_tremps
+        self.counts_by_type = counts_by_type
+        self.hour_counts = hour_counts
+        self.hour_first_seen = hour_first_seen
+        self.driver_rides = driver_rides
+        self.month_gender_counts = month_gender_counts
+
+    @classmethod
+    def from_chunk(cls, df_tremps: pd.DataFrame, df_users: pd.DataFrame, df_users_in_tremp: pd.DataFrame,
+                   tremp_rows: Optional[np.ndarray] = None, round_up_from_minute: int = HALF_HOUR_MINUTE,
+                   rides_given_only: bool = False) -> 'PartialAggregates':
+        """
+        Calculates the aggregates of a chunk.
+
+        :param df_tremps: The tremps of the chunk.
+        :param df_users: All the users, with the user_id and gender columns.
+        :param df_users_in_tremp: All the participations in the tremps of the chunk.
+        :param tremp_rows: The row of every tremp of the chunk in the whole tremps table, for the order of the
+        first appearance of the hours.
+        :param round_up_from_minute: The minute from which a tremp time rounds up to the next hour.
+        :param rides_given_only: Which rides of a driver are counted, see `calculate_driver_ride_counts`.
+        """
+        total_hitchhikers, joined_tremps = calculate_participation_totals(df_tremps, df_users_in_tremp)
+        hour_counts, hour_first_seen = count_hours(df_tremps[TREMP_TIME_COLUMN], round_up_from_minute, tremp_rows)
+        return cls(total_hitchhikers, joined_tremps,
+                   calculate_participation_by_tremp_type(df_tremps, df_users_in_tremp),
+                   hour_counts, hour_first_seen,
+                   calculate_driver_ride_counts(df_tremps, df_users_in_tremp, rides_given_only),
+                   count_participations_by_month_and_gender(df_tremps, df_users, df_users_in_tremp))
+
+    def merge(self, other: 'PartialAggregates') -> 'PartialAggregates':
+        """
+        Returns the aggregates of both chunks.
+        """
+        return PartialAggregates(
+            self.total_hitchhikers + other.total_hitchhikers,
+            self.joined_tremps + other.joined_tremps,
+            self.counts_by_type.add(other.counts_by_type, fill_value=0).astype(np.int64),
+            self.hour_counts + other.hour_counts,
+            np.minimum(self.hour_first_seen, other.hour_first_seen),
+            add_counts(self.driver_rides, other.driver_rides),
+            add_counts(self.month_gender_counts, other.month_gender_counts),
+        )
+
+    def participation_by_tremp_type(self) -> pd.DataFrame:
+        """
+        Returns the counts by tremp type like `calculate_participation_by_tremp_type`.
+        """
+        return order_tremp_types(self.counts_by_type)
+
+    def top_hours(self, top_count: int = 5) -> pd.Series:
+        """
+        Returns the busiest hours like `calculate_top_hours`.
+        """
+        return rank_top_hours(self.hour_counts, self.hour_first_seen, top_count)
+
+    def top_drivers(self, top_count: int = 5) -> pd.Series:
+        """
+        Returns the drivers with the most rides like `calculate_top_drivers`.
+        """
+        return self.driver_rides.sort_index().sort_values(ascending=False, kind='stable').head(top_count)
+
+    def participations_by_month_and_gender(self) -> pd.Series:
+        """
+        Returns the participations by month and gender like `count_participations_by_month_and_gender`.
+        """
+        return self.month_gender_counts.sort_index()
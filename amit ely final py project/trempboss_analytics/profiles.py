@@ -0,0 +1,199 @@
+# /trempboss_analytics/profiles.py
+"""
+Activity profiles of the users: how many rides and tremps every user opened and joined, when they were first and
+last active, their favourite route and their usual hour. All the profiles are built together from the
+participations, and a profile is then looked up by its user id in constant time.
+"""
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from trempboss_analytics.columns import (TREMP_TYPE_COLUMN, TREMP_TIME_COLUMN, FROM_ROUTE_COLUMN, TO_ROUTE_COLUMN,
+                                         DATE_COLUMN, USER_ID_COLUMN, IS_TREMP_CREATOR_COLUMN, FULL_NAME_COLUMN,
+                                         DRIVER_TREMP_TYPE, HITCHHIKER_TREMP_TYPE)
+from trempboss_analytics.metrics import HALF_HOUR_MINUTE, get_tremp_positions, round_hours
+from trempboss_analytics.routes import get_place_codes
+
+# The counts of a profile, in the order of the activity codes: the tremp type and whether the user opened it
+ACTIVITY_COLUMNS = ['offered_rides', 'joined_rides', 'requested_tremps', 'joined_tremps']
+PROFILE_COLUMNS = ACTIVITY_COLUMNS + ['first_activity', 'last_activity', 'favourite_route', 'usual_hour']
+
+# Usual hour of a user without any tremp time
+NO_HOUR = -1
+
+# The labels of the profile columns when a profile is shown
+PROFILE_LABELS = {
+    'offered_rides': 'Rides Offered',
+    'joined_rides': 'Rides Joined',
+    'requested_tremps': 'Tremps Requested',
+    'joined_tremps': 'Tremps Joined',
+    'first_activity': 'First Activity',
+    'last_activity': 'Last Activity',
+    'favourite_route': 'Favourite Route',
+    'usual_hour': 'Usual Hour',
+}
+
+
+def activity_codes(participation_types: np.ndarray, is_creator: np.ndarray) -> np.ndarray:
+    """
+    The function returns the position in ACTIVITY_COLUMNS of every participation, or -1 for a tremp of another
+    type.
+    """
+    codes = np.full(len(participation_types), -1, dtype=np.int64)
+    codes[participation_types == DRIVER_TREMP_TYPE] = 0
+    codes[participation_types == HITCHHIKER_TREMP_TYPE] = 2
+    return np.where(codes >= 0, codes + ~is_creator, -1)
+
+
+def most_common_per_user(user_codes: np.ndarray, value_codes: np.ndarray, user_count: int) -> np.ndarray:
+    """
+    The function returns the most common value code of every user, -1 for users without values. Ties go to the
+    smallest code. Only the (user, value) pairs that appear are counted, so the values may be many.
+    """
+    has_value = value_codes >= 0
+    pairs, pair_counts = np.unique(np.stack([user_codes[has_value], value_codes[has_value]]), axis=1,
+                                   return_counts=True)
+    # The pairs are sorted by user and then by value, the most common value of a user is its first pair once
+    # they are stably sorted by count
+    order = np.lexsort((pairs[1], -pair_counts, pairs[0]))
+    pair_users, pair_values = pairs[0][order], pairs[1][order]
+    is_first = np.r_[True, pair_users[1:] != pair_users[:-1]] if len(pair_users) else np.zeros(0, dtype=bool)
+
+    most_common = np.full(user_count, -1, dtype=np.int64)
+    most_common[pair_users[is_first]] = pair_values[is_first]
+    return most_common
+
+
+def smallest_dtype(values: np.ndarray) -> np.dtype:
+    """
+    The function returns the smallest signed integer type that holds all the values.
+    """
+    low, high = (int(values.min()), int(values.max())) if len(values) else (0, 0)
+    return next(np.dtype(dtype) for dtype in (np.int8, np.int16, np.int32, np.int64)
+                if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max)
+
+
+class UserProfiles:
+    """
+    The activity profiles of all the users, one row per user id with the PROFILE_COLUMNS columns: counts in the
+    smallest integer type that fits them, dates, the favourite route as a categorical of "<from> to <to>"
+    labels and the usual (rounded) hour, NO_HOUR when unknown. The full names of the users are kept next to
+    the table, in the same order.
+    """
+
+    def __init__(self, table: pd.DataFrame, full_names: pd.Series):
+        self.table = table
+        self.full_names = full_names
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def __contains__(self, user_id) -> bool:
+        return user_id in self.table.index
+
+    def lookup(self, user_id) -> Optional[pd.Series]:
+        """
+        Returns the profile of a user, or None for an unknown user id. The user ids are a unique index, so the
+        row is found through its hash table.
+        """
+        if user_id not in self.table.index:
+            return None
+        return self.table.iloc[self.table.index.get_loc(user_id)]
+
+    def full_name(self, user_id) -> str:
+        """
+        Returns the full name of a user, an empty string for an unknown user id.
+        """
+        if user_id not in self.table.index:
+            return ''
+        return str(self.full_names.iloc[self.table.index.get_loc(user_id)])
+
+    @property
+    def memory_bytes(self) -> int:
+        return int(self.table.memory_usage(deep=True).sum())
+
+
+def format_user_profile(profile: pd.Series) -> pd.Series:
+    """
+    The function returns a profile as text labeled by PROFILE_LABELS: dates as YYYY-MM-DD, the usual hour as
+    HH:00, and '-' for what the user doesn't have.
+    """
+    values = [str(int(profile[column])) for column in ACTIVITY_COLUMNS]
+    values += ['-' if pd.isna(profile[column]) else profile[column].strftime('%Y-%m-%d')
+               for column in ('first_activity', 'last_activity')]
+    values.append('-' if pd.isna(profile['favourite_route']) else str(profile['favourite_route']))
+    values.append('-' if profile['usual_hour'] == NO_HOUR else f"{int(profile['usual_hour']):02d}:00")
+    return pd.Series(values, index=[PROFILE_LABELS[column] for column in PROFILE_COLUMNS])
+
+
+def build_user_profiles(df_tremps: pd.DataFrame, df_users: pd.DataFrame, df_users_in_tremp: pd.DataFrame,
+                        round_up_from_minute: int = HALF_HOUR_MINUTE) -> UserProfiles:
+    """
+    The function `build_user_profiles` builds the profiles of all the users in one pass over the
+    participations: every participation is mapped to the integer codes of its user, activity, date, route and
+    hour, and every column of the profiles is one bincount (or one grouped minimum, maximum or mode) of them.
+
+    :param df_tremps: A DataFrame of tremps with the tremp_id, tremp_type, date, tremp_time, from_route and
+    to_route columns. The dates may be datetimes or "YYYY-MM-DD" strings.
+    :param df_users: A DataFrame of users with the user_id and full_name columns, every user gets a profile.
+    :param df_users_in_tremp: A DataFrame of the users in every tremp with the user_id, tremp_id and
+    is_tremp_creator columns. Participations of unknown users or tremps are left out.
+    :param round_up_from_minute: The minute from which a tremp time rounds up to the next hour.
+    :return: the profiles, indexed by user id.
+    """
+    df_users = df_users.drop_duplicates(USER_ID_COLUMN)
+    user_ids = pd.Index(df_users[USER_ID_COLUMN])
+    user_codes = user_ids.get_indexer(df_users_in_tremp[USER_ID_COLUMN])
+    tremp_positions = get_tremp_positions(df_tremps, df_users_in_tremp)
+    is_known = (user_codes >= 0) & (tremp_positions >= 0)
+    user_codes, tremp_positions = user_codes[is_known], tremp_positions[is_known]
+    is_creator = df_users_in_tremp[IS_TREMP_CREATOR_COLUMN].to_numpy(dtype=bool)[is_known]
+    user_count = len(user_ids)
+
+    # The codes of every tremp, taken by the participations through the tremp positions
+    tremp_types = df_tremps[TREMP_TYPE_COLUMN].to_numpy(dtype=object)
+    tremp_days = pd.to_datetime(df_tremps[DATE_COLUMN]).to_numpy(dtype='datetime64[D]')
+    origin_codes, origins = get_place_codes(df_tremps[FROM_ROUTE_COLUMN])
+    destination_codes, destinations = get_place_codes(df_tremps[TO_ROUTE_COLUMN])
+    route_codes = np.where((origin_codes >= 0) & (destination_codes >= 0),
+                           origin_codes.astype(np.int64) * len(destinations) + destination_codes, -1)
+    tremp_hours = round_hours(df_tremps[TREMP_TIME_COLUMN], round_up_from_minute)
+
+    activities = activity_codes(tremp_types[tremp_positions], is_creator)
+    has_activity = activities >= 0
+    activity_counts = np.bincount(user_codes[has_activity] * len(ACTIVITY_COLUMNS) + activities[has_activity],
+                                  minlength=user_count * len(ACTIVITY_COLUMNS)).reshape(user_count, -1)
+
+    days = tremp_days[tremp_positions]
+    has_day = ~np.isnat(days)
+    day_numbers = days[has_day].astype(np.int64)
+    first_days = np.full(user_count, np.iinfo(np.int64).max, dtype=np.int64)
+    last_days = np.full(user_count, np.iinfo(np.int64).min, dtype=np.int64)
+    np.minimum.at(first_days, user_codes[has_day], day_numbers)
+    np.maximum.at(last_days, user_codes[has_day], day_numbers)
+    is_active = np.bincount(user_codes[has_day], minlength=user_count) > 0
+
+    favourite_routes = most_common_per_user(user_codes, route_codes[tremp_positions], user_count)
+    # Only the routes that are someone's favourite get a label
+    used_routes, favourite_route_codes = np.unique(favourite_routes, return_inverse=True)
+    if len(used_routes) and used_routes[0] < 0:
+        used_routes, favourite_route_codes = used_routes[1:], favourite_route_codes - 1
+    used_origins, used_destinations = np.divmod(used_routes, max(len(destinations), 1))
+    route_labels = [f"{origin} to {destination}"
+                    for origin, destination in zip(origins[used_origins], destinations[used_destinations])]
+
+    hours = tremp_hours[tremp_positions]
+    has_hour = hours >= 0
+    hour_counts = np.bincount(user_codes[has_hour] * 24 + hours[has_hour], minlength=user_count * 24).reshape(
+        user_count, 24)
+    usual_hours = np.where(hour_counts.any(axis=1), hour_counts.argmax(axis=1), NO_HOUR)
+
+    table = pd.DataFrame(activity_counts.astype(smallest_dtype(activity_counts.ravel())),
+                         index=user_ids, columns=ACTIVITY_COLUMNS)
+    no_day = np.datetime64('NaT', 'D')
+    table['first_activity'] = np.where(is_active, first_days.view('datetime64[D]'), no_day).astype('datetime64[s]')
+    table['last_activity'] = np.where(is_active, last_days.view('datetime64[D]'), no_day).astype('datetime64[s]')
+    table['favourite_route'] = pd.Categorical.from_codes(favourite_route_codes, categories=route_labels)
+    table['usual_hour'] = usual_hours.astype(np.int8)
+    return UserProfiles(table, df_users[FULL_NAME_COLUMN].reset_index(drop=True))
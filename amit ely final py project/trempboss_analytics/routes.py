@@ -0,0 +1,117 @@
+# /trempboss_analytics/routes.py
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from trempboss_analytics.columns import FROM_ROUTE_COLUMN, TO_ROUTE_COLUMN
+
+# Number of origins and destinations shown in the heatmap, the busiest ones
+HEATMAP_MAX_PLACES = 15
+
+
+def get_place_codes(column: pd.Series) -> Tuple[np.ndarray, pd.Index]:
+    """
+    The function returns the integer codes of a place column and the places they stand for. Categorical
+    columns already hold their codes, other columns are factorized (sorted, so codes follow the place names).
+    Missing places get the code -1.
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy(), column.cat.categories
+    codes, places = pd.factorize(column, sort=True)
+    return codes, pd.Index(places)
+
+
+class RouteMatrix:
+    """
+    Origin-destination counts of tremps: `counts[i, j]` is the number of tremps from `origins[i]` to
+    `destinations[j]`, and `first_seen[i, j]` the row of the first of them. Top routes, totals per origin and
+    the heatmap are all read from the one matrix.
+    """
+
+    def __init__(self, origins: pd.Index, destinations: pd.Index, counts: np.ndarray, first_seen: np.ndarray):
+        self.origins = origins
+        self.destinations = destinations
+        self.counts = counts
+        self.first_seen = first_seen
+
+    def top_cells(self, top_count: int = 5, first_seen_ties: bool = True) -> np.ndarray:
+        """
+        Returns the flat indexes of the cells of the routes with the most tremps, the busiest first. Tied routes
+        keep the order in which they first appear (like `value_counts`), or with `first_seen_ties=False` the
+        order of the place names (like `groupby().size().nlargest()`).
+        """
+        flat_counts = self.counts.ravel()
+        if first_seen_ties:
+            top_cells = np.lexsort((self.first_seen.ravel(), -flat_counts))[:top_count]
+        else:
+            top_cells = np.argsort(-flat_counts, kind='stable')[:top_count]
+        return top_cells[flat_counts[top_cells] > 0]
+
+    def top_route_frame(self, top_count: int = 5, first_seen_ties: bool = True) -> pd.DataFrame:
+        """
+        Returns the routes with the most tremps as from_route, to_route and count columns, the busiest first.
+        """
+        top_cells = self.top_cells(top_count, first_seen_ties)
+        origin_codes, destination_codes = np.divmod(top_cells, len(self.destinations))
+        return pd.DataFrame({
+            FROM_ROUTE_COLUMN: self.origins[origin_codes],
+            TO_ROUTE_COLUMN: self.destinations[destination_codes],
+            'count': self.counts.ravel()[top_cells],
+        })
+
+    def top_routes(self, top_count: int = 5) -> pd.Series:
+        """
+        Returns the routes with the most tremps as a Series labeled "<from> to <to>", sorted ascending for the
+        dashboard bar chart. Tied routes keep the order in which they first appear, like `value_counts`.
+        """
+        top_route_frame = self.top_route_frame(top_count)
+        labels = [f"{origin} to {destination}" for origin, destination in
+                  zip(top_route_frame[FROM_ROUTE_COLUMN], top_route_frame[TO_ROUTE_COLUMN])]
+        return pd.Series(top_route_frame['count'].to_numpy(), index=labels, name='count').sort_values(
+            ascending=True, kind='stable')
+
+    def origin_totals(self) -> pd.Series:
+        """
+        Returns the number of tremps leaving every origin that has any, the busiest first.
+        """
+        totals = pd.Series(self.counts.sum(axis=1), index=self.origins, name='count')
+        return totals[totals > 0].sort_values(ascending=False, kind='stable')
+
+    def heatmap_frame(self, max_places: int = HEATMAP_MAX_PLACES) -> pd.DataFrame:
+        """
+        Returns the counts of the busiest origins (rows) and destinations (columns) as a DataFrame.
+        """
+        origin_totals = self.counts.sum(axis=1)
+        destination_totals = self.counts.sum(axis=0)
+        top_origins = np.argsort(-origin_totals, kind='stable')[:max_places]
+        top_destinations = np.argsort(-destination_totals, kind='stable')[:max_places]
+        top_origins = top_origins[origin_totals[top_origins] > 0]
+        top_destinations = top_destinations[destination_totals[top_destinations] > 0]
+
+        return pd.DataFrame(self.counts[np.ix_(top_origins, top_destinations)],
+                            index=self.origins[top_origins], columns=self.destinations[top_destinations])
+
+
+def build_route_matrix(df_tremps: pd.DataFrame) -> RouteMatrix:
+    """
+    The function `build_route_matrix` counts the tremps of every origin-destination pair with a single
+    bincount over the combined integer codes of the route columns, without building any route strings.
+    The places of a filtered dataframe keep the codes of the full dataset, so recomputing under a filter
+    is one pass over the remaining rows.
+
+    :param df_tremps: A DataFrame of tremps with the from_route and to_route columns.
+    :return: the origin-destination matrix of the tremps.
+    """
+    origin_codes, origins = get_place_codes(df_tremps[FROM_ROUTE_COLUMN])
+    destination_codes, destinations = get_place_codes(df_tremps[TO_ROUTE_COLUMN])
+
+    has_route = (origin_codes >= 0) & (destination_codes >= 0)
+    cell_codes = origin_codes[has_route].astype(np.int64) * len(destinations) + destination_codes[has_route]
+    cell_count = len(origins) * len(destinations)
+    counts = np.bincount(cell_codes, minlength=cell_count)
+    first_seen = np.full(cell_count, len(cell_codes), dtype=np.int64)
+    np.minimum.at(first_seen, cell_codes, np.arange(len(cell_codes)))
+
+    shape = (len(origins), len(destinations))
+    return RouteMatrix(origins, destinations, counts.reshape(shape), first_seen.reshape(shape))
@@ -0,0 +1,178 @@
+# /trempboss_analytics/workbook_chunks.py
+"""
+Reads the tremps and the participations of a workbook in chunks of tremp id ranges without loading their sheets.
+The sheets are streamed a block of rows at a time (openpyxl read-only mode) and every block is spilled to a
+temporary folder, split by the tremp id range of its rows. The ranges are then read back one at a time, so only a
+block of rows or a single range is ever in memory. The rows don't have to be sorted by tremp id. The users sheet has
+a row per user, not per tremp, and is read whole.
+"""
+import os
+import tempfile
+from collections import defaultdict
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from trempboss_analytics.columns import (TREMP_ID_COLUMN, TREMP_TYPE_COLUMN, SEATS_AMOUNT_COLUMN, TREMP_TIME_COLUMN,
+                                         DATE_COLUMN, USER_ID_COLUMN, IS_TREMP_CREATOR_COLUMN, GENDER_COLUMN,
+                                         FULL_NAME_COLUMN)
+from trempboss_analytics.map_reduce import TableChunk, reduce_chunks
+from trempboss_analytics.metrics import HALF_HOUR_MINUTE
+from trempboss_analytics.partials import PartialAggregates
+
+TREMPS_SHEET = 'tremps'
+USERS_SHEET = 'users'
+USERS_IN_TREMPS_SHEET = 'users_in_tremps'
+
+# The columns read from every sheet, the ones the aggregates of `PartialAggregates` need
+TREMPS_COLUMNS = [TREMP_ID_COLUMN, TREMP_TYPE_COLUMN, SEATS_AMOUNT_COLUMN, DATE_COLUMN, TREMP_TIME_COLUMN]
+USERS_COLUMNS = [USER_ID_COLUMN, FULL_NAME_COLUMN, GENDER_COLUMN]
+USERS_IN_TREMPS_COLUMNS = [USER_ID_COLUMN, TREMP_ID_COLUMN, IS_TREMP_CREATOR_COLUMN]
+
+# Rows of a sheet read before they are spilled, and tremp ids of every range
+DEFAULT_BLOCK_ROWS = 50_000
+DEFAULT_RANGE_TREMP_IDS = 50_000
+
+# The row of every tremp in its sheet, kept with the spilled tremps for the order of the first appearance of the hours
+ROW_COLUMN = '_row'
+
+WorkbookFile = Union[str, BinaryIO]
+
+
+def sheet_blocks(workbook, sheet_name: str, columns: List[str], block_rows: int) -> Iterator[pd.DataFrame]:
+    """
+    The function `sheet_blocks` yields the rows of a sheet of an openpyxl read-only workbook in DataFrames of
+    `block_rows` rows, with only the given columns. Empty rows are skipped.
+    """
+    rows = workbook[sheet_name].iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return
+    missing_columns = [column for column in columns if column not in header]
+    if missing_columns:
+        raise ValueError(f"The {sheet_name} sheet has no {', '.join(missing_columns)} column")
+    positions = [header.index(column) for column in columns]
+
+    block = []
+    for row in rows:
+        if all(value is None for value in row):
+            continue
+        block.append([row[position] if position < len(row) else None for position in positions])
+        if len(block) == block_rows:
+            yield pd.DataFrame(block, columns=columns)
+            block = []
+    if block:
+        yield pd.DataFrame(block, columns=columns)
+
+
+def typed_tremps(block: pd.DataFrame) -> pd.DataFrame:
+    return block.astype({TREMP_ID_COLUMN: np.int64, SEATS_AMOUNT_COLUMN: np.int64}).assign(
+        **{DATE_COLUMN: pd.to_datetime(block[DATE_COLUMN])})
+
+
+def typed_users_in_tremps(block: pd.DataFrame) -> pd.DataFrame:
+    return block.astype({USER_ID_COLUMN: np.int64, TREMP_ID_COLUMN: np.int64, IS_TREMP_CREATOR_COLUMN: bool})
+
+
+class TrempRangeSpill:
+    """
+    The blocks of the sheets spilled to a folder, split by tremp id range: the rows of range r have tremp ids from
+    r * range_tremp_ids up to (r + 1) * range_tremp_ids.
+    """
+
+    def __init__(self, spill_dir: str, range_tremp_ids: int):
+        self.spill_dir = spill_dir
+        self.range_tremp_ids = range_tremp_ids
+        # The files of every sheet and range, and an empty table of every sheet with its column types
+        self._files: Dict[Tuple[str, int], List[str]] = defaultdict(list)
+        self._empty_tables: Dict[str, pd.DataFrame] = {}
+        self._file_count = 0
+
+    def add(self, sheet_name: str, block: pd.DataFrame) -> None:
+        self._empty_tables.setdefault(sheet_name, block.iloc[:0])
+        tremp_ranges = block[TREMP_ID_COLUMN].to_numpy() // self.range_tremp_ids
+        for tremp_range, range_rows in block.groupby(tremp_ranges, sort=False):
+            file_path = os.path.join(self.spill_dir, f'{sheet_name}-{tremp_range}-{self._file_count}.pkl')
+            range_rows.to_pickle(file_path)
+            self._file_count += 1
+            self._files[sheet_name, int(tremp_range)].append(file_path)
+
+    def ranges(self) -> List[int]:
+        return sorted({tremp_range for _, tremp_range in self._files})
+
+    def read(self, sheet_name: str, tremp_range: int, columns: List[str]) -> pd.DataFrame:
+        """
+        Reads back the rows of a sheet in a tremp id range, an empty table when it has none.
+        """
+        tables = [pd.read_pickle(file_path) for file_path in self._files.get((sheet_name, tremp_range), [])]
+        if not tables:
+            return self._empty_tables.get(sheet_name, pd.DataFrame(columns=columns))
+        return pd.concat(tables, ignore_index=True)
+
+
+def read_users_sheet(workbook_file: WorkbookFile) -> pd.DataFrame:
+    """
+    The function reads the users sheet of a workbook, with the user_id, full_name and gender columns.
+    """
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(workbook_file, read_only=True, data_only=True)
+    try:
+        blocks = list(sheet_blocks(workbook, USERS_SHEET, USERS_COLUMNS, DEFAULT_BLOCK_ROWS))
+    finally:
+        workbook.close()
+    users = pd.concat(blocks, ignore_index=True) if blocks else pd.DataFrame(columns=USERS_COLUMNS)
+    return users.astype({USER_ID_COLUMN: np.int64})
+
+
+def workbook_chunks(workbook_file: WorkbookFile, range_tremp_ids: int = DEFAULT_RANGE_TREMP_IDS,
+                    block_rows: int = DEFAULT_BLOCK_ROWS, spill_dir: Optional[str] = None) -> Iterator[TableChunk]:
+    """
+    The function `workbook_chunks` yields the tremps and the participations of a workbook in chunks of tremp id
+    ranges, like `map_reduce.table_chunks`, without loading the tremps or the users_in_tremps sheet whole.
+
+    :param workbook_file: The path of the workbook, or a binary file object.
+    :param range_tremp_ids: The tremp ids of every chunk.
+    :param block_rows: The rows of a sheet read before they are spilled to the folder.
+    :param spill_dir: The folder the temporary files of the chunks are made in, by default the system one.
+    """
+    import openpyxl
+
+    with tempfile.TemporaryDirectory(prefix='trempboss-chunks-', dir=spill_dir) as chunk_dir:
+        spill = TrempRangeSpill(chunk_dir, range_tremp_ids)
+        workbook = openpyxl.load_workbook(workbook_file, read_only=True, data_only=True)
+        try:
+            first_row = 0
+            for block in sheet_blocks(workbook, TREMPS_SHEET, TREMPS_COLUMNS, block_rows):
+                block[ROW_COLUMN] = np.arange(first_row, first_row + len(block), dtype=np.int64)
+                first_row += len(block)
+                spill.add(TREMPS_SHEET, typed_tremps(block))
+            for block in sheet_blocks(workbook, USERS_IN_TREMPS_SHEET, USERS_IN_TREMPS_COLUMNS, block_rows):
+                spill.add(USERS_IN_TREMPS_SHEET, typed_users_in_tremps(block))
+        finally:
+            workbook.close()
+
+        # A workbook without tremps is a single empty chunk
+        for tremp_range in spill.ranges() or [0]:
+            df_tremps = spill.read(TREMPS_SHEET, tremp_range, [*TREMPS_COLUMNS, ROW_COLUMN])
+            df_users_in_tremp = spill.read(USERS_IN_TREMPS_SHEET, tremp_range, USERS_IN_TREMPS_COLUMNS)
+            tremp_rows = df_tremps[ROW_COLUMN].to_numpy(dtype=np.int64)
+            yield df_tremps.drop(columns=ROW_COLUMN), tremp_rows, df_users_in_tremp
+
+
+def out_of_core_aggregates(workbook_file: WorkbookFile, round_up_from_minute: int = HALF_HOUR_MINUTE,
+                           rides_given_only: bool = False, range_tremp_ids: int = DEFAULT_RANGE_TREMP_IDS,
+                           max_workers: Optional[int] = None) -> Tuple[PartialAggregates, pd.DataFrame]:
+    """
+    The function `out_of_core_aggregates` calculates the aggregates of a workbook chunk by chunk of tremp id
+    ranges in a pool of worker processes, reading the chunks with `workbook_chunks`.
+
+    :return: tuple containing the aggregates and the users of the workbook, for the names of the drivers.
+    """
+    df_users = read_users_sheet(workbook_file)
+    if hasattr(workbook_file, 'seek'):
+        workbook_file.seek(0)
+    aggregates = reduce_chunks(workbook_chunks(workbook_file, range_tremp_ids), df_users, round_up_from_minute,
+                               rides_given_only, max_workers)
+    return aggregates, df_users